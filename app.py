@@ -1,16 +1,17 @@
 # --- app.py ---
 import streamlit as st
-import time
-import os
 from sqlalchemy.exc import OperationalError
 
 # Importaciones locales revisadas y organizadas
 from auth.auth import init_session_state, check_authentication, show_login_page, logout
-from database.database import engine, apply_sqlite_migrations
+from database.database import get_engine, apply_sqlite_migrations, MIGRATIONS_DIR
 from database.models import Base
+from database.rollups import backfill_missing_sketches
+from database.term_index import backfill_term_index
+from database.snapshots import snapshot_exporter
 from utils.styles import apply_global_styles, show_navbar
 from utils.helpers import render_sidebar # Importar la función del sidebar
-from utils.config import get_configuration # Importar aquí para set_page_config
+from utils.config import get_configurations # Importar aquí para set_page_config
 import logging
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
@@ -20,8 +21,9 @@ log = logging.getLogger(__name__)
 APP_TITLE_DEFAULT = "IA-AMCO Dashboard"
 APP_ICON_DEFAULT = "🤖"
 try:
-    app_title = get_configuration('dashboard_name', 'general', APP_TITLE_DEFAULT) or APP_TITLE_DEFAULT
-    app_icon_url = get_configuration('logo_url', 'general', None)
+    page_configs = get_configurations(['dashboard_name', 'logo_url'], 'general')
+    app_title = page_configs['dashboard_name'] or APP_TITLE_DEFAULT
+    app_icon_url = page_configs['logo_url']
     app_icon = app_icon_url if app_icon_url and isinstance(app_icon_url, str) and app_icon_url.startswith('http') else APP_ICON_DEFAULT
 except OperationalError:
     print("WARN: Database not ready for config read during set_page_config. Using defaults.")
@@ -38,25 +40,31 @@ st.set_page_config(
     # --- LÍNEA 'show_default_navigation=False' ELIMINADA ---
 )
 
-# --- Aplicar Migraciones (Tu código existente sin cambios) ---
-MIGRATION_APPLIED_FLAG = '.migration_applied_on_server_start'
-if not os.path.exists(MIGRATION_APPLIED_FLAG):
-    print("Attempting to apply database migrations (first run in this session)...")
-    try:
-        apply_sqlite_migrations(engine, Base, "database/migrations")
-        print("Migrations check/application process finished.")
-        with open(MIGRATION_APPLIED_FLAG, 'w') as f: f.write(f'Applied at: {time.time()}')
-        print(f"Migration flag '{MIGRATION_APPLIED_FLAG}' created.")
-    except OperationalError as oe:
-         print(f"!!! OPERATIONAL ERROR during migrations: {oe}")
-         st.error(f"Error crítico DB: {oe}. Verifique config/permisos.")
-         st.stop()
-    except Exception as e:
-        print(f"!!! FATAL ERROR applying migrations: {e}")
-        st.error("Error crítico inicializando BD. Revise logs.")
-        st.stop()
-else:
-     print("Migrations flag found. Skipping migration check.")
+# --- Aplicar Migraciones (runner versionado; si la BD está al día cuesta un PRAGMA user_version) ---
+try:
+    applied_migrations = apply_sqlite_migrations(get_engine(), Base, MIGRATIONS_DIR)
+    if applied_migrations: log.info(f"Applied {applied_migrations} database migration(s) on startup.")
+except OperationalError as oe:
+     log.error(f"OPERATIONAL ERROR during migrations: {oe}")
+     st.error(f"Error crítico DB: {oe}. Verifique config/permisos.")
+     st.stop()
+except Exception as e:
+    log.error(f"FATAL ERROR applying migrations: {e}", exc_info=True)
+    st.error("Error crítico inicializando BD. Revise logs.")
+    st.stop()
+
+# --- Rellenos pendientes (una vez por proceso) ---
+# Se intentan en cada arranque y no solo al aplicar migraciones: si un relleno falló o el proceso se detuvo
+# a mitad, user_version ya está al día y no habría otra oportunidad. Sin nada pendiente cuestan una consulta.
+@st.cache_resource(show_spinner=False)
+def run_startup_backfills() -> None:
+    try: backfill_missing_sketches() # Sketches de latencia que SQL no puede calcular (migración 017)
+    except Exception as e: log.error(f"Latency sketch backfill failed: {e}", exc_info=True)
+    try: backfill_term_index() # Índice de términos, tokenizado en Python (migración 020)
+    except Exception as e: log.error(f"Term index backfill failed: {e}", exc_info=True)
+
+run_startup_backfills()
+snapshot_exporter.start() # Instantáneas Parquet de 'queries' en segundo plano (idempotente; solo con QUERY_SNAPSHOTS_ENABLED=1 y pyarrow)
 
 # --- Lógica Principal (Tu código existente sin cambios) ---
 init_session_state()
@@ -11,9 +11,9 @@ from sqlalchemy.orm import joinedload
 from typing import Optional, Dict, Any, Tuple, Set # Añadir Set
 
 # Importar desde los nuevos módulos
-from database.database import get_db_session
+from database.database import get_db_session, rerun_session_scope
 from database.models import User, Role
-from utils.config import get_configuration
+from utils.config import get_configuration, get_configurations
 from utils.styles import get_login_page_style
 import logging # Añadir logging
 
@@ -35,8 +35,7 @@ def get_security_config_values():
     defaults = { 'password_min_length': '8', 'password_require_special': 'True', 'password_require_numbers': 'True', 'password_require_uppercase': 'True', 'session_timeout': '60' }
     config = {}
     try:
-        with get_db_session() as db:
-            for key in defaults: config[key] = get_configuration(key, category='security', default=defaults[key], db_session=db)
+        config = get_configurations(defaults.keys(), category='security', defaults=defaults) # Una sola lectura (caché o IN)
     except Exception as e: log.error(f"Error reading security config: {e}"); config = defaults.copy()
     try: # Conversión
         config['password_min_length'] = max(4, int(config.get('password_min_length', defaults['password_min_length'])))
@@ -161,28 +160,34 @@ def logout(silent=False, message="Sesión cerrada."):
     if not silent: st.success(message)
     time.sleep(0.5); st.rerun()
 
-# --- Decoradores (Sin cambios) ---
-def requires_permission(permission_name):
+# --- Decoradores ---
+# 'page' es la etiqueta del rerun en Monitoreo (consultas por página): el nombre de la página en PAGE_PERMISSION_MAP.
+# Solo se atribuye lo que corre dentro de la función decorada; render_sidebar() y las lecturas de configuración
+# a nivel de módulo de cada página van antes y se cuentan como "(fuera de página)" (casi siempre salen de la caché).
+def requires_permission(permission_name, page: Optional[str] = None):
+    page = page or permission_name # Los permisos de página se llaman como la página
     def decorator(func):
         def wrapper(*args, **kwargs):
-            if not check_authentication(): st.stop()
-            if permission_name not in st.session_state.get('permissions', set()):
-                 st.title("🚫 Acceso Denegado"); st.warning(f"Permiso: '{permission_name}' requerido."); st.stop()
-            try: return func(*args, **kwargs)
-            except Exception as e: log.error(f"Error in @requires_permission({permission_name}) for {func.__name__}: {e}", exc_info=True); st.error("Error inesperado."); st.stop()
+            with rerun_session_scope(page=page): # Una sola sesión de BD para todo el rerun de la página
+                if not check_authentication(): st.stop()
+                if permission_name not in st.session_state.get('permissions', set()):
+                     st.title("🚫 Acceso Denegado"); st.warning(f"Permiso: '{permission_name}' requerido."); st.stop()
+                try: return func(*args, **kwargs)
+                except Exception as e: log.error(f"Error in @requires_permission({permission_name}) for {func.__name__}: {e}", exc_info=True); st.error("Error inesperado."); st.stop()
         return wrapper
     return decorator
 
-def requires_role(allowed_roles):
+def requires_role(allowed_roles, page: str):
      if isinstance(allowed_roles, str): allowed_roles = [allowed_roles]
      allowed_roles_lower = set(role.lower() for role in allowed_roles)
      def decorator(func):
          def wrapper(*args, **kwargs):
-             if not check_authentication(): st.stop()
-             current_role = (st.session_state.get('role_name') or '').lower()
-             if current_role not in allowed_roles_lower:
-                  st.title("🚫 Acceso Restringido"); st.warning(f"Rol requerido: {', '.join(allowed_roles)}."); st.stop()
-             try: return func(*args, **kwargs)
-             except Exception as e: log.error(f"Error in @requires_role({allowed_roles}) for {func.__name__}: {e}", exc_info=True); st.error("Error inesperado."); st.stop()
+             with rerun_session_scope(page=page): # Una sola sesión de BD para todo el rerun de la página
+                 if not check_authentication(): st.stop()
+                 current_role = (st.session_state.get('role_name') or '').lower()
+                 if current_role not in allowed_roles_lower:
+                      st.title("🚫 Acceso Restringido"); st.warning(f"Rol requerido: {', '.join(allowed_roles)}."); st.stop()
+                 try: return func(*args, **kwargs)
+                 except Exception as e: log.error(f"Error in @requires_role({allowed_roles}) for {func.__name__}: {e}", exc_info=True); st.error("Error inesperado."); st.stop()
          return wrapper
      return decorator
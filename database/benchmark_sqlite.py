@@ -0,0 +1,77 @@
+# --- database/benchmark_sqlite.py (Benchmark de Perfiles SQLite) ---
+# Uso: python -m database.benchmark_sqlite [--seconds 5] [--readers 4] [--writers 2] [--profiles legacy,balanced]
+#
+# Para cada perfil de SQLITE_PROFILES crea una BD temporal migrada y lanza sesiones concurrentes:
+# lectores que recorren la tabla de configuración y agentes (lo que hace cada render) y escritores
+# que guardan configuración (como el formulario de Configuración). Reporta ops/s y errores de bloqueo.
+
+import argparse
+import logging
+import threading
+import time
+from typing import Dict, List
+
+from sqlalchemy.exc import OperationalError
+
+from database.database import SQLITE_PROFILES, configure_engine, create_ephemeral_engine, get_db_session
+from database.models import Agent, Configuration
+from utils.config import save_configurations
+
+log = logging.getLogger(__name__)
+
+SEED_CONFIG_KEYS = 50
+
+def _reader(stop: threading.Event, counters: Dict[str, int], lock: threading.Lock) -> None:
+    ops = errors = 0
+    while not stop.is_set():
+        try:
+            with get_db_session() as db:
+                db.query(Configuration.key, Configuration.value).all()
+                db.query(Agent.id, Agent.name).order_by(Agent.name).all()
+            ops += 1
+        except OperationalError: errors += 1
+    with lock: counters["reads"] += ops; counters["read_errors"] += errors
+
+def _writer(stop: threading.Event, counters: Dict[str, int], lock: threading.Lock, writer_id: int) -> None:
+    ops = errors = 0
+    while not stop.is_set():
+        mapping = {f"bench_{writer_id}_{i}": f"{ops}-{i}" for i in range(5)}
+        if save_configurations(mapping, "bench"): ops += 1
+        else: errors += 1
+    with lock: counters["writes"] += ops; counters["write_errors"] += errors
+
+def run_profile(profile: str, seconds: float, readers: int, writers: int) -> Dict[str, float]:
+    """Ejecuta la carga concurrente contra una BD temporal con el perfil indicado."""
+    engine = create_ephemeral_engine("tempfile", sqlite_profile=profile, pool_size=readers + writers, max_overflow=0)
+    configure_engine(engine)
+    save_configurations({f"seed_{i}": "x" * 64 for i in range(SEED_CONFIG_KEYS)}, "bench")
+
+    stop = threading.Event(); lock = threading.Lock()
+    counters = {"reads": 0, "read_errors": 0, "writes": 0, "write_errors": 0}
+    threads: List[threading.Thread] = [threading.Thread(target=_reader, args=(stop, counters, lock)) for _ in range(readers)]
+    threads += [threading.Thread(target=_writer, args=(stop, counters, lock, i)) for i in range(writers)]
+    started = time.perf_counter()
+    for t in threads: t.start()
+    time.sleep(seconds); stop.set()
+    for t in threads: t.join()
+    elapsed = time.perf_counter() - started
+    engine.dispose()
+    return {"reads_per_s": counters["reads"] / elapsed, "writes_per_s": counters["writes"] / elapsed,
+            "read_errors": counters["read_errors"], "write_errors": counters["write_errors"]}
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark de lectura/escritura concurrente por perfil SQLite.")
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--readers", type=int, default=4)
+    parser.add_argument("--writers", type=int, default=2)
+    parser.add_argument("--profiles", default=",".join(SQLITE_PROFILES))
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+
+    print(f"{'perfil':<10} {'lecturas/s':>12} {'escrituras/s':>13} {'err_lect':>9} {'err_escr':>9}")
+    for profile in [p.strip() for p in args.profiles.split(",") if p.strip()]:
+        result = run_profile(profile, args.seconds, args.readers, args.writers)
+        print(f"{profile:<10} {result['reads_per_s']:>12.0f} {result['writes_per_s']:>13.0f} {result['read_errors']:>9} {result['write_errors']:>9}")
+
+if __name__ == "__main__":
+    main()
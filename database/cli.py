@@ -0,0 +1,36 @@
+# --- database/cli.py (Utilidades Comunes de las Herramientas de Línea de Comandos) ---
+# Los módulos de mantenimiento (rollups, term_index, snapshots, exports) comparten aquí el parseo de fechas,
+# los argumentos --since/--until, el subcomando 'rebuild' y el arranque (argparse + logging).
+# Cada subcomando registra su manejador con set_defaults(handler=...); el manejador devuelve el código de salida.
+
+import logging
+import argparse
+from datetime import datetime, timezone
+from typing import Any, Callable, Optional, Sequence
+
+Handler = Callable[[argparse.Namespace], Optional[int]]
+
+def parse_utc_date(value: str) -> datetime:
+    """'YYYY-MM-DD' como medianoche UTC (tipo de argparse)."""
+    try: return datetime.strptime(value, "%Y-%m-%d").replace(tzinfo=timezone.utc)
+    except ValueError: raise argparse.ArgumentTypeError(f"fecha inválida '{value}' (formato YYYY-MM-DD)")
+
+def add_date_range_args(parser: argparse.ArgumentParser, until_inclusive: bool = False) -> None:
+    parser.add_argument("--since", type=parse_utc_date, help="Fecha inicial UTC (YYYY-MM-DD), inclusive.")
+    parser.add_argument("--until", type=parse_utc_date, help=f"Fecha final UTC (YYYY-MM-DD), {'inclusive' if until_inclusive else 'exclusiva'}.")
+
+def add_rebuild_command(subparsers, table_name: str, rebuild: Callable[..., int]) -> None:
+    """Subcomando 'rebuild [--since] [--until]' que llama a rebuild(since=, until=) e informa las filas escritas."""
+    parser = subparsers.add_parser("rebuild", help=f"Recalcula {table_name} desde queries.")
+    add_date_range_args(parser)
+    def handler(args: argparse.Namespace) -> int:
+        print(f"{table_name}: {rebuild(since=args.since, until=args.until)} filas reconstruidas."); return 0
+    parser.set_defaults(handler=handler)
+
+def run_cli(description: str, argv: Optional[Sequence[str]], register: Callable[[Any], None], log_level: int = logging.INFO) -> int:
+    """Construye el parser con los subcomandos que añade 'register', configura logging y ejecuta el elegido."""
+    parser = argparse.ArgumentParser(description=description)
+    register(parser.add_subparsers(dest="command", required=True))
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=log_level, format="%(levelname)s %(message)s")
+    return args.handler(args) or 0
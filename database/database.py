@@ -1,85 +1,340 @@
-# --- database/database.py (Corregido Nombre DB y Verificación Esquema) ---
+# --- database/database.py (Engine Perezoso y Runner de Migraciones) ---
 
-from sqlalchemy import create_engine, text, inspect
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.engine import Engine, URL, make_url
 from sqlalchemy.orm import sessionmaker, Session as SQLAlchemySession
 from sqlalchemy.exc import OperationalError
+from sqlalchemy.pool import QueuePool, NullPool, StaticPool, SingletonThreadPool
 from contextlib import contextmanager
+from contextvars import ContextVar
 import os
+import re
+import atexit
+import hashlib
+import tempfile
+import threading
+import weakref
 import logging
-from typing import Optional
+from typing import Optional, List, Tuple, Dict, Any
 
-# Importar modelos para que Base los conozca si apply_migrations se usa
+# Importar modelos para que Base los conozca
 from .models import Base
+from .query_log import install_query_instrumentation, begin_render, end_render
 
 log = logging.getLogger(__name__)
 # logging.basicConfig(level=logging.INFO)
 
-# --- Configuración de la Base de Datos (NOMBRE CORREGIDO) ---
-try:
-    BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-    # >>>>>>>>> NOMBRE CORREGIDO AQUÍ <<<<<<<<<<
-    DB_NAME = "pruebamco_dashboard.db"
-    # >>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>
-    DATABASE_FILE_PATH = os.path.join(BASE_DIR, DB_NAME)
-    DATABASE_URL = f"sqlite:///{DATABASE_FILE_PATH}" # Ruta absoluta Unix
-
-    log.info(f"Attempting connect: {DATABASE_FILE_PATH}")
-    log.info(f"SQLAlchemy URL: {DATABASE_URL}")
-
-    if not os.path.exists(DATABASE_FILE_PATH):
-        log.error(f"Database file NOT FOUND at specified path: {DATABASE_FILE_PATH}")
-        # Considerar crear el archivo/directorio o lanzar un error más informativo
-        # os.makedirs(os.path.dirname(DATABASE_FILE_PATH), exist_ok=True) # Solo si se quiere crear directorio
-        raise FileNotFoundError(f"DB file not found: {DATABASE_FILE_PATH}")
-
-    engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False}, echo=False)
-    SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-    log.info("SQLAlchemy engine/SessionLocal created.")
-
-    # --- VERIFICACIÓN DE ESQUEMA (Mejorada) ---
+# --- Configuración de la Base de Datos ---
+# Nada se conecta ni se toca en disco al importar: el engine se construye en la primera get_engine().
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DB_NAME = "pruebamco_dashboard.db"
+DATABASE_FILE_PATH = os.path.join(BASE_DIR, DB_NAME)
+DEFAULT_DATABASE_URL = f"sqlite:///{DATABASE_FILE_PATH}" # Ruta absoluta Unix
+MEMORY_DATABASE_URL = "sqlite:///:memory:"
+
+# --- Perfiles de Rendimiento SQLite (aplicados en cada conexión nueva) ---
+# 'legacy' reproduce el comportamiento original (rollback journal) y sirve de referencia en el benchmark.
+# WAL permite que los lectores no se bloqueen mientras otro usuario guarda configuración o agentes.
+SQLITE_PROFILES: Dict[str, Dict[str, Any]] = {
+    "legacy":   {"journal_mode": "DELETE", "synchronous": "FULL",   "mmap_size": 0,         "cache_size": -2000,  "temp_store": "DEFAULT"},
+    "safe":     {"journal_mode": "WAL",    "synchronous": "FULL",   "mmap_size": 0,         "cache_size": -16000, "temp_store": "DEFAULT"},
+    "balanced": {"journal_mode": "WAL",    "synchronous": "NORMAL", "mmap_size": 268435456, "cache_size": -65536, "temp_store": "MEMORY"},
+    "fast":     {"journal_mode": "WAL",    "synchronous": "OFF",    "mmap_size": 536870912, "cache_size": -131072, "temp_store": "MEMORY"},
+}
+DEFAULT_SQLITE_PROFILE = "balanced"
+_engine_sqlite_profiles: "weakref.WeakKeyDictionary[Engine, Tuple[str, Dict[str, Any]]]" = weakref.WeakKeyDictionary()
+# Valores que devuelve PRAGMA para comparar en verify_sqlite_profile
+_PRAGMA_ENUMS = {"synchronous": {"OFF": 0, "NORMAL": 1, "FULL": 2, "EXTRA": 3}, "temp_store": {"DEFAULT": 0, "FILE": 1, "MEMORY": 2}}
+
+def get_sqlite_profile_name(name: Optional[str] = None) -> str:
+    profile = (name or os.getenv("DB_SQLITE_PROFILE") or DEFAULT_SQLITE_PROFILE).strip().lower()
+    if profile not in SQLITE_PROFILES: raise ValueError(f"Unknown DB_SQLITE_PROFILE '{profile}'. Options: {', '.join(SQLITE_PROFILES)}")
+    return profile
+
+def _install_sqlite_profile(db_engine: Engine, profile: str, busy_timeout_ms: int) -> None:
+    """Registra un hook 'connect' que aplica los PRAGMA del perfil a cada conexión DBAPI."""
+    pragmas = dict(SQLITE_PROFILES[profile]); pragmas["busy_timeout"] = busy_timeout_ms
+    is_memory = _is_memory_sqlite(db_engine.url)
+
+    @event.listens_for(db_engine, "connect")
+    def _apply_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for pragma, value in pragmas.items():
+                if pragma in ("journal_mode", "mmap_size") and is_memory: continue # En memoria no hay WAL ni mmap
+                cursor.execute(f"PRAGMA {pragma} = {value}")
+        finally: cursor.close()
+
+    _engine_sqlite_profiles[db_engine] = (profile, pragmas)
+
+def verify_sqlite_profile(db_engine: Engine) -> Dict[str, Tuple[Any, Any]]:
+    """Lee los PRAGMA efectivos y devuelve {pragma: (esperado, actual)} de los que no coinciden."""
+    if db_engine not in _engine_sqlite_profiles: return {}
+    profile, pragmas = _engine_sqlite_profiles[db_engine]
+    mismatches: Dict[str, Tuple[Any, Any]] = {}
+    with db_engine.connect() as conn:
+        for pragma, expected in pragmas.items():
+            if pragma in ("journal_mode", "mmap_size") and _is_memory_sqlite(db_engine.url): continue
+            actual = conn.exec_driver_sql(f"PRAGMA {pragma}").scalar()
+            wanted = _PRAGMA_ENUMS.get(pragma, {}).get(str(expected).upper(), expected)
+            if str(actual).lower() != str(wanted).lower(): mismatches[pragma] = (expected, actual)
+    if mismatches: log.warning(f"SQLite profile '{profile}' not fully active: {mismatches}")
+    else: log.info(f"SQLite profile '{profile}' active: {pragmas}")
+    return mismatches
+
+# Clases de pool seleccionables con DB_POOL_CLASS
+POOL_CLASSES = {"queue": QueuePool, "null": NullPool, "static": StaticPool, "singleton": SingletonThreadPool}
+
+_engine: Optional[Engine] = None
+_engine_lock = threading.Lock()
+SessionLocal = sessionmaker(autocommit=False, autoflush=False) # Se enlaza al engine en cada get_db_session()
+
+def get_database_url() -> str:
+    """URL de la BD: variable de entorno DATABASE_URL o el archivo SQLite del proyecto."""
+    return os.getenv("DATABASE_URL") or DEFAULT_DATABASE_URL
+
+def _env_int(name: str, default: Optional[int]) -> Optional[int]:
+    value = os.getenv(name)
+    if value is None or value.strip() == "": return default
+    try: return int(value)
+    except ValueError: log.warning(f"Invalid integer for {name}='{value}', using {default}."); return default
+
+def _is_memory_sqlite(url: URL) -> bool:
+    return url.get_backend_name() == "sqlite" and (not url.database or url.database == ":memory:" or "mode=memory" in str(url))
+
+def create_db_engine(url: Optional[str] = None, pool_class: Optional[str] = None, pool_size: Optional[int] = None,
+                     max_overflow: Optional[int] = None, pool_recycle: Optional[int] = None,
+                     busy_timeout_ms: Optional[int] = None, sqlite_profile: Optional[str] = None, echo: bool = False) -> Engine:
+    """
+    Crea un engine nuevo. Los parámetros no indicados se leen del entorno:
+    DATABASE_URL, DB_POOL_CLASS (queue|null|static|singleton), DB_POOL_SIZE, DB_MAX_OVERFLOW,
+    DB_POOL_RECYCLE (segundos), DB_BUSY_TIMEOUT_MS y DB_SQLITE_PROFILE (ver SQLITE_PROFILES).
+    """
+    db_url = make_url(url or get_database_url())
+    engine_kwargs: Dict[str, Any] = {"echo": echo}
+    busy_timeout_ms = busy_timeout_ms if busy_timeout_ms is not None else _env_int("DB_BUSY_TIMEOUT_MS", 5000)
+    pool_recycle = pool_recycle if pool_recycle is not None else _env_int("DB_POOL_RECYCLE", -1)
+    if pool_recycle is not None and pool_recycle >= 0: engine_kwargs["pool_recycle"] = pool_recycle
+
+    pool_name = (pool_class or os.getenv("DB_POOL_CLASS") or "").strip().lower()
+    if db_url.get_backend_name() == "sqlite":
+        engine_kwargs["connect_args"] = {"check_same_thread": False, "timeout": busy_timeout_ms / 1000.0}
+        if _is_memory_sqlite(db_url):
+            pool_name = pool_name or "static" # Una única conexión compartida: todos ven el mismo esquema
+        elif db_url.database:
+            os.makedirs(os.path.dirname(os.path.abspath(db_url.database)), exist_ok=True)
+    if pool_name:
+        if pool_name not in POOL_CLASSES: raise ValueError(f"Unknown DB_POOL_CLASS '{pool_name}'. Options: {', '.join(POOL_CLASSES)}")
+        engine_kwargs["poolclass"] = POOL_CLASSES[pool_name]
+    if engine_kwargs.get("poolclass", QueuePool) is QueuePool:
+        engine_kwargs["pool_size"] = pool_size if pool_size is not None else _env_int("DB_POOL_SIZE", 5)
+        engine_kwargs["max_overflow"] = max_overflow if max_overflow is not None else _env_int("DB_MAX_OVERFLOW", 10)
+
+    new_engine = create_engine(db_url, **engine_kwargs)
+    if db_url.get_backend_name() == "sqlite": _install_sqlite_profile(new_engine, get_sqlite_profile_name(sqlite_profile), busy_timeout_ms)
+    install_query_instrumentation(new_engine)
+    log.info(f"SQLAlchemy engine created: {db_url.render_as_string(hide_password=True)} (pool={new_engine.pool.__class__.__name__}, sqlite_profile={_engine_sqlite_profiles.get(new_engine, ('-',))[0]})")
+    return new_engine
+
+def get_engine() -> Engine:
+    """Engine del proceso, construido de forma perezosa y thread-safe en el primer uso."""
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                try: new_engine = create_db_engine()
+                except Exception as e_init:
+                    log.error(f"CRITICAL ERROR DB init: {e_init}", exc_info=True)
+                    raise RuntimeError(f"Failed DB init: {e_init}") from e_init
+                try: verify_sqlite_profile(new_engine) # Chequeo de arranque del perfil
+                except Exception as e_verify: log.error(f"Could not verify SQLite profile: {e_verify}")
+                _engine = new_engine
+    return _engine
+
+def configure_engine(new_engine: Optional[Engine] = None, url: Optional[str] = None, **engine_kwargs) -> Engine:
+    """Sustituye el engine del proceso (tests, benchmarks, scripts) y libera el anterior."""
+    global _engine
+    with _engine_lock:
+        previous = _engine
+        _engine = new_engine if new_engine is not None else create_db_engine(url, **engine_kwargs)
+    if previous is not None and previous is not _engine: previous.dispose()
+    return _engine
+
+# --- Unidad de Trabajo por Rerun ---
+# Dentro de rerun_session_scope() todas las llamadas a get_db_session() comparten UNA sesión: la primera
+# la abre (perezosamente) y el resto la reutilizan. Al terminar el rerun se hace commit y se cierra.
+# Los bloques que escriben hacen commit al salir para no retener el lock de escritura de SQLite
+# durante el resto del render (ej. time.sleep + st.rerun tras guardar).
+class _RerunScope:
+    __slots__ = ("page", "session")
+    def __init__(self, page: Optional[str]): self.page = page; self.session: Optional[SQLAlchemySession] = None
+
+_current_rerun_scope: ContextVar[Optional[_RerunScope]] = ContextVar("current_rerun_scope", default=None)
+
+def _mark_session_writes(session: SQLAlchemySession, *args) -> None: session.info["has_writes"] = True
+
+def _on_orm_execute(orm_execute_state) -> None:
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete: _mark_session_writes(orm_execute_state.session)
+
+event.listen(SessionLocal, "after_flush", _mark_session_writes)
+event.listen(SessionLocal, "do_orm_execute", _on_orm_execute)
+
+def _new_session() -> SQLAlchemySession: return SessionLocal(bind=get_engine())
+
+def get_current_rerun_page() -> Optional[str]:
+    """Página asociada al rerun en curso (si hay un rerun_session_scope activo)."""
+    scope = _current_rerun_scope.get()
+    return scope.page if scope else None
+
+@contextmanager
+def rerun_session_scope(page: Optional[str] = None):
+    """
+    Abre una unidad de trabajo para un rerun de Streamlit. Anidar scopes no abre otro: se reutiliza el externo.
+    st.stop()/st.rerun() (BaseException de control de Streamlit) se tratan como fin normal: se hace commit.
+    """
+    if _current_rerun_scope.get() is not None: yield; return
+    scope = _RerunScope(page); token = _current_rerun_scope.set(scope); render_token = begin_render(page)
     try:
-        log.info("Inspecting DB schema via SQLAlchemy inspector...")
-        inspector = inspect(engine)
-        tables_found = inspector.get_table_names()
-        log.info(f"Tables found by inspector: {tables_found}")
-
-        required_tables = ["agents", "agent_options_language_models", "agent_options_skills", "agent_options_personalities", "agent_options_goals", "users", "roles", "configurations", "queries"]
-        missing_tables = []
-        for table in required_tables:
-            if table not in tables_found:
-                log.error(f"CRITICAL: Required table '{table}' NOT FOUND via inspector!")
-                missing_tables.append(table)
-
-        if not missing_tables:
-            log.info("All required tables seem to exist.")
-            # Verificar columnas clave si las tablas existen
-            if "agents" in tables_found:
-                cols = inspector.get_columns('agents'); names = [c['name'] for c in cols]
-                if 'model_name' not in names: log.error("CRITICAL: 'model_name' column NOT FOUND in 'agents'!")
-                else: log.info("'model_name' column verified in 'agents'.")
-            # Añadir más verificaciones de columnas si es necesario
-        else:
-            log.error(f"Missing critical tables: {', '.join(missing_tables)}. Ensure ALL migrations (001-012) were applied correctly to '{DATABASE_FILE_PATH}'.")
-
-    except Exception as inspect_e:
-        log.error(f"Failed to inspect database schema (DB might be locked, corrupted, or path wrong?): {inspect_e}", exc_info=True)
-    # --- FIN VERIFICACIÓN ---
-
-except Exception as e_init:
-    log.error(f"CRITICAL ERROR DB init: {e_init}", exc_info=True)
-    raise RuntimeError(f"Failed DB init: {e_init}") from e_init
-
-# --- Context Manager (Sin cambios) ---
+        yield
+        if scope.session is not None: scope.session.commit()
+    except Exception:
+        if scope.session is not None: scope.session.rollback()
+        raise
+    except BaseException:
+        if scope.session is not None:
+            try: scope.session.commit()
+            except Exception as e: log.error(f"DB commit failed at end of rerun: {e}", exc_info=True); scope.session.rollback()
+        raise
+    finally:
+        _current_rerun_scope.reset(token)
+        if scope.session is not None: scope.session.close()
+        end_render(render_token)
+
 @contextmanager
 def get_db_session() -> SQLAlchemySession:
+    scope = _current_rerun_scope.get()
+    if scope is not None: # Reutilizar la sesión del rerun
+        if scope.session is None: scope.session = _new_session()
+        db = scope.session
+        try:
+            yield db
+            db.flush()
+            if db.info.pop("has_writes", False): db.commit()
+        except Exception as e: log.error(f"DB transaction rollback: {e}", exc_info=True); db.rollback(); db.info.pop("has_writes", None); raise
+        return
     db: Optional[SQLAlchemySession] = None
-    try: db = SessionLocal(); yield db; db.commit()
+    try: db = _new_session(); yield db; db.commit()
     except Exception as e: log.error(f"DB transaction rollback: {e}", exc_info=True); db.rollback(); raise
     finally:
         if db: db.close()
 
-# --- Aplicación de Migraciones (Sin cambios en la firma, implementación robusta necesaria) ---
-def apply_sqlite_migrations(db_engine, sql_base, migrations_dir="database/migrations"):
-     # ... (Usar versión robusta con historial si se activa en app.py) ...
-     print(f"INFO: apply_sqlite_migrations called for dir '{migrations_dir}' (ensure implementation is robust).")
-     pass
+# --- Aplicación de Migraciones (versionadas, con historial y checksums) ---
+# Cada archivo NNN_nombre.sql de database/migrations/ es una versión. Las aplicadas se registran en
+# 'schema_migrations' y la última versión se refleja en PRAGMA user_version, de modo que el chequeo
+# de arranque es una sola lectura de pragma cuando la BD ya está al día.
+MIGRATIONS_DIR = os.path.join(BASE_DIR, "database", "migrations")
+# Las BDs creadas antes del runner ya tienen aplicadas a mano las migraciones hasta esta versión
+MIGRATIONS_BASELINE_VERSION = int(os.getenv("DB_MIGRATIONS_BASELINE_VERSION", "12"))
+_MIGRATION_FILE_RE = re.compile(r"^(\d+)_[\w\-]+\.sql$")
+_migrations_lock = threading.Lock()
+
+def list_migration_files(migrations_dir: str = MIGRATIONS_DIR) -> List[Tuple[int, str, str]]:
+    """Devuelve [(version, nombre_archivo, ruta)] ordenado por versión."""
+    if not os.path.isabs(migrations_dir): migrations_dir = os.path.join(BASE_DIR, migrations_dir)
+    files = []
+    for filename in os.listdir(migrations_dir):
+        match = _MIGRATION_FILE_RE.match(filename)
+        if match: files.append((int(match.group(1)), filename, os.path.join(migrations_dir, filename)))
+    files.sort()
+    versions = [v for v, _, _ in files]
+    if len(versions) != len(set(versions)): raise RuntimeError(f"Duplicate migration versions in {migrations_dir}: {versions}")
+    return files
+
+def _file_checksum(path: str) -> str:
+    with open(path, "rb") as f: return hashlib.sha256(f.read()).hexdigest()
+
+def _sql_literal(value: str) -> str: return "'" + value.replace("'", "''") + "'"
+
+def apply_sqlite_migrations(db_engine, sql_base=None, migrations_dir: str = MIGRATIONS_DIR) -> int:
+    """
+    Aplica las migraciones pendientes, cada una en su propia transacción. Devuelve cuántas se aplicaron.
+    'sql_base' se conserva por compatibilidad de firma; el esquema lo definen los archivos SQL.
+    """
+    if db_engine.dialect.name != "sqlite":
+        log.warning(f"apply_sqlite_migrations skipped: dialect '{db_engine.dialect.name}' is not sqlite."); return 0
+    files = list_migration_files(migrations_dir)
+    latest_version = files[-1][0] if files else 0
+    with _migrations_lock:
+        raw = db_engine.raw_connection()
+        try:
+            conn = raw.driver_connection
+            # Camino rápido: una sola lectura de pragma
+            current_version = conn.execute("PRAGMA user_version").fetchone()[0]
+            if current_version >= latest_version: return 0
+
+            log.info(f"DB schema at version {current_version}, latest is {latest_version}. Checking migrations...")
+            conn.execute("CREATE TABLE IF NOT EXISTS schema_migrations (version INTEGER PRIMARY KEY, filename TEXT NOT NULL, checksum TEXT NOT NULL, applied_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP, baseline INTEGER NOT NULL DEFAULT 0)")
+            conn.commit()
+            applied = {row[0]: (row[1], row[2]) for row in conn.execute("SELECT version, filename, checksum FROM schema_migrations")}
+
+            if not applied and conn.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name='agents'").fetchone():
+                # BD existente sin historial: registrar como aplicadas las migraciones previas al runner
+                baseline = [(v, f, _file_checksum(p)) for v, f, p in files if v <= MIGRATIONS_BASELINE_VERSION]
+                conn.executemany("INSERT INTO schema_migrations (version, filename, checksum, baseline) VALUES (?, ?, ?, 1)", baseline)
+                conn.commit()
+                applied = {v: (f, c) for v, f, c in baseline}
+                log.warning(f"Existing DB without migration history: baselined versions <= {MIGRATIONS_BASELINE_VERSION}.")
+
+            applied_count = 0
+            for version, filename, path in files:
+                checksum = _file_checksum(path)
+                if version in applied:
+                    if applied[version][1] != checksum: log.warning(f"Migration {filename} changed after being applied (checksum mismatch).")
+                    continue
+                with open(path, "r", encoding="utf-8") as f: sql_script = f.read()
+                log.info(f"Applying migration {filename}...")
+                # Como en el procedimiento de 12 pasos de SQLite para reconstruir tablas: las claves foráneas se
+                # desactivan FUERA de la transacción (dentro se ignora) y se verifican con foreign_key_check antes del COMMIT.
+                foreign_keys = conn.execute("PRAGMA foreign_keys").fetchone()[0]
+                conn.execute("PRAGMA foreign_keys = OFF")
+                existing_violations = set(conn.execute("PRAGMA foreign_key_check").fetchall()) # Huérfanos previos: no bloquean la migración
+                try:
+                    conn.executescript(
+                        "BEGIN;\n" + sql_script + "\n;\n"
+                        f"INSERT INTO schema_migrations (version, filename, checksum) VALUES ({version}, {_sql_literal(filename)}, {_sql_literal(checksum)});\n"
+                        f"PRAGMA user_version = {version};\n"
+                    )
+                    violations = [v for v in conn.execute("PRAGMA foreign_key_check").fetchall() if v not in existing_violations]
+                    if violations: raise RuntimeError(f"foreign key violations: {violations[:5]}")
+                    conn.commit()
+                except Exception as e:
+                    if conn.in_transaction: conn.rollback()
+                    log.error(f"Migration {filename} failed and was rolled back: {e}")
+                    raise RuntimeError(f"Migration {filename} failed: {e}") from e
+                finally:
+                    conn.execute(f"PRAGMA foreign_keys = {'ON' if foreign_keys else 'OFF'}")
+                applied_count += 1
+
+            conn.execute(f"PRAGMA user_version = {max([latest_version] + list(applied))}")
+            conn.commit()
+            log.info(f"Migrations finished. Applied {applied_count} pending migration(s).")
+            return applied_count
+        finally:
+            raw.close()
+
+# --- BD Efímera (tests y benchmarks) ---
+def create_ephemeral_engine(mode: str = "memory", migrate: bool = True, **engine_kwargs) -> Engine:
+    """
+    Crea una BD nueva y vacía con el esquema completo aplicado por las migraciones.
+    mode='memory' usa SQLite en memoria (una conexión compartida); mode='tempfile' usa un archivo
+    temporal que se borra al salir del proceso (útil para probar WAL o concurrencia real).
+    """
+    if mode == "memory": url = MEMORY_DATABASE_URL
+    elif mode == "tempfile":
+        fd, path = tempfile.mkstemp(prefix="iatek_", suffix=".db"); os.close(fd); os.remove(path)
+        atexit.register(lambda: [os.remove(p) for p in (path, path + "-wal", path + "-shm", path + "-journal") if os.path.exists(p)])
+        url = f"sqlite:///{path}"
+    else: raise ValueError(f"Unknown ephemeral mode '{mode}'. Options: memory, tempfile")
+    new_engine = create_db_engine(url, **engine_kwargs)
+    if migrate: apply_sqlite_migrations(new_engine)
+    return new_engine
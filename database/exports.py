@@ -0,0 +1,154 @@
+# --- database/exports.py (Exportación en Streaming del Historial) ---
+# Recorre las filas filtradas con un cursor en streaming (stream_results + yield_per) y las escribe por
+# bloques en CSV o Parquet (un row group por bloque), sin construir nunca un DataFrame completo: la memoria
+# queda acotada por EXPORT_CHUNK_ROWS sea cual sea el rango exportado. Las descargas desde el dashboard se
+# escriben en archivos temporales iatek_export_* de como máximo EXPORT_MAX_DOWNLOAD_MB; las más grandes se
+# hacen con esta línea de comandos. Los temporales abandonados se borran pasadas EXPORT_TEMPFILE_MAX_AGE_SECONDS.
+#
+# Uso: python -m database.exports --out historial.parquet [--format parquet|csv] [--since YYYY-MM-DD] [--until YYYY-MM-DD] [--agent-id N]
+
+import io
+import os
+import csv
+import sys
+import glob
+import time
+import logging
+import argparse
+import tempfile
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.engine import Engine
+
+from database.cli import add_date_range_args
+from database.queries_repository import filter_ms_range
+from database.database import get_engine
+from database.models import Query, Agent, epoch_ms_to_datetime
+
+try: # Parquet es opcional: sin pyarrow solo se ofrece CSV
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    PARQUET_AVAILABLE = True
+except ImportError:
+    pa = pq = None
+    PARQUET_AVAILABLE = False
+
+log = logging.getLogger(__name__)
+
+EXPORT_CHUNK_ROWS = int(os.getenv("EXPORT_CHUNK_ROWS", "5000"))
+EXPORT_MAX_DOWNLOAD_MB = float(os.getenv("EXPORT_MAX_DOWNLOAD_MB", "100")) # Tope de los archivos que se descargan desde el dashboard
+EXPORT_TEMPFILE_MAX_AGE_SECONDS = float(os.getenv("EXPORT_TEMPFILE_MAX_AGE_SECONDS", "3600"))
+EXPORT_TEMPFILE_PREFIX = "iatek_export_"
+EXPORT_FORMATS = ("csv", "parquet") if PARQUET_AVAILABLE else ("csv",)
+EXPORT_COLUMNS: Tuple[str, ...] = ("id", "created_at", "agent", "session_id", "query_text", "response_text",
+                                   "success", "response_time_ms", "error_message")
+
+class ExportTooLargeError(RuntimeError):
+    """La exportación superó el tamaño máximo permitido (el archivo parcial ya se borró)."""
+
+def build_export_statement(start_dt: Optional[datetime], end_dt: Optional[datetime], agent_id: Optional[int] = None,
+                           success: Optional[int] = None):
+    """SELECT Core de las columnas exportadas, con los mismos filtros que Historial/Análisis, en orden cronológico."""
+    stmt = select(Query.id, Query.created_at_ms, Agent.name.label("agent"), Query.session_id, Query.query_text, Query.response_text,
+                  Query.success, Query.response_time_ms, Query.error_message).join(Agent, Agent.id == Query.agent_id) \
+        .order_by(Query.created_at_ms, Query.id)
+    stmt = filter_ms_range(stmt, Query.created_at_ms, start_dt, end_dt)
+    if agent_id is not None: stmt = stmt.where(Query.agent_id == agent_id)
+    if success is not None: stmt = stmt.where(Query.success == success)
+    return stmt
+
+def iter_export_chunks(stmt, tz=None, chunk_rows: int = EXPORT_CHUNK_ROWS, db_engine: Optional[Engine] = None) -> Iterator[List[Tuple[Any, ...]]]:
+    """
+    Bloques de como máximo chunk_rows filas (en el orden de EXPORT_COLUMNS), leídos con un cursor en streaming.
+    created_at sale como texto ISO 8601 en la zona 'tz' (UTC por defecto).
+    """
+    db_engine = db_engine or get_engine()
+    with db_engine.connect() as conn:
+        result = conn.execution_options(stream_results=True, yield_per=chunk_rows).execute(stmt)
+        for partition in result.partitions():
+            yield [(r.id, epoch_ms_to_datetime(r.created_at_ms, tz).isoformat(timespec="seconds") if r.created_at_ms else None, r.agent,
+                    r.session_id, r.query_text, r.response_text, bool(r.success), r.response_time_ms, r.error_message) for r in partition]
+
+# --- Escritores ---
+def write_csv(chunks: Iterator[List[Tuple[Any, ...]]], out: io.TextIOBase) -> int:
+    """Escribe CSV (con cabecera) bloque a bloque. Devuelve las filas escritas."""
+    writer = csv.writer(out); writer.writerow(EXPORT_COLUMNS); written = 0
+    for chunk in chunks: writer.writerows(chunk); written += len(chunk)
+    return written
+
+def _parquet_schema():
+    return pa.schema([("id", pa.int64()), ("created_at", pa.string()), ("agent", pa.string()), ("session_id", pa.string()),
+                      ("query_text", pa.string()), ("response_text", pa.string()), ("success", pa.bool_()),
+                      ("response_time_ms", pa.int64()), ("error_message", pa.string())])
+
+def write_parquet(chunks: Iterator[List[Tuple[Any, ...]]], out) -> int:
+    """Escribe Parquet con un row group por bloque (requiere pyarrow). Devuelve las filas escritas."""
+    if not PARQUET_AVAILABLE: raise RuntimeError("Parquet export requires pyarrow (pip install pyarrow).")
+    schema = _parquet_schema(); written = 0
+    with pq.ParquetWriter(out, schema, compression="zstd") as writer:
+        for chunk in chunks:
+            columns = list(zip(*chunk)) if chunk else [[] for _ in EXPORT_COLUMNS]
+            writer.write_table(pa.Table.from_arrays([pa.array(col, type=field.type) for col, field in zip(columns, schema)], schema=schema))
+            written += len(chunk)
+    return written
+
+def _limit_file_size(chunks: Iterator[List[Tuple[Any, ...]]], path: str, max_bytes: int) -> Iterator[List[Tuple[Any, ...]]]:
+    """Deja pasar los bloques mientras 'path' no supere max_bytes (medido antes de cada bloque)."""
+    for chunk in chunks:
+        if os.path.getsize(path) > max_bytes: raise ExportTooLargeError(f"Export exceeds {max_bytes} bytes.")
+        yield chunk
+
+def export_to_file(path: str, fmt: str, stmt, tz=None, chunk_rows: int = EXPORT_CHUNK_ROWS, db_engine: Optional[Engine] = None,
+                   max_bytes: Optional[int] = None) -> int:
+    """Exporta el resultado de 'stmt' a 'path' en el formato indicado. Devuelve las filas escritas."""
+    chunks = iter_export_chunks(stmt, tz, chunk_rows, db_engine)
+    if max_bytes is not None: chunks = _limit_file_size(chunks, path, max_bytes)
+    if fmt == "csv":
+        with open(path, "w", newline="", encoding="utf-8-sig") as f: return write_csv(chunks, f) # BOM: Excel detecta UTF-8
+    if fmt == "parquet": return write_parquet(chunks, path)
+    raise ValueError(f"Unknown export format '{fmt}'. Options: {', '.join(EXPORT_FORMATS)}")
+
+def export_to_tempfile(fmt: str, stmt, tz=None, chunk_rows: int = EXPORT_CHUNK_ROWS,
+                       max_bytes: Optional[int] = int(EXPORT_MAX_DOWNLOAD_MB * 2**20)) -> Tuple[str, int]:
+    """
+    Exporta a un archivo temporal (lo borra quien lo consume o, si nadie lo hace, sweep_stale_exports).
+    Devuelve (ruta, filas); ExportTooLargeError si supera max_bytes.
+    """
+    sweep_stale_exports()
+    fd, path = tempfile.mkstemp(prefix=EXPORT_TEMPFILE_PREFIX, suffix=f".{fmt}"); os.close(fd)
+    try: return path, export_to_file(path, fmt, stmt, tz, chunk_rows, max_bytes=max_bytes)
+    except Exception:
+        os.remove(path); raise
+
+def sweep_stale_exports(max_age_s: float = EXPORT_TEMPFILE_MAX_AGE_SECONDS) -> int:
+    """Borra los temporales de exportación con más de max_age_s segundos (sesiones abandonadas). Devuelve cuántos."""
+    cutoff = time.time() - max_age_s; removed = 0
+    for path in glob.glob(os.path.join(tempfile.gettempdir(), f"{EXPORT_TEMPFILE_PREFIX}*")):
+        try:
+            if os.path.getmtime(path) < cutoff: os.remove(path); removed += 1
+        except FileNotFoundError: pass
+    if removed: log.info(f"Removed {removed} stale export file(s).")
+    return removed
+
+EXPORT_MIME_TYPES: Dict[str, str] = {"csv": "text/csv", "parquet": "application/vnd.apache.parquet"}
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Exporta el historial de consultas en streaming (memoria constante).")
+    parser.add_argument("--out", required=True, help="Archivo de salida.")
+    parser.add_argument("--format", choices=EXPORT_FORMATS, help="Por defecto, según la extensión de --out.")
+    add_date_range_args(parser, until_inclusive=True)
+    parser.add_argument("--agent-id", type=int)
+    parser.add_argument("--chunk-rows", type=int, default=EXPORT_CHUNK_ROWS)
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.WARNING)
+    fmt = args.format or os.path.splitext(args.out)[1].lstrip(".").lower()
+    start = args.since or datetime(1970, 1, 1, tzinfo=timezone.utc)
+    end = (args.until + timedelta(days=1)) if args.until else datetime.now(timezone.utc) + timedelta(days=1)
+    written = export_to_file(args.out, fmt, build_export_statement(start, end, args.agent_id), chunk_rows=args.chunk_rows)
+    print(f"{written} filas exportadas a {args.out}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,35 @@
+-- Archivo: database/migrations/013_align_queries_table.sql
+-- Alinea 'queries' con el modelo Query (session_id, response_text, response_time_ms, error_message...).
+-- La tabla creada en 002 guardaba response_time en segundos (REAL); se convierte a milisegundos
+-- descartando valores fuera de rango (los datos de ejemplo de 002 usan RANDOM()).
+-- Reconstrucción de tabla (procedimiento de 12 pasos de SQLite): PRAGMA foreign_keys no tiene efecto dentro de
+-- una transacción, así que el runner (database/database.py) lo desactiva antes y ejecuta foreign_key_check al final.
+
+CREATE TABLE queries_new (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    agent_id INTEGER NOT NULL REFERENCES agents(id) ON DELETE CASCADE,
+    session_id TEXT,
+    query_text TEXT NOT NULL,
+    response_text TEXT,
+    response_time_ms INTEGER,
+    success INTEGER NOT NULL DEFAULT 1,
+    feedback_score INTEGER,
+    error_message TEXT,
+    created_at TIMESTAMP
+);
+
+INSERT INTO queries_new (id, agent_id, query_text, response_time_ms, success, created_at)
+SELECT
+    id,
+    agent_id,
+    query_text,
+    CASE WHEN response_time BETWEEN 0 AND 3600 THEN CAST(ROUND(response_time * 1000) AS INTEGER) ELSE NULL END,
+    COALESCE(success, 1),
+    created_at
+FROM queries;
+
+DROP TABLE queries;
+ALTER TABLE queries_new RENAME TO queries;
+
+CREATE INDEX IF NOT EXISTS ix_queries_agent_id ON queries (agent_id);
+CREATE INDEX IF NOT EXISTS ix_queries_session_id ON queries (session_id);
@@ -0,0 +1,11 @@
+-- Archivo: database/migrations/014_add_queries_composite_indexes.sql
+-- Índices compuestos alineados con los filtros de Historial y Análisis:
+--   * agente + rango de fechas, ordenado por created_at DESC  -> (agent_id, created_at)
+--   * rango de fechas (+ resultado), ordenado por created_at   -> (created_at, success)
+-- ix_queries_agent_id queda cubierto por el prefijo de (agent_id, created_at).
+
+CREATE INDEX IF NOT EXISTS ix_queries_agent_created ON queries (agent_id, created_at);
+CREATE INDEX IF NOT EXISTS ix_queries_created_success ON queries (created_at, success);
+DROP INDEX IF EXISTS ix_queries_agent_id;
+
+ANALYZE queries;
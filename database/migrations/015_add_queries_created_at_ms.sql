@@ -0,0 +1,18 @@
+-- Archivo: database/migrations/015_add_queries_created_at_ms.sql
+-- created_at se guarda como TEXT y los filtros comparaban cadenas que dependen del formato del offset.
+-- created_at_ms (epoch UTC en milisegundos) permite búsquedas de rango enteras sobre índice.
+-- Los valores sin zona se interpretan como UTC (igual que strftime de SQLite y Análisis de Consultas).
+
+ALTER TABLE queries ADD COLUMN created_at_ms INTEGER NOT NULL DEFAULT 0;
+
+UPDATE queries
+SET created_at_ms = CAST(ROUND((julianday(created_at) - 2440587.5) * 86400000.0) AS INTEGER)
+WHERE created_at IS NOT NULL AND julianday(created_at) IS NOT NULL;
+
+-- Los índices de 014 sobre created_at (texto) se sustituyen por sus equivalentes enteros
+CREATE INDEX IF NOT EXISTS ix_queries_agent_created_ms ON queries (agent_id, created_at_ms);
+CREATE INDEX IF NOT EXISTS ix_queries_created_ms_success ON queries (created_at_ms, success);
+DROP INDEX IF EXISTS ix_queries_agent_created;
+DROP INDEX IF EXISTS ix_queries_created_success;
+
+ANALYZE queries;
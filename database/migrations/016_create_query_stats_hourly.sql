@@ -0,0 +1,45 @@
+-- Archivo: database/migrations/016_create_query_stats_hourly.sql
+-- Agregados por agente y hora (UTC) de 'queries', mantenidos de forma incremental por el escritor de
+-- consultas (database/query_writer.py) y reconstruibles con: python -m database.rollups rebuild
+-- latency_histogram: JSON con el conteo por cubeta de database/rollups.py:LATENCY_BUCKETS_MS
+-- (<=100, <=250, <=500, <=1000, <=2000, <=5000, <=10000, <=20000, <=30000, <=60000, >60000 ms).
+
+CREATE TABLE IF NOT EXISTS query_stats_hourly (
+    agent_id INTEGER NOT NULL REFERENCES agents(id) ON DELETE CASCADE,
+    hour_start_ms INTEGER NOT NULL,
+    query_count INTEGER NOT NULL DEFAULT 0,
+    success_count INTEGER NOT NULL DEFAULT 0,
+    response_count INTEGER NOT NULL DEFAULT 0,
+    response_time_sum REAL NOT NULL DEFAULT 0,
+    response_time_sumsq REAL NOT NULL DEFAULT 0,
+    latency_histogram TEXT NOT NULL DEFAULT '[]',
+    PRIMARY KEY (agent_id, hour_start_ms)
+);
+
+CREATE INDEX IF NOT EXISTS ix_query_stats_hourly_hour ON query_stats_hourly (hour_start_ms);
+
+-- Backfill con el historial existente
+INSERT INTO query_stats_hourly (agent_id, hour_start_ms, query_count, success_count, response_count, response_time_sum, response_time_sumsq, latency_histogram)
+SELECT
+    agent_id,
+    (created_at_ms / 3600000) * 3600000,
+    COUNT(*),
+    SUM(CASE WHEN success THEN 1 ELSE 0 END),
+    SUM(CASE WHEN response_time_ms > 0 THEN 1 ELSE 0 END),
+    COALESCE(SUM(CASE WHEN response_time_ms > 0 THEN response_time_ms END), 0),
+    COALESCE(SUM(CASE WHEN response_time_ms > 0 THEN 1.0 * response_time_ms * response_time_ms END), 0),
+    json_array(
+        SUM(CASE WHEN response_time_ms > 0 AND response_time_ms <= 100 THEN 1 ELSE 0 END),
+        SUM(CASE WHEN response_time_ms > 100 AND response_time_ms <= 250 THEN 1 ELSE 0 END),
+        SUM(CASE WHEN response_time_ms > 250 AND response_time_ms <= 500 THEN 1 ELSE 0 END),
+        SUM(CASE WHEN response_time_ms > 500 AND response_time_ms <= 1000 THEN 1 ELSE 0 END),
+        SUM(CASE WHEN response_time_ms > 1000 AND response_time_ms <= 2000 THEN 1 ELSE 0 END),
+        SUM(CASE WHEN response_time_ms > 2000 AND response_time_ms <= 5000 THEN 1 ELSE 0 END),
+        SUM(CASE WHEN response_time_ms > 5000 AND response_time_ms <= 10000 THEN 1 ELSE 0 END),
+        SUM(CASE WHEN response_time_ms > 10000 AND response_time_ms <= 20000 THEN 1 ELSE 0 END),
+        SUM(CASE WHEN response_time_ms > 20000 AND response_time_ms <= 30000 THEN 1 ELSE 0 END),
+        SUM(CASE WHEN response_time_ms > 30000 AND response_time_ms <= 60000 THEN 1 ELSE 0 END),
+        SUM(CASE WHEN response_time_ms > 60000 THEN 1 ELSE 0 END)
+    )
+FROM queries
+GROUP BY agent_id, created_at_ms / 3600000;
@@ -0,0 +1,7 @@
+-- Archivo: database/migrations/017_add_latency_sketch_to_rollups.sql
+-- DDSketch serializado (utils/sketches.py) con los tiempos de respuesta de cada (agente, hora).
+-- Los sketches se fusionan al leer para obtener p50/p90/p99 de cualquier rango sin escanear 'queries'.
+-- SQL no puede calcularlos: las filas existentes quedan en NULL y las completa
+-- database/rollups.py:backfill_missing_sketches() al arrancar la app (o 'python -m database.rollups rebuild').
+
+ALTER TABLE query_stats_hourly ADD COLUMN latency_sketch BLOB;
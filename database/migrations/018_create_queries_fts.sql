@@ -0,0 +1,28 @@
+-- Archivo: database/migrations/018_create_queries_fts.sql
+-- Índice de texto completo (FTS5) sobre query_text y response_text para la búsqueda del Historial.
+-- Tabla de contenido externo: el texto vive solo en 'queries'; 'queries_fts' guarda el índice invertido
+-- (rowid = queries.id). Los triggers lo mantienen sincronizado y 'rebuild' indexa el historial existente.
+-- remove_diacritics 2: 'cedula' encuentra 'cédula'.
+
+CREATE VIRTUAL TABLE IF NOT EXISTS queries_fts USING fts5(
+    query_text,
+    response_text,
+    content='queries',
+    content_rowid='id',
+    tokenize='unicode61 remove_diacritics 2'
+);
+
+CREATE TRIGGER IF NOT EXISTS queries_fts_after_insert AFTER INSERT ON queries BEGIN
+    INSERT INTO queries_fts (rowid, query_text, response_text) VALUES (new.id, new.query_text, new.response_text);
+END;
+
+CREATE TRIGGER IF NOT EXISTS queries_fts_after_delete AFTER DELETE ON queries BEGIN
+    INSERT INTO queries_fts (queries_fts, rowid, query_text, response_text) VALUES ('delete', old.id, old.query_text, old.response_text);
+END;
+
+CREATE TRIGGER IF NOT EXISTS queries_fts_after_update AFTER UPDATE OF query_text, response_text ON queries BEGIN
+    INSERT INTO queries_fts (queries_fts, rowid, query_text, response_text) VALUES ('delete', old.id, old.query_text, old.response_text);
+    INSERT INTO queries_fts (rowid, query_text, response_text) VALUES (new.id, new.query_text, new.response_text);
+END;
+
+INSERT INTO queries_fts (queries_fts) VALUES ('rebuild');
@@ -0,0 +1,8 @@
+-- Archivo: database/migrations/019_add_queries_session_created_index.sql
+-- Vista de conversaciones del Historial: la transcripción de una sesión y su primera pregunta se leen
+-- en orden cronológico. (session_id, created_at_ms) sirve ambas sin ordenar y cubre al índice simple.
+
+CREATE INDEX IF NOT EXISTS ix_queries_session_created ON queries (session_id, created_at_ms);
+DROP INDEX IF EXISTS ix_queries_session_id;
+
+ANALYZE queries;
@@ -0,0 +1,14 @@
+-- Archivo: database/migrations/020_create_query_terms_hourly.sql
+-- Índice de frecuencia de términos de query_text por (hora UTC, agente, término) para el análisis de texto
+-- de la página 07. Las horas UTC no dependen de la zona configurada: los rangos de días locales se suman por
+-- horas al consultar, como en query_stats_hourly. La tokenización (sin acentos, sin stopwords) se hace en
+-- Python, así que esta migración solo crea la tabla: el escritor de consultas la mantiene y app.py la rellena
+-- con el historial existente (o a mano con: python -m database.term_index rebuild).
+
+CREATE TABLE IF NOT EXISTS query_terms_hourly (
+    hour_start_ms INTEGER NOT NULL,
+    agent_id INTEGER NOT NULL REFERENCES agents(id) ON DELETE CASCADE,
+    term VARCHAR(64) NOT NULL,
+    count INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (hour_start_ms, agent_id, term)
+) WITHOUT ROWID;
@@ -1,9 +1,10 @@
 # --- database/models.py (Añadir Modelos para Opciones) ---
 
-from sqlalchemy import create_engine, Column, Integer, String, DateTime, Float, ForeignKey, Text, Index, Boolean
+from sqlalchemy import create_engine, Column, Integer, BigInteger, String, DateTime, Float, ForeignKey, Text, Index, Boolean, LargeBinary
 from sqlalchemy.orm import DeclarativeBase, relationship
 from sqlalchemy.sql import func
-from datetime import datetime
+from datetime import datetime, timezone
+from typing import Optional
 import pytz
 
 # Configuración Timezone (con fallback)
@@ -17,6 +18,22 @@ except Exception:
 def get_current_time_colombia():
     return datetime.now(colombia_tz)
 
+def datetime_to_epoch_ms(value: Optional[datetime]) -> Optional[int]:
+    """Milisegundos desde epoch (UTC). Un datetime sin zona se interpreta como UTC, igual que SQLite."""
+    if value is None: return None
+    if value.tzinfo is None: value = value.replace(tzinfo=timezone.utc)
+    return int(value.timestamp() * 1000)
+
+def epoch_ms_to_datetime(value: Optional[int], tz=None) -> Optional[datetime]:
+    """Inverso de datetime_to_epoch_ms, devuelto en la zona 'tz' (UTC por defecto)."""
+    if value is None: return None
+    return datetime.fromtimestamp(value / 1000, tz=timezone.utc).astimezone(tz or timezone.utc)
+
+def _created_at_ms_default(context) -> int:
+    """Default de Query.created_at_ms: deriva del created_at de la misma fila (también en inserts Core por lotes)."""
+    created_at = context.get_current_parameters().get('created_at')
+    return datetime_to_epoch_ms(created_at or get_current_time_colombia())
+
 class Base(DeclarativeBase): pass
 
 class Configuration(Base):
@@ -61,13 +78,40 @@ class Agent(Base):
 
 class Query(Base):
     __tablename__ = 'queries'; id = Column(Integer, primary_key=True)
-    agent_id = Column(Integer, ForeignKey('agents.id', ondelete='CASCADE'), nullable=False, index=True)
-    session_id = Column(String(36), index=True); query_text = Column(Text, nullable=False); response_text = Column(Text)
+    agent_id = Column(Integer, ForeignKey('agents.id', ondelete='CASCADE'), nullable=False)
+    session_id = Column(String(36)); query_text = Column(Text, nullable=False); response_text = Column(Text)
     response_time_ms = Column(Integer); success = Column(Boolean, nullable=False, default=True); feedback_score = Column(Integer); error_message = Column(Text)
     created_at = Column(DateTime(timezone=True), default=get_current_time_colombia)
+    created_at_ms = Column(BigInteger, nullable=False, default=_created_at_ms_default) # Epoch UTC en ms: filtros de rango y orden (migración 015)
     agent = relationship('Agent', back_populates='queries')
+    # Índices compuestos para Historial/Análisis (migraciones 014, 015 y 019)
+    __table_args__ = (Index('ix_queries_agent_created_ms', 'agent_id', 'created_at_ms'), Index('ix_queries_created_ms_success', 'created_at_ms', 'success'),
+                      Index('ix_queries_session_created', 'session_id', 'created_at_ms'),)
     def __repr__(self): return f"<Query(id={self.id}, agent_id={self.agent_id})>"
 
+class QueryStatsHourly(Base):
+    """Agregados por agente y hora UTC de 'queries' (migración 016, mantenidos por database/rollups.py)."""
+    __tablename__ = 'query_stats_hourly'
+    agent_id = Column(Integer, ForeignKey('agents.id', ondelete='CASCADE'), primary_key=True)
+    hour_start_ms = Column(BigInteger, primary_key=True) # Inicio de la hora, epoch UTC en ms
+    query_count = Column(Integer, nullable=False, default=0); success_count = Column(Integer, nullable=False, default=0)
+    response_count = Column(Integer, nullable=False, default=0) # Filas con response_time_ms > 0
+    response_time_sum = Column(Float, nullable=False, default=0); response_time_sumsq = Column(Float, nullable=False, default=0)
+    latency_histogram = Column(Text, nullable=False, default='[]') # JSON: conteos por cubeta de LATENCY_BUCKETS_MS
+    latency_sketch = Column(LargeBinary) # DDSketch serializado de response_time_ms (migración 017)
+    __table_args__ = (Index('ix_query_stats_hourly_hour', 'hour_start_ms'),)
+    def __repr__(self): return f"<QueryStatsHourly(agent_id={self.agent_id}, hour_start_ms={self.hour_start_ms})>"
+
+class QueryTermHourly(Base):
+    """Frecuencia de términos de query_text por hora UTC y agente (migración 020, mantenida por database/term_index.py)."""
+    __tablename__ = 'query_terms_hourly'
+    hour_start_ms = Column(BigInteger, primary_key=True) # Inicio de la hora UTC, epoch en ms
+    agent_id = Column(Integer, ForeignKey('agents.id', ondelete='CASCADE'), primary_key=True)
+    term = Column(String(64), primary_key=True) # Normalizado con utils/text_analysis.py:tokenize
+    count = Column(Integer, nullable=False, default=0)
+    __table_args__ = ({'sqlite_with_rowid': False},)
+    def __repr__(self): return f"<QueryTermHourly(hour_start_ms={self.hour_start_ms}, agent_id={self.agent_id}, term='{self.term}')>"
+
 # --- NUEVOS MODELOS PARA OPCIONES DE AGENTE ---
 
 class AgentOptionBase(Base):
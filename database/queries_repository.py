@@ -0,0 +1,227 @@
+# --- database/queries_repository.py (Consultas SQL sobre 'queries' para Historial y Análisis) ---
+# Las páginas construyen aquí sus consultas para que el mismo SQL pueda verificarse con
+# EXPLAIN QUERY PLAN (ver database/query_plans.py) sin ejecutar Streamlit.
+# Los rangos de fechas se filtran sobre created_at_ms (entero, indexado), nunca sobre el texto de created_at.
+
+import re
+from bisect import bisect_right
+from datetime import datetime, timezone
+from typing import List, Optional, Tuple
+
+from sqlalchemy import func, or_, and_, case, text, literal_column, table, column
+from sqlalchemy.orm import Session as SQLAlchemySession, Query as ORMQuery
+
+from database.models import Query, Agent, QueryStatsHourly, QueryTermHourly, datetime_to_epoch_ms
+from database.term_index import term_hour_range
+
+HistoryCursor = Tuple[int, int] # (created_at_ms, id) de la última fila de una página
+PREVIEW_CHARS = 80 # Caracteres de consulta/respuesta que muestra la tabla del historial
+SQL_DATETIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+# --- Hora local en SQL ---
+def utc_offsets_ms(tz, start_dt: Optional[datetime], end_dt: Optional[datetime]) -> List[Tuple[int, int]]:
+    """
+    Desfases UTC de 'tz' vigentes en [start_dt, end_dt) como [(desde_ms, desfase_ms), ...] ascendente.
+    Con zonas pytz se leen sus transiciones (cambios de horario); con zonas fijas es un único desfase.
+    """
+    tz = tz or timezone.utc
+    start_ms = datetime_to_epoch_ms(start_dt) if start_dt else None; end_ms = datetime_to_epoch_ms(end_dt) if end_dt else None
+    transitions = getattr(tz, '_utc_transition_times', None); infos = getattr(tz, '_transition_info', None)
+    if not transitions or not infos:
+        reference = start_dt or datetime.now(timezone.utc)
+        return [(0, int(reference.astimezone(tz).utcoffset().total_seconds() * 1000))]
+    transition_ms = [datetime_to_epoch_ms(t) for t in transitions] # Instantes UTC sin zona
+    first = max(0, bisect_right(transition_ms, start_ms) - 1) if start_ms is not None else 0
+    offsets = [(0, int(infos[first][0].total_seconds() * 1000))]
+    for idx in range(first + 1, len(transitions)):
+        if end_ms is not None and transition_ms[idx] >= end_ms: break
+        offsets.append((transition_ms[idx], int(infos[idx][0].total_seconds() * 1000)))
+    return offsets
+
+def local_epoch_ms_expr(ms_column, tz, start_dt: Optional[datetime], end_dt: Optional[datetime]):
+    """Expresión SQL: epoch ms UTC desplazado a la hora local de 'tz' (CASE solo si el rango cruza un cambio de horario)."""
+    offsets = utc_offsets_ms(tz, start_dt, end_dt)
+    if len(offsets) == 1: return ms_column + offsets[0][1]
+    return case(*[(ms_column >= since_ms, ms_column + offset_ms) for since_ms, offset_ms in reversed(offsets[1:])], else_=ms_column + offsets[0][1])
+
+def local_datetime_text(ms_column, tz, start_dt: Optional[datetime], end_dt: Optional[datetime], fmt: str = SQL_DATETIME_FORMAT):
+    """strftime de SQLite sobre la hora local: la fecha llega ya formateada como texto."""
+    return func.strftime(fmt, local_epoch_ms_expr(ms_column, tz, start_dt, end_dt) / 1000, 'unixepoch')
+
+def filter_ms_range(query_builder, ms_column, start_dt: Optional[datetime], end_dt: Optional[datetime]):
+    """[start_dt, end_dt) sobre una columna de epoch ms (Query ORM o select Core); sin filtro si falta un extremo."""
+    if not (start_dt and end_dt): return query_builder
+    return query_builder.where(ms_column >= datetime_to_epoch_ms(start_dt), ms_column < datetime_to_epoch_ms(end_dt))
+
+def _preview(text_column, chars: int = PREVIEW_CHARS):
+    """Primeros 'chars' caracteres (con '...' si hay más), recortados en SQL para no transferir el texto completo."""
+    return func.substr(text_column, 1, chars) + case((func.length(text_column) > chars, '...'), else_='')
+
+def build_history_query(db: SQLAlchemySession, start_dt: Optional[datetime], end_dt: Optional[datetime],
+                        agent_id: Optional[int] = None, success: Optional[int] = None,
+                        after: Optional[HistoryCursor] = None, tz=None) -> ORMQuery:
+    """
+    Historial de Conversaciones: turnos filtrados, más recientes primero.
+    Proyecta solo las columnas de la tabla (id, created_at_ms, fecha_hora local, agent_name, query_preview,
+    response_preview, success, response_time_ms): el recorte a PREVIEW_CHARS y el formato de la fecha en 'tz'
+    se hacen en SQL, así que los textos completos y los objetos Agent nunca llegan a Python.
+    'after' pagina por keyset: devuelve solo filas más antiguas que ese cursor, de modo que cualquier
+    página cuesta lo mismo que la primera (búsqueda en el índice, sin OFFSET).
+    """
+    query_builder = db.query(
+        Query.id, Query.created_at_ms, local_datetime_text(Query.created_at_ms, tz, start_dt, end_dt).label('fecha_hora'),
+        Agent.name.label('agent_name'), _preview(Query.query_text).label('query_preview'), _preview(Query.response_text).label('response_preview'),
+        Query.success, Query.response_time_ms,
+    ).join(Agent, Agent.id == Query.agent_id).order_by(Query.created_at_ms.desc(), Query.id.desc())
+    start_ms = datetime_to_epoch_ms(start_dt) if start_dt and end_dt else None
+    end_ms = datetime_to_epoch_ms(end_dt) if start_dt and end_dt else None # Menor que el inicio del día siguiente
+    if after is not None:
+        # El cursor se vuelve la cota superior del rango del índice; el OR solo resuelve los empates por id
+        after_ms, after_id = after
+        end_ms = after_ms + 1 if end_ms is None else min(end_ms, after_ms + 1)
+        query_builder = query_builder.filter(or_(Query.created_at_ms < after_ms, and_(Query.created_at_ms == after_ms, Query.id < after_id)))
+    if start_ms is not None: query_builder = query_builder.filter(Query.created_at_ms >= start_ms)
+    if end_ms is not None: query_builder = query_builder.filter(Query.created_at_ms < end_ms)
+    if agent_id is not None: query_builder = query_builder.filter(Query.agent_id == agent_id)
+    if success is not None: query_builder = query_builder.filter(Query.success == success) # 1 éxito, 0 fallo
+    return query_builder
+
+# --- Búsqueda de Texto Completo (FTS5, migración 018) ---
+queries_fts = table('queries_fts', column('rowid'))
+_FTS_TERM_RE = re.compile(r"\w+", re.UNICODE)
+SNIPPET_START, SNIPPET_END = "\x02", "\x03" # Marcadores de coincidencia; la página los convierte en <mark>
+SNIPPET_TOKENS = 16
+
+def to_fts_query(search_text: str) -> Optional[str]:
+    """
+    Texto libre del usuario a consulta FTS5 segura: cada palabra entre comillas (AND implícito) y la
+    última como prefijo ("renov" encuentra "renovar"). Los operadores de FTS5 no se interpretan.
+    """
+    terms = _FTS_TERM_RE.findall(search_text or "")
+    if not terms: return None
+    quoted = [f'"{term}"' for term in terms]; quoted[-1] += "*"
+    return " ".join(quoted)
+
+def build_history_search_query(db: SQLAlchemySession, fts_query: str, start_dt: Optional[datetime], end_dt: Optional[datetime],
+                               agent_id: Optional[int] = None, success: Optional[int] = None, tz=None) -> ORMQuery:
+    """
+    Historial filtrado por coincidencia de texto completo, ordenado por relevancia (bm25) y con snippets
+    de consulta y respuesta. Como build_history_query, proyecta solo lo que muestra la página (id, created_at_ms,
+    fecha_hora local, agent_name, success, response_time_ms, rank, query_snippet, response_snippet).
+    """
+    fts = literal_column('queries_fts')
+    snippet = lambda col_idx: func.snippet(fts, col_idx, SNIPPET_START, SNIPPET_END, '…', SNIPPET_TOKENS)
+    rank = func.bm25(fts).label('rank')
+    query_builder = db.query(
+        Query.id, Query.created_at_ms, local_datetime_text(Query.created_at_ms, tz, start_dt, end_dt).label('fecha_hora'),
+        Agent.name.label('agent_name'), Query.success, Query.response_time_ms,
+        rank, snippet(0).label('query_snippet'), snippet(1).label('response_snippet'),
+    ).select_from(queries_fts).join(Query, Query.id == queries_fts.c.rowid).join(Agent, Agent.id == Query.agent_id) \
+        .filter(text("queries_fts MATCH :fts_query").bindparams(fts_query=fts_query)).order_by(rank, Query.id.desc())
+    query_builder = filter_ms_range(query_builder, Query.created_at_ms, start_dt, end_dt)
+    if agent_id is not None: query_builder = query_builder.filter(Query.agent_id == agent_id)
+    if success is not None: query_builder = query_builder.filter(Query.success == success)
+    return query_builder
+
+# --- Conversaciones (agrupadas por session_id) ---
+FIRST_QUESTION_CHARS = 120
+
+def build_conversation_summary_query(db: SQLAlchemySession, start_dt: Optional[datetime], end_dt: Optional[datetime],
+                                     agent_id: Optional[int] = None, success: Optional[int] = None) -> ORMQuery:
+    """
+    Una fila por conversación con turnos en el rango/filtros: turnos, inicio y fin, agente, primera pregunta
+    (recortada en SQL) y turnos fallidos. Ordenadas por última actividad; las filas sin session_id se omiten.
+    Con 'success' se listan las conversaciones que tienen algún turno con ese resultado.
+    """
+    first_turn = db.query(func.substr(Query.query_text, 1, FIRST_QUESTION_CHARS)).filter(Query.session_id == literal_column('grouped.session_id')) \
+        .order_by(Query.created_at_ms, Query.id).limit(1)
+    grouped = db.query(
+        Query.session_id.label('session_id'), func.min(Query.agent_id).label('agent_id'), func.count(Query.id).label('turns'),
+        func.min(Query.created_at_ms).label('started_ms'), func.max(Query.created_at_ms).label('last_ms'),
+        func.sum(case((Query.success == False, 1), else_=0)).label('failed_turns'),
+    ).filter(Query.session_id.isnot(None)).group_by(Query.session_id)
+    grouped = filter_ms_range(grouped, Query.created_at_ms, start_dt, end_dt)
+    if agent_id is not None: grouped = grouped.filter(Query.agent_id == agent_id)
+    if success is not None: grouped = grouped.having(func.sum(case((Query.success == success, 1), else_=0)) > 0)
+    grouped = grouped.subquery('grouped')
+    return db.query(
+        grouped.c.session_id, grouped.c.turns, grouped.c.started_ms, grouped.c.last_ms, grouped.c.failed_turns,
+        Agent.name.label('agent_name'), first_turn.scalar_subquery().label('first_question'),
+    ).outerjoin(Agent, Agent.id == grouped.c.agent_id).order_by(grouped.c.last_ms.desc(), grouped.c.session_id)
+
+def build_session_transcript_query(db: SQLAlchemySession, session_id: str) -> ORMQuery:
+    """Turnos de una conversación en orden cronológico (índice (session_id, created_at_ms))."""
+    return db.query(Query.id, Query.created_at_ms, Query.query_text, Query.response_text, Query.success,
+                    Query.response_time_ms, Query.error_message).filter(Query.session_id == session_id).order_by(Query.created_at_ms, Query.id)
+
+SERIES_BUCKET_FORMATS = {'hour': '%Y-%m-%d %H:00:00', 'day': '%Y-%m-%d'}
+HOURLY_SERIES_MAX_DAYS = 3 # Rangos de hasta estos días se agrupan por hora; los demás, por día
+
+def series_bucket(start_dt: Optional[datetime], end_dt: Optional[datetime]) -> str:
+    """'hour' para rangos cortos, 'day' en otro caso."""
+    return 'hour' if start_dt and end_dt and (end_dt - start_dt).total_seconds() <= HOURLY_SERIES_MAX_DAYS * 86400 else 'day'
+
+def build_volume_series_query(db: SQLAlchemySession, start_dt: Optional[datetime], end_dt: Optional[datetime],
+                              agent_id: Optional[int] = None, tz=None, bucket: str = 'day') -> ORMQuery:
+    """
+    Serie de volumen y tasa de éxito por día (u hora) local en 'tz', agregada en SQL desde 'query_stats_hourly':
+    devuelve una fila por cubeta con actividad (bucket, query_count, success_count, success_rate en %).
+    Cada hora UTC se asigna a la cubeta local de su inicio (exacto con desfases de horas completas).
+    """
+    rollup = QueryStatsHourly
+    bucket_expr = local_datetime_text(rollup.hour_start_ms, tz, start_dt, end_dt, SERIES_BUCKET_FORMATS[bucket]).label('bucket')
+    query_count = func.sum(rollup.query_count); success_count = func.sum(rollup.success_count)
+    query_base = db.query(
+        bucket_expr, query_count.label('query_count'), success_count.label('success_count'),
+        (success_count * 100.0 / query_count).label('success_rate'),
+    ).group_by(bucket_expr).having(query_count > 0).order_by(bucket_expr)
+    query_base = filter_ms_range(query_base, rollup.hour_start_ms, start_dt, end_dt)
+    if agent_id is not None: query_base = query_base.filter(rollup.agent_id == agent_id)
+    return query_base
+
+def build_latency_rollup_query(db: SQLAlchemySession, start_dt: Optional[datetime], end_dt: Optional[datetime],
+                               agent_id: Optional[int] = None) -> ORMQuery:
+    """Sumas de tiempo de respuesta y sketches por (agente, hora) para fusionar percentiles (database/rollups.py)."""
+    rollup = QueryStatsHourly
+    query_base = db.query(rollup.response_count, rollup.response_time_sum, rollup.latency_sketch).filter(rollup.response_count > 0)
+    query_base = filter_ms_range(query_base, rollup.hour_start_ms, start_dt, end_dt)
+    if agent_id is not None: query_base = query_base.filter(rollup.agent_id == agent_id)
+    return query_base
+
+TOP_TERMS_LIMIT = 20
+
+def build_top_terms_query(db: SQLAlchemySession, start_dt: Optional[datetime], end_dt: Optional[datetime],
+                          agent_id: Optional[int] = None, limit: int = TOP_TERMS_LIMIT) -> ORMQuery:
+    """
+    Términos más frecuentes de las consultas desde 'query_terms_hourly' (term, frequency).
+    La tabla va por horas UTC: los rangos de días locales (zonas de desfase entero) son exactos y, si no, ambos
+    extremos se redondean a la hora más cercana (ver term_hour_range).
+    """
+    terms = QueryTermHourly; frequency = func.sum(terms.count)
+    query_base = db.query(terms.term, frequency.label('frequency')).group_by(terms.term).order_by(frequency.desc(), terms.term)
+    if start_dt and end_dt:
+        start_ms, end_ms = term_hour_range(start_dt, end_dt)
+        query_base = query_base.filter(terms.hour_start_ms >= start_ms, terms.hour_start_ms < end_ms)
+    if agent_id is not None: query_base = query_base.filter(terms.agent_id == agent_id)
+    return query_base.limit(limit)
+
+def build_term_trend_query(db: SQLAlchemySession, start_dt: datetime, end_dt: datetime, agent_id: Optional[int] = None) -> ORMQuery:
+    """
+    Conteo de cada término en el rango (current) y en el periodo anterior de la misma duración (previous),
+    desde 'query_terms_hourly', para detectar términos emergentes. Mismo redondeo de horas que build_top_terms_query.
+    """
+    terms = QueryTermHourly
+    start_ms, end_ms = term_hour_range(start_dt, end_dt)
+    previous_start_ms = start_ms - (end_ms - start_ms)
+    is_current = terms.hour_start_ms >= start_ms
+    query_base = db.query(
+        terms.term, func.sum(case((is_current, terms.count), else_=0)).label('current'), func.sum(case((is_current, 0), else_=terms.count)).label('previous'),
+    ).filter(terms.hour_start_ms >= previous_start_ms, terms.hour_start_ms < end_ms).group_by(terms.term)
+    if agent_id is not None: query_base = query_base.filter(terms.agent_id == agent_id)
+    return query_base
+
+def build_query_text_query(db: SQLAlchemySession, start_dt: Optional[datetime], end_dt: Optional[datetime], agent_id: Optional[int] = None) -> ORMQuery:
+    """Solo query_text del rango, para recorrerlo en streaming (análisis de frases de utils/ngrams.py)."""
+    query_base = filter_ms_range(db.query(Query.query_text), Query.created_at_ms, start_dt, end_dt)
+    if agent_id is not None: query_base = query_base.filter(Query.agent_id == agent_id)
+    return query_base
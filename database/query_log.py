@@ -0,0 +1,168 @@
+# --- database/query_log.py (Instrumentación de Sentencias SQL) ---
+# Hooks before/after_cursor_execute del engine: huella normalizada de cada sentencia, duración y filas
+# afectadas, agrupadas por página y por rerun de Streamlit. Las sentencias que superan DB_SLOW_QUERY_MS
+# se escriben en el logger 'database.slow_queries' (y en DB_SLOW_QUERY_LOG si se define un archivo).
+# No importa database.database para evitar imports circulares: el scope de rerun llama begin/end_render.
+
+import os
+import re
+import time
+import logging
+import threading
+from collections import deque
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Optional, Dict, List, Any, Deque, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+log = logging.getLogger(__name__)
+slow_log = logging.getLogger("database.slow_queries")
+
+SLOW_QUERY_MS = float(os.getenv("DB_SLOW_QUERY_MS", "250"))
+SLOW_QUERY_LOG_PATH = os.getenv("DB_SLOW_QUERY_LOG") # Archivo opcional para el log de consultas lentas
+MAX_FINGERPRINTS = 500      # Huellas distintas retenidas (se descartan las de menor tiempo total)
+LATENCY_SAMPLES = 512       # Muestras por huella para calcular p95
+RENDER_SAMPLES = 200        # Renders retenidos por página
+NO_PAGE_LABEL = "(fuera de página)" # Sentencias fuera de un rerun_session_scope (sidebar, lecturas a nivel de módulo, hilos)
+
+if SLOW_QUERY_LOG_PATH and not any(isinstance(h, logging.FileHandler) for h in slow_log.handlers):
+    _handler = logging.FileHandler(SLOW_QUERY_LOG_PATH, encoding="utf-8")
+    _handler.setFormatter(logging.Formatter("%(asctime)s %(message)s"))
+    slow_log.addHandler(_handler)
+
+# --- Huella de Sentencia ---
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_RE = re.compile(r"\b\d+(?:\.\d+)?\b")
+_IN_LIST_RE = re.compile(r"\bIN\s*\(\s*(?:\?|%\(\w+\)s|:\w+)(?:\s*,\s*(?:\?|%\(\w+\)s|:\w+))*\s*\)", re.IGNORECASE)
+_VALUES_RE = re.compile(r"\bVALUES\s*(\([^()]*\))(?:\s*,\s*\([^()]*\))+", re.IGNORECASE)
+_SPACES_RE = re.compile(r"\s+")
+
+def fingerprint(statement: str) -> str:
+    """Normaliza literales, listas IN y VALUES múltiples para agrupar sentencias equivalentes."""
+    fp = _STRING_RE.sub("?", statement)
+    fp = _NUMBER_RE.sub("?", fp)
+    fp = _IN_LIST_RE.sub("IN (...)", fp)
+    fp = _VALUES_RE.sub(r"VALUES \1, ...", fp)
+    return _SPACES_RE.sub(" ", fp).strip()
+
+def _percentile(samples: List[float], pct: float) -> float:
+    if not samples: return 0.0
+    ordered = sorted(samples); idx = min(len(ordered) - 1, max(0, int(round(pct / 100.0 * (len(ordered) - 1)))))
+    return ordered[idx]
+
+# --- Acumuladores ---
+class StatementStats:
+    __slots__ = ("count", "total_ms", "max_ms", "rows", "samples")
+    def __init__(self):
+        self.count = 0; self.total_ms = 0.0; self.max_ms = 0.0; self.rows = 0
+        self.samples: Deque[float] = deque(maxlen=LATENCY_SAMPLES)
+
+class RenderStats:
+    __slots__ = ("renders", "statements", "sql_ms")
+    def __init__(self):
+        self.renders = 0
+        self.statements: Deque[int] = deque(maxlen=RENDER_SAMPLES)
+        self.sql_ms: Deque[float] = deque(maxlen=RENDER_SAMPLES)
+
+class _RenderCounter:
+    __slots__ = ("page", "statements", "sql_ms")
+    def __init__(self, page: Optional[str]): self.page = page; self.statements = 0; self.sql_ms = 0.0
+
+class QueryStatsCollector:
+    """Estadísticas de sentencias compartidas por todo el proceso (todas las sesiones)."""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._statements: Dict[Tuple[str, str], StatementStats] = {}
+        self._renders: Dict[str, RenderStats] = {}
+        self._slow: Deque[Dict[str, Any]] = deque(maxlen=100)
+        self.started_at = datetime.now()
+
+    def record_statement(self, page: Optional[str], statement: str, duration_ms: float, rows: Optional[int]) -> None:
+        key = (page or NO_PAGE_LABEL, fingerprint(statement))
+        with self._lock:
+            stats = self._statements.get(key)
+            if stats is None:
+                if len(self._statements) >= MAX_FINGERPRINTS:
+                    del self._statements[min(self._statements, key=lambda k: self._statements[k].total_ms)]
+                stats = self._statements[key] = StatementStats()
+            stats.count += 1; stats.total_ms += duration_ms; stats.max_ms = max(stats.max_ms, duration_ms)
+            if rows is not None and rows >= 0: stats.rows += rows
+            stats.samples.append(duration_ms)
+            if duration_ms >= SLOW_QUERY_MS:
+                self._slow.append({"Fecha": datetime.now(), "Página": key[0], "Duración (ms)": round(duration_ms, 1), "Sentencia": key[1]})
+        if duration_ms >= SLOW_QUERY_MS:
+            slow_log.warning(f"SLOW {duration_ms:.1f} ms page='{key[0]}' rows={rows}: {key[1]}")
+
+    def record_render(self, page: Optional[str], statements: int, sql_ms: float) -> None:
+        with self._lock:
+            stats = self._renders.setdefault(page or NO_PAGE_LABEL, RenderStats())
+            stats.renders += 1; stats.statements.append(statements); stats.sql_ms.append(sql_ms)
+
+    def top_statements(self, limit: int = 20) -> List[Dict[str, Any]]:
+        """Sentencias ordenadas por tiempo total acumulado."""
+        with self._lock: items = [(k, s.count, s.total_ms, s.max_ms, s.rows, list(s.samples)) for k, s in self._statements.items()]
+        items.sort(key=lambda item: item[2], reverse=True)
+        return [{
+            "Página": page, "Sentencia": fp, "Ejecuciones": count, "Total (ms)": round(total, 1),
+            "Media (ms)": round(total / count, 2) if count else 0.0, "p95 (ms)": round(_percentile(samples, 95), 2),
+            "Máx (ms)": round(max_ms, 1), "Filas": rows,
+        } for (page, fp), count, total, max_ms, rows, samples in items[:limit]]
+
+    def render_summary(self) -> List[Dict[str, Any]]:
+        """Consultas por render y tiempo SQL por render, por página."""
+        with self._lock: items = [(p, r.renders, list(r.statements), list(r.sql_ms)) for p, r in self._renders.items()]
+        return [{
+            "Página": page, "Renders": renders,
+            "Consultas/render (media)": round(sum(stmts) / len(stmts), 1) if stmts else 0.0,
+            "Consultas/render (p95)": _percentile(stmts, 95), "Consultas/render (máx)": max(stmts) if stmts else 0,
+            "SQL ms/render (media)": round(sum(ms) / len(ms), 1) if ms else 0.0,
+        } for page, renders, stmts, ms in sorted(items)]
+
+    def totals(self) -> Dict[str, float]:
+        with self._lock: return {"statements": sum(s.count for s in self._statements.values()), "total_ms": sum(s.total_ms for s in self._statements.values())}
+
+    def slow_statements(self) -> List[Dict[str, Any]]:
+        with self._lock: return list(reversed(self._slow))
+
+    def reset(self) -> None:
+        with self._lock: self._statements.clear(); self._renders.clear(); self._slow.clear(); self.started_at = datetime.now()
+
+query_stats = QueryStatsCollector()
+_current_render: ContextVar[Optional[_RenderCounter]] = ContextVar("current_render", default=None)
+
+# --- Agrupación por Rerun ---
+def begin_render(page: Optional[str]):
+    """Marca el inicio de un rerun; devuelve el token para end_render."""
+    return _current_render.set(_RenderCounter(page))
+
+def end_render(token) -> None:
+    counter = _current_render.get()
+    _current_render.reset(token)
+    if counter is not None: query_stats.record_render(counter.page, counter.statements, counter.sql_ms)
+
+# --- Hooks del Engine ---
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start_time", []).append(time.perf_counter())
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get("query_start_time")
+    if not starts: return
+    duration_ms = (time.perf_counter() - starts.pop()) * 1000.0
+    counter = _current_render.get()
+    if counter is not None: counter.statements += 1; counter.sql_ms += duration_ms
+    try: rows = cursor.rowcount # -1 en SELECT con sqlite3: solo se contabilizan filas afectadas por DML
+    except Exception: rows = None
+    query_stats.record_statement(counter.page if counter else None, statement, duration_ms, rows)
+
+def _handle_error(exception_context):
+    conn = exception_context.connection
+    if conn is not None and conn.info.get("query_start_time"): conn.info["query_start_time"].pop()
+
+def install_query_instrumentation(db_engine: Engine) -> None:
+    """Registra los hooks de medición en el engine (idempotente)."""
+    if event.contains(db_engine, "before_cursor_execute", _before_cursor_execute): return
+    event.listen(db_engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(db_engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(db_engine, "handle_error", _handle_error)
@@ -0,0 +1,86 @@
+# --- database/query_plans.py (Verificación de Planes de Consulta) ---
+# Uso: python -m database.query_plans
+#
+# Construye una BD en memoria con todas las migraciones, genera el SQL de cada página para todas las
+# combinaciones de filtros y ejecuta EXPLAIN QUERY PLAN. Falla (exit 1) si alguna consulta recorre
+# completa (SCAN) una tabla de CHECKED_TABLES en lugar de buscar por índice (SEARCH).
+
+import sys
+import logging
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Tuple
+
+import pytz
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session as SQLAlchemySession
+
+from database.database import create_ephemeral_engine
+from database.models import datetime_to_epoch_ms
+from database.queries_repository import (build_history_query, build_volume_series_query,
+                                         build_latency_rollup_query, build_history_search_query, to_fts_query,
+                                         build_conversation_summary_query, build_session_transcript_query, build_top_terms_query,
+                                         build_term_trend_query, build_query_text_query)
+
+log = logging.getLogger(__name__)
+
+CHECKED_TABLES = ("queries", "query_stats_hourly", "query_terms_hourly") # Tablas grandes que nunca deben recorrerse completas
+
+def _page_queries(db: SQLAlchemySession) -> Dict[str, Callable[[], object]]:
+    """SQL generado por cada página para cada combinación de filtros."""
+    tz = pytz.timezone('America/Bogota'); today = datetime.now(tz).date()
+    start = tz.localize(datetime.combine(today - timedelta(days=7), datetime.min.time()))
+    end = tz.localize(datetime.combine(today + timedelta(days=1), datetime.min.time()))
+    cursor_ms = datetime_to_epoch_ms(end - timedelta(days=3)) # Cursor de keyset a mitad del rango
+    cases: Dict[str, Callable[[], object]] = {}
+    for agent_id in (None, 1):
+        for success in (None, 1, 0):
+            cases[f"historial agent={agent_id} success={success}"] = lambda a=agent_id, s=success: build_history_query(db, start, end, a, s).limit(150)
+            cases[f"historial pág. siguiente agent={agent_id} success={success}"] = lambda a=agent_id, s=success: build_history_query(db, start, end, a, s, after=(cursor_ms, 1000)).limit(50)
+        cases[f"búsqueda texto agent={agent_id}"] = lambda a=agent_id: build_history_search_query(db, to_fts_query("cedula renov"), start, end, a).limit(50)
+        cases[f"conversaciones agent={agent_id}"] = lambda a=agent_id: build_conversation_summary_query(db, start, end, a).limit(25)
+        for bucket in ("day", "hour"):
+            cases[f"serie de volumen por {bucket} agent={agent_id}"] = lambda a=agent_id, b=bucket: build_volume_series_query(db, start, end, a, tz, b)
+        cases[f"latencia agent={agent_id}"] = lambda a=agent_id: build_latency_rollup_query(db, start, end, a)
+        cases[f"términos frecuentes agent={agent_id}"] = lambda a=agent_id: build_top_terms_query(db, start, end, a)
+        cases[f"términos emergentes agent={agent_id}"] = lambda a=agent_id: build_term_trend_query(db, start, end, a)
+        cases[f"textos para frases agent={agent_id}"] = lambda a=agent_id: build_query_text_query(db, start, end, a)
+    cases["transcripción de sesión"] = lambda: build_session_transcript_query(db, "00000000-0000-0000-0000-000000000000")
+    return cases
+
+def explain(db: SQLAlchemySession, orm_query) -> List[str]:
+    """Devuelve las líneas 'detail' de EXPLAIN QUERY PLAN para una consulta ORM (con sus parámetros reales)."""
+    connection = db.connection()
+    def _prefix_explain(conn, cursor, statement, parameters, context, executemany):
+        return "EXPLAIN QUERY PLAN " + statement, parameters
+    event.listen(connection, "before_cursor_execute", _prefix_explain, retval=True)
+    try:
+        result = connection.execute(orm_query.statement)
+        return [row[3] for row in result.cursor.fetchall()]
+    finally:
+        event.remove(connection, "before_cursor_execute", _prefix_explain)
+
+def full_scans(plan: List[str]) -> List[str]:
+    """Líneas del plan que recorren completa alguna tabla vigilada."""
+    return [line for line in plan if line.startswith("SCAN") and line.split()[1] in CHECKED_TABLES]
+
+def check_query_plans(db_engine: Engine = None) -> List[Tuple[str, List[str]]]:
+    """Devuelve [(caso, plan)] de las consultas que hacen full scan de alguna tabla vigilada."""
+    db_engine = db_engine or create_ephemeral_engine("memory")
+    failures: List[Tuple[str, List[str]]] = []
+    with SQLAlchemySession(bind=db_engine) as db:
+        for name, build in _page_queries(db).items():
+            plan = explain(db, build())
+            log.info(f"{name}: {plan}")
+            if full_scans(plan): failures.append((name, plan))
+    return failures
+
+def main() -> int:
+    logging.basicConfig(level=logging.WARNING)
+    failures = check_query_plans()
+    for name, plan in failures: print(f"FULL SCAN en '{name}':\n    " + "\n    ".join(plan))
+    if not failures: print("OK: todas las consultas de Historial y Análisis usan índices.")
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
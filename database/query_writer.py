@@ -0,0 +1,137 @@
+# --- database/query_writer.py (Persistencia Diferida de Interacciones de Chat) ---
+# El chat (pages/03_Agentes_IA.py) encola cada turno con record_query() y sigue sin esperar a SQLite.
+# Un hilo daemon agrupa las filas y las inserta en UNA transacción cada QUERY_WRITER_BATCH_SIZE filas
+# o cada QUERY_WRITER_FLUSH_MS milisegundos, lo que ocurra antes. Al salir del proceso se vacía la cola.
+
+import os
+import time
+import queue
+import atexit
+import logging
+import threading
+from datetime import datetime
+from typing import Optional, Dict, List, Any
+
+from sqlalchemy import insert
+from sqlalchemy.engine import Connection
+from sqlalchemy.exc import OperationalError
+
+from database.database import get_engine
+from database.models import Query, get_current_time_colombia, datetime_to_epoch_ms
+from database.rollups import update_hourly_rollups
+from database.term_index import update_term_counts
+
+log = logging.getLogger(__name__)
+
+QUERY_WRITER_BATCH_SIZE = int(os.getenv("QUERY_WRITER_BATCH_SIZE", "50"))
+QUERY_WRITER_FLUSH_MS = float(os.getenv("QUERY_WRITER_FLUSH_MS", "500"))
+QUERY_WRITER_MAX_PENDING = int(os.getenv("QUERY_WRITER_MAX_PENDING", "10000")) # Cola llena: se descarta (nunca se bloquea el chat)
+QUERY_WRITER_RETRIES = 5        # Reintentos de un lote ante 'database is locked'
+QUERY_WRITER_SHUTDOWN_S = 5.0   # Tiempo máximo para vaciar la cola al salir
+
+def _insert_batch(conn: Connection, rows: List[Dict[str, Any]]) -> None:
+    """Escribe un lote dentro de la transacción abierta (executemany) y suma sus agregados horarios y términos."""
+    conn.execute(insert(Query.__table__), rows)
+    update_hourly_rollups(conn, rows); update_term_counts(conn, rows)
+
+class QueryWriter:
+    """Cola + hilo escritor por proceso. Las filas son dicts con las columnas de 'queries'."""
+    def __init__(self, batch_size: int = QUERY_WRITER_BATCH_SIZE, flush_ms: float = QUERY_WRITER_FLUSH_MS, max_pending: int = QUERY_WRITER_MAX_PENDING):
+        self.batch_size = max(1, batch_size); self.flush_s = max(0.0, flush_ms) / 1000.0
+        self._queue: "queue.Queue[Optional[Dict[str, Any]]]" = queue.Queue(maxsize=max_pending)
+        self._lock = threading.Lock(); self._thread: Optional[threading.Thread] = None
+        self._idle = threading.Condition(self._lock); self._in_flight = 0
+        self.written = 0; self.dropped = 0; self.failed_batches = 0; self.last_error: Optional[str] = None
+
+    # --- Productor ---
+    def submit(self, row: Dict[str, Any]) -> bool:
+        """Encola una fila sin bloquear. Devuelve False si la cola está llena (la fila se descarta)."""
+        self._ensure_started()
+        with self._lock:
+            try: self._queue.put_nowait(row); self._in_flight += 1
+            except queue.Full:
+                self.dropped += 1; log.warning(f"Query writer queue full ({self._queue.maxsize}); dropping row.")
+                return False
+        return True
+
+    def _ensure_started(self) -> None:
+        if self._thread is not None and self._thread.is_alive(): return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive(): return
+            self._thread = threading.Thread(target=self._run, name="query-writer", daemon=True); self._thread.start()
+
+    # --- Consumidor ---
+    def _run(self) -> None:
+        while True:
+            first = self._queue.get()
+            if first is None: self._done(1); return # Centinela de parada
+            batch = [first]; deadline = time.monotonic() + self.flush_s; stop = False
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0: break
+                try: item = self._queue.get(timeout=remaining)
+                except queue.Empty: break
+                if item is None: stop = True; break
+                batch.append(item)
+            self._write(batch); self._done(len(batch))
+            if stop: self._done(1); return
+
+    def _write(self, batch: List[Dict[str, Any]]) -> None:
+        for attempt in range(1, QUERY_WRITER_RETRIES + 1):
+            try:
+                with get_engine().begin() as conn: _insert_batch(conn, batch)
+                self.written += len(batch); return
+            except OperationalError as e:
+                self.last_error = str(e)
+                if attempt == QUERY_WRITER_RETRIES or "locked" not in str(e).lower(): break
+                time.sleep(0.05 * 2 ** attempt) # Backoff exponencial (busy_timeout ya espera en cada intento)
+            except Exception as e:
+                self.last_error = str(e); break
+        self.failed_batches += 1
+        log.error(f"Query writer dropped a batch of {len(batch)} rows: {self.last_error}")
+
+    def _done(self, count: int) -> None:
+        with self._lock:
+            self._in_flight -= count
+            self._idle.notify_all()
+
+    # --- Control ---
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Espera a que todo lo encolado hasta ahora esté escrito. Devuelve False si vence el timeout."""
+        end = None if timeout is None else time.monotonic() + timeout
+        with self._lock:
+            while self._in_flight > 0:
+                remaining = None if end is None else end - time.monotonic()
+                if remaining is not None and remaining <= 0: return False
+                self._idle.wait(remaining)
+        return True
+
+    def stop(self, timeout: float = QUERY_WRITER_SHUTDOWN_S) -> None:
+        """Vacía la cola y detiene el hilo (llamado en atexit)."""
+        thread = self._thread
+        if thread is None or not thread.is_alive(): return
+        with self._lock: self._in_flight += 1 # El centinela cuenta como pendiente hasta que el hilo lo consume
+        try: self._queue.put(None, timeout=timeout)
+        except queue.Full: log.warning("Query writer queue full at shutdown; pending rows lost."); return
+        thread.join(timeout)
+        if thread.is_alive(): log.warning(f"Query writer did not finish within {timeout}s; {self.pending()} rows pending.")
+
+    def pending(self) -> int:
+        with self._lock: return self._in_flight
+
+    def stats(self) -> Dict[str, Any]:
+        return {"pending": self.pending(), "written": self.written, "dropped": self.dropped, "failed_batches": self.failed_batches, "last_error": self.last_error}
+
+query_writer = QueryWriter()
+atexit.register(query_writer.stop)
+
+def record_query(agent_id: int, session_id: Optional[str], query_text: str, response_text: Optional[str],
+                 response_time_ms: Optional[int], success: bool, error_message: Optional[str] = None,
+                 created_at: Optional[datetime] = None) -> bool:
+    """Registra un turno de chat en 'queries' de forma diferida. No lanza excepciones ni espera a la BD."""
+    created_at = created_at or get_current_time_colombia()
+    return query_writer.submit({
+        "agent_id": agent_id, "session_id": session_id, "query_text": query_text, "response_text": response_text,
+        "response_time_ms": response_time_ms, "success": bool(success), "error_message": error_message,
+        "created_at": created_at, "created_at_ms": datetime_to_epoch_ms(created_at),
+    })
@@ -0,0 +1,192 @@
+# --- database/rollups.py (Agregados Horarios de Consultas) ---
+# 'query_stats_hourly' guarda por (agente, hora UTC): nº de consultas, éxitos, suma y suma de cuadrados
+# del tiempo de respuesta, un histograma de latencia y un DDSketch (utils/sketches.py) para percentiles.
+# El escritor de consultas lo actualiza en la misma
+# transacción que inserta las filas; este módulo también permite reconstruirlo desde 'queries'.
+#
+# Uso: python -m database.rollups rebuild [--since YYYY-MM-DD] [--until YYYY-MM-DD]
+
+import sys
+import json
+import bisect
+import logging
+from datetime import datetime
+from typing import Optional, Dict, List, Any, Tuple, Iterable
+
+from sqlalchemy import text, select, tuple_
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.engine import Connection, Engine
+
+from database.cli import run_cli, add_rebuild_command
+from database.database import get_engine
+from database.models import QueryStatsHourly, datetime_to_epoch_ms
+from utils.sketches import DDSketch, merge_sketch_blobs
+
+log = logging.getLogger(__name__)
+
+HOUR_MS = 3_600_000
+DAY_MS = 24 * HOUR_MS
+# Límites superiores (inclusive) de las cubetas de latencia; la última cubeta es "> 60000 ms".
+# Deben coincidir con el backfill de la migración 016.
+LATENCY_BUCKETS_MS: Tuple[int, ...] = (100, 250, 500, 1000, 2000, 5000, 10000, 20000, 30000, 60000)
+HISTOGRAM_SIZE = len(LATENCY_BUCKETS_MS) + 1
+
+def hour_bucket(epoch_ms: int) -> int:
+    """Inicio de la hora UTC que contiene epoch_ms."""
+    return (int(epoch_ms) // HOUR_MS) * HOUR_MS
+
+def latency_bucket(response_time_ms: float) -> int:
+    """Índice de cubeta del histograma para un tiempo de respuesta (> 0)."""
+    return bisect.bisect_left(LATENCY_BUCKETS_MS, response_time_ms)
+
+def parse_histogram(raw: Optional[str]) -> List[int]:
+    """Histograma JSON a lista de tamaño fijo (tolera valores vacíos o de otra longitud)."""
+    counts = json.loads(raw) if raw else []
+    return [int(c or 0) for c in counts[:HISTOGRAM_SIZE]] + [0] * max(0, HISTOGRAM_SIZE - len(counts))
+
+# --- Acumulación en Memoria ---
+class HourlyAccumulator:
+    """Delta de un (agente, hora) calculado a partir de un lote de filas de 'queries'."""
+    __slots__ = ("query_count", "success_count", "response_count", "response_time_sum", "response_time_sumsq", "histogram", "sketch")
+    def __init__(self):
+        self.query_count = 0; self.success_count = 0; self.response_count = 0
+        self.response_time_sum = 0.0; self.response_time_sumsq = 0.0; self.histogram = [0] * HISTOGRAM_SIZE; self.sketch = DDSketch()
+
+    def add(self, success: bool, response_time_ms: Optional[float]) -> None:
+        self.query_count += 1; self.success_count += 1 if success else 0
+        if response_time_ms is not None and response_time_ms > 0:
+            self.response_count += 1; self.response_time_sum += response_time_ms; self.response_time_sumsq += float(response_time_ms) ** 2
+            self.histogram[latency_bucket(response_time_ms)] += 1; self.sketch.add(response_time_ms)
+
+    def merge_row(self, row) -> None:
+        """Suma los valores ya guardados para la misma clave."""
+        self.query_count += row.query_count; self.success_count += row.success_count; self.response_count += row.response_count
+        self.response_time_sum += row.response_time_sum; self.response_time_sumsq += row.response_time_sumsq
+        self.histogram = [a + b for a, b in zip(self.histogram, parse_histogram(row.latency_histogram))]
+        if row.latency_sketch: self.sketch.merge(DDSketch.from_bytes(row.latency_sketch))
+
+    def as_row(self, agent_id: int, hour_start_ms: int) -> Dict[str, Any]:
+        return {"agent_id": agent_id, "hour_start_ms": hour_start_ms, "query_count": self.query_count, "success_count": self.success_count,
+                "response_count": self.response_count, "response_time_sum": self.response_time_sum,
+                "response_time_sumsq": self.response_time_sumsq, "latency_histogram": json.dumps(self.histogram, separators=(",", ":")),
+                "latency_sketch": self.sketch.to_bytes() if self.sketch.count else None}
+
+def accumulate(rows: Iterable[Dict[str, Any]]) -> Dict[Tuple[int, int], HourlyAccumulator]:
+    """Agrupa filas de 'queries' (dicts con agent_id, created_at_ms, success, response_time_ms) por (agente, hora)."""
+    deltas: Dict[Tuple[int, int], HourlyAccumulator] = {}
+    for row in rows:
+        key = (row["agent_id"], hour_bucket(row["created_at_ms"]))
+        acc = deltas.get(key)
+        if acc is None: acc = deltas[key] = HourlyAccumulator()
+        acc.add(row.get("success", True), row.get("response_time_ms"))
+    return deltas
+
+# --- Mantenimiento Incremental ---
+def update_hourly_rollups(conn: Connection, rows: List[Dict[str, Any]]) -> int:
+    """
+    Suma un lote de filas recién insertadas a 'query_stats_hourly' dentro de la transacción de 'conn'.
+    Debe llamarse después del INSERT en 'queries': el bloqueo de escritura ya está tomado, así que la
+    lectura-mezcla-escritura del histograma no compite con otros escritores. Devuelve las claves tocadas.
+    """
+    deltas = accumulate(rows)
+    if not deltas: return 0
+    table = QueryStatsHourly.__table__
+    existing = conn.execute(select(table).where(tuple_(table.c.agent_id, table.c.hour_start_ms).in_(list(deltas)))).all()
+    for row in existing: deltas[(row.agent_id, row.hour_start_ms)].merge_row(row)
+    stmt = sqlite_insert(table).values([acc.as_row(agent_id, hour) for (agent_id, hour), acc in deltas.items()])
+    conn.execute(stmt.on_conflict_do_update(
+        index_elements=[table.c.agent_id, table.c.hour_start_ms],
+        set_={c.name: stmt.excluded[c.name] for c in table.c if c.name not in ("agent_id", "hour_start_ms")},
+    ))
+    return len(deltas)
+
+# --- Reconstrucción (backfill) ---
+def _rebuild_select_sql() -> str:
+    """SELECT agregado equivalente al backfill de la migración 016, generado desde LATENCY_BUCKETS_MS."""
+    bounds = (0,) + LATENCY_BUCKETS_MS
+    buckets = [f"SUM(CASE WHEN response_time_ms > {lo} AND response_time_ms <= {hi} THEN 1 ELSE 0 END)" for lo, hi in zip(bounds, bounds[1:])]
+    buckets.append(f"SUM(CASE WHEN response_time_ms > {LATENCY_BUCKETS_MS[-1]} THEN 1 ELSE 0 END)")
+    return (
+        f"SELECT agent_id, (created_at_ms / {HOUR_MS}) * {HOUR_MS}, COUNT(*), SUM(CASE WHEN success THEN 1 ELSE 0 END), "
+        "SUM(CASE WHEN response_time_ms > 0 THEN 1 ELSE 0 END), "
+        "COALESCE(SUM(CASE WHEN response_time_ms > 0 THEN response_time_ms END), 0), "
+        "COALESCE(SUM(CASE WHEN response_time_ms > 0 THEN 1.0 * response_time_ms * response_time_ms END), 0), "
+        f"json_array({', '.join(buckets)}) "
+        "FROM queries WHERE created_at_ms >= :start_ms AND created_at_ms < :end_ms "
+        f"GROUP BY agent_id, created_at_ms / {HOUR_MS}"
+    )
+
+def rebuild_hourly_rollups(db_engine: Optional[Engine] = None, since: Optional[datetime] = None, until: Optional[datetime] = None) -> int:
+    """
+    Recalcula 'query_stats_hourly' desde 'queries' para [since, until) redondeado a horas completas
+    (todo el historial si no se indican). Borra y reinserta en una sola transacción. Devuelve las filas escritas.
+    """
+    db_engine = db_engine or get_engine()
+    start_ms = hour_bucket(datetime_to_epoch_ms(since)) if since else 0
+    end_ms = hour_bucket(datetime_to_epoch_ms(until) + HOUR_MS - 1) if until else 2 ** 62
+    params = {"start_ms": start_ms, "end_ms": end_ms}
+    with db_engine.begin() as conn:
+        conn.execute(text("DELETE FROM query_stats_hourly WHERE hour_start_ms >= :start_ms AND hour_start_ms < :end_ms"), params)
+        result = conn.execute(text(
+            "INSERT INTO query_stats_hourly (agent_id, hour_start_ms, query_count, success_count, response_count, "
+            "response_time_sum, response_time_sumsq, latency_histogram) " + _rebuild_select_sql()), params)
+        written = result.rowcount
+        _rebuild_sketches(conn, start_ms, end_ms)
+    log.info(f"Rebuilt query_stats_hourly [{start_ms}, {end_ms}): {written} rows.")
+    return written
+
+SKETCH_UPDATE_BATCH = 500
+
+def _rebuild_sketches(conn: Connection, start_ms: int, end_ms: int, only_missing: bool = False) -> int:
+    """
+    Recalcula latency_sketch de [start_ms, end_ms) recorriendo 'queries' una vez en orden (agente, fecha)
+    por el índice ix_queries_agent_created_ms. Con only_missing solo rellena las filas con sketch NULL.
+    """
+    rows = conn.execute(text(
+        f"SELECT agent_id, (created_at_ms / {HOUR_MS}) * {HOUR_MS} AS hour_start_ms, response_time_ms FROM queries "
+        "WHERE created_at_ms >= :start_ms AND created_at_ms < :end_ms AND response_time_ms > 0 ORDER BY agent_id, created_at_ms"),
+        {"start_ms": start_ms, "end_ms": end_ms})
+    update_sql = text("UPDATE query_stats_hourly SET latency_sketch = :sketch WHERE agent_id = :agent_id AND hour_start_ms = :hour_start_ms"
+                      + (" AND latency_sketch IS NULL" if only_missing else ""))
+    pending: List[Dict[str, Any]] = []; updated = 0; key = None; sketch = DDSketch()
+    def _flush_key():
+        if key is not None and sketch.count: pending.append({"agent_id": key[0], "hour_start_ms": key[1], "sketch": sketch.to_bytes()})
+    for agent_id, hour_start_ms, response_time_ms in rows:
+        if (agent_id, hour_start_ms) != key:
+            _flush_key(); key = (agent_id, hour_start_ms); sketch = DDSketch()
+            if len(pending) >= SKETCH_UPDATE_BATCH: conn.execute(update_sql, pending); updated += len(pending); pending = []
+        sketch.add(response_time_ms)
+    _flush_key()
+    if pending: conn.execute(update_sql, pending); updated += len(pending)
+    return updated
+
+def backfill_missing_sketches(db_engine: Optional[Engine] = None) -> int:
+    """Completa los sketches NULL (filas anteriores a la migración 017). Sin pendientes es una sola consulta."""
+    db_engine = db_engine or get_engine()
+    with db_engine.begin() as conn:
+        start_ms, end_ms = conn.execute(text(
+            "SELECT MIN(hour_start_ms), MAX(hour_start_ms) FROM query_stats_hourly WHERE latency_sketch IS NULL AND response_count > 0")).one()
+        if start_ms is None: return 0
+        updated = _rebuild_sketches(conn, start_ms, end_ms + HOUR_MS, only_missing=True)
+    log.info(f"Backfilled {updated} latency sketches in query_stats_hourly.")
+    return updated
+
+# --- Lectura ---
+def summarize_latency(rows: Iterable[Any]) -> Dict[str, Any]:
+    """
+    Resume filas (response_count, response_time_sum, latency_sketch) de 'query_stats_hourly':
+    promedio exacto y p50/p90/p99 del sketch fusionado (error relativo <= 1 %), en milisegundos,
+    más el propio sketch fusionado ('sketch') para dibujar la distribución.
+    """
+    rows = list(rows)
+    count = sum(r.response_count or 0 for r in rows); total = sum(r.response_time_sum or 0 for r in rows)
+    sketch = merge_sketch_blobs(r.latency_sketch for r in rows)
+    return {"count": count, "mean": (total / count) if count else None,
+            "p50": sketch.quantile(0.5), "p90": sketch.quantile(0.9), "p99": sketch.quantile(0.99), "sketch": sketch}
+
+def main(argv: Optional[List[str]] = None) -> int:
+    return run_cli("Mantenimiento de agregados horarios de consultas.", argv,
+                   lambda sub: add_rebuild_command(sub, "query_stats_hourly", rebuild_hourly_rollups))
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,228 @@
+# --- database/snapshots.py (Instantáneas Parquet de 'queries' por día) ---
+# Opcional (QUERY_SNAPSHOTS_ENABLED=1): un hilo daemon copia 'queries' a QUERY_SNAPSHOT_DIR/day=YYYY-MM-DD/part-0.parquet
+# (día UTC, particionado estilo Hive; por defecto en la caché del usuario, fuera del repositorio) cada
+# QUERY_SNAPSHOT_INTERVAL_SECONDS. Cada ciclo solo calcula la huella (filas, max id) de los días desde el último
+# exportado y de los días que recibieron filas nuevas (id > max_id), por rangos del índice, y reescribe los que
+# cambiaron. Una vez cada QUERY_SNAPSHOT_FULL_SCAN_SECONDS revisa todos los días para reflejar los borrados
+# antiguos (ej. un agente eliminado). Los análisis que leen texto de muchos meses (frases de Análisis) escanean
+# estas columnas con pyarrow.dataset, que descarta por ruta las particiones fuera del rango, y SQLite solo sirve
+# la cola de filas posteriores a la instantánea (id > max_id del manifiesto).
+#
+# Uso: python -m database.snapshots export | status
+
+import os
+import sys
+import json
+import shutil
+import logging
+import threading
+import time
+import atexit
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from sqlalchemy import select, text
+from sqlalchemy.engine import Engine
+
+from database.cli import run_cli
+from database.queries_repository import filter_ms_range
+from database.database import get_engine
+from database.models import Query, datetime_to_epoch_ms
+from database.rollups import DAY_MS
+
+try: # Opcional: sin pyarrow no hay instantáneas y los análisis leen de SQLite
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+    SNAPSHOTS_AVAILABLE = True
+except ImportError:
+    pa = ds = pq = None
+    SNAPSHOTS_AVAILABLE = False
+
+log = logging.getLogger(__name__)
+
+_CACHE_HOME = os.getenv("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+QUERY_SNAPSHOT_DIR = os.getenv("QUERY_SNAPSHOT_DIR", os.path.join(_CACHE_HOME, "iatek_dashboard", "query_snapshots"))
+QUERY_SNAPSHOT_INTERVAL_SECONDS = float(os.getenv("QUERY_SNAPSHOT_INTERVAL_SECONDS", "300"))
+QUERY_SNAPSHOT_FULL_SCAN_SECONDS = float(os.getenv("QUERY_SNAPSHOT_FULL_SCAN_SECONDS", "86400")) # Huella de todos los días (borrados antiguos)
+QUERY_SNAPSHOTS_ENABLED = os.getenv("QUERY_SNAPSHOTS_ENABLED", "0") == "1" and SNAPSHOTS_AVAILABLE
+SNAPSHOT_CHUNK_ROWS = int(os.getenv("SNAPSHOT_CHUNK_ROWS", "5000")) # Filas por row group y por lote leído
+MANIFEST_NAME = "_manifest.json" # Los nombres con '_' o '.' no los recoge pyarrow.dataset
+PARTITION_FILE = "part-0.parquet"
+
+DayPrint = Tuple[int, int] # (filas, max id) de un día
+
+class SnapshotReadError(RuntimeError):
+    """Una partición falló al leerse a mitad del recorrido (ej. reemplazada por el exportador): el llamador relee de SQLite."""
+
+def _schema():
+    return pa.schema([("id", pa.int64()), ("created_at_ms", pa.int64()), ("agent_id", pa.int64()), ("session_id", pa.string()),
+                      ("success", pa.bool_()), ("response_time_ms", pa.int64()), ("query_text", pa.string())])
+
+def _day_label(day_start_ms: int) -> str:
+    return datetime.fromtimestamp(day_start_ms / 1000, tz=timezone.utc).strftime("%Y-%m-%d")
+
+def _day_start_ms(day_label: str) -> int:
+    return datetime_to_epoch_ms(datetime.strptime(day_label, "%Y-%m-%d").replace(tzinfo=timezone.utc))
+
+def _partition_dir(root: str, day_label: str) -> str:
+    return os.path.join(root, f"day={day_label}")
+
+# --- Manifiesto ---
+def read_manifest(root: str = QUERY_SNAPSHOT_DIR) -> Optional[Dict[str, Any]]:
+    """{"max_id": int, "days": {"YYYY-MM-DD": [filas, max_id]}, "exported_at": iso} o None si aún no hay instantánea."""
+    try:
+        with open(os.path.join(root, MANIFEST_NAME), encoding="utf-8") as f: return json.load(f)
+    except FileNotFoundError: return None
+    except (OSError, ValueError) as e:
+        log.warning(f"Unreadable snapshot manifest in {root}: {e}"); return None
+
+def _write_manifest(root: str, manifest: Dict[str, Any]) -> None:
+    tmp = os.path.join(root, f".{MANIFEST_NAME}.tmp")
+    with open(tmp, "w", encoding="utf-8") as f: json.dump(manifest, f)
+    os.replace(tmp, os.path.join(root, MANIFEST_NAME)) # Atómico: un lector ve el manifiesto viejo o el nuevo
+
+# --- Exportación ---
+def day_fingerprints(db_engine: Engine, since_ms: Optional[int] = None, after_id: Optional[int] = None) -> Dict[str, DayPrint]:
+    """
+    (filas, max id) por día UTC, desde el índice (created_at_ms, success), que ya incluye el rowid. Sin argumentos,
+    de todos los días. Con since_ms/after_id, solo de los días desde since_ms y de los que tienen filas con
+    id > after_id (altas tardías en días anteriores): dos búsquedas por rango en lugar de recorrer toda la tabla.
+    """
+    with db_engine.connect() as conn:
+        if since_ms is None:
+            rows = conn.execute(text(f"SELECT created_at_ms / {DAY_MS} AS day, count(*), max(id) FROM queries "
+                                     "WHERE created_at_ms IS NOT NULL GROUP BY day")).all()
+        else:
+            rows = conn.execute(text(f"SELECT created_at_ms / {DAY_MS} AS day, count(*), max(id) FROM queries "
+                                     "WHERE created_at_ms >= :since_ms GROUP BY day"), {"since_ms": since_ms}).all()
+            late_days = conn.execute(text(f"SELECT DISTINCT created_at_ms / {DAY_MS} FROM queries WHERE id > :after_id "
+                                          "AND created_at_ms < :since_ms"), {"after_id": after_id or 0, "since_ms": since_ms}).scalars().all()
+            for day in late_days:
+                rows.append((day, *conn.execute(text("SELECT count(*), max(id) FROM queries WHERE created_at_ms >= :start AND created_at_ms < :end"),
+                                                {"start": day * DAY_MS, "end": (day + 1) * DAY_MS}).one()))
+    return {_day_label(day * DAY_MS): (count, max_id) for day, count, max_id in rows}
+
+def _write_partition(db_engine: Engine, root: str, day_label: str) -> int:
+    """Reescribe la partición de un día (archivo temporal + os.replace). Devuelve las filas escritas."""
+    start_ms = _day_start_ms(day_label)
+    stmt = select(Query.id, Query.created_at_ms, Query.agent_id, Query.session_id, Query.success, Query.response_time_ms, Query.query_text) \
+        .where(Query.created_at_ms >= start_ms, Query.created_at_ms < start_ms + DAY_MS).order_by(Query.created_at_ms, Query.id)
+    directory = _partition_dir(root, day_label); os.makedirs(directory, exist_ok=True)
+    tmp = os.path.join(directory, f".{PARTITION_FILE}.tmp"); schema = _schema(); written = 0
+    with db_engine.connect() as conn, pq.ParquetWriter(tmp, schema, compression="zstd") as writer:
+        result = conn.execution_options(stream_results=True, yield_per=SNAPSHOT_CHUNK_ROWS).execute(stmt)
+        for partition in result.partitions():
+            columns = list(zip(*partition))
+            writer.write_table(pa.Table.from_arrays([pa.array(col, type=field.type) for col, field in zip(columns, schema)], schema=schema))
+            written += len(partition)
+    os.replace(tmp, os.path.join(directory, PARTITION_FILE))
+    return written
+
+def export_snapshots(db_engine: Optional[Engine] = None, root: str = QUERY_SNAPSHOT_DIR, full: bool = False, scan_all: bool = False) -> int:
+    """
+    Sincroniza las particiones con 'queries': reescribe los días nuevos o cambiados (todos con full=True), borra
+    los días revisados que ya no tienen filas y publica el manifiesto al final. Solo revisa los días desde el
+    último del manifiesto y los que recibieron filas nuevas; todos con scan_all/full o si no hay manifiesto.
+    max_id se fija ANTES de escribir, así que toda fila con id <= max_id está en alguna partición. Devuelve los días reescritos.
+    """
+    if not SNAPSHOTS_AVAILABLE: raise RuntimeError("Query snapshots require pyarrow (pip install pyarrow).")
+    db_engine = db_engine or get_engine(); os.makedirs(root, exist_ok=True)
+    manifest = read_manifest(root) or {}; previous = manifest.get("days", {})
+    since_ms = None if full or scan_all or not previous else _day_start_ms(max(previous))
+    current = day_fingerprints(db_engine, since_ms, manifest.get("max_id"))
+    removed = [day for day in previous if day not in current and (since_ms is None or _day_start_ms(day) >= since_ms)]
+    days = {**{day: fp for day, fp in previous.items() if day not in removed}, **current}
+    max_id = max((max_id for _, max_id in days.values()), default=0)
+    stale = sorted(day for day, fingerprint in current.items() if full or tuple(previous.get(day, ())) != tuple(fingerprint))
+    rows = sum(_write_partition(db_engine, root, day) for day in stale)
+    for day in removed: shutil.rmtree(_partition_dir(root, day), ignore_errors=True)
+    _write_manifest(root, {"max_id": max_id, "days": {day: list(fp) for day, fp in sorted(days.items())},
+                           "exported_at": datetime.now(timezone.utc).isoformat(timespec="seconds")})
+    if stale: log.info(f"Exported {len(stale)} query snapshot partition(s) ({rows} rows) up to id {max_id}.")
+    return len(stale)
+
+class SnapshotExporter:
+    """Hilo daemon que llama a export_snapshots cada interval_s (revisando todos los días al arrancar y cada QUERY_SNAPSHOT_FULL_SCAN_SECONDS). start() es idempotente."""
+    def __init__(self, interval_s: float = QUERY_SNAPSHOT_INTERVAL_SECONDS, root: str = QUERY_SNAPSHOT_DIR):
+        self.interval_s = interval_s; self.root = root
+        self._lock = threading.Lock(); self._stop = threading.Event(); self._thread: Optional[threading.Thread] = None
+        self.runs = 0; self.last_error: Optional[str] = None; self._last_full_scan: Optional[float] = None
+
+    def start(self) -> bool:
+        """Arranca el hilo si las instantáneas están habilitadas. Devuelve si está corriendo."""
+        if not QUERY_SNAPSHOTS_ENABLED: return False
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._run, name="query-snapshots", daemon=True); self._thread.start()
+        return True
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                scan_all = self._last_full_scan is None or time.monotonic() - self._last_full_scan >= QUERY_SNAPSHOT_FULL_SCAN_SECONDS
+                export_snapshots(root=self.root, scan_all=scan_all); self.runs += 1; self.last_error = None
+                if scan_all: self._last_full_scan = time.monotonic()
+            except Exception as e:
+                self.last_error = str(e); log.error(f"Query snapshot export failed: {e}", exc_info=True)
+            self._stop.wait(self.interval_s)
+
+    def stop(self, timeout: float = 5.0) -> None:
+        self._stop.set(); thread = self._thread
+        if thread is not None and thread.is_alive(): thread.join(timeout)
+
+snapshot_exporter = SnapshotExporter()
+atexit.register(snapshot_exporter.stop)
+
+# --- Lectura ---
+def iter_query_text_chunks(start_dt: datetime, end_dt: datetime, agent_id: Optional[int] = None, db_engine: Optional[Engine] = None,
+                           root: str = QUERY_SNAPSHOT_DIR, chunk_rows: int = SNAPSHOT_CHUNK_ROWS) -> Optional[Iterator[List[Optional[str]]]]:
+    """
+    Bloques de query_text de [start_dt, end_dt) (y agente): id <= max_id desde las particiones del rango, el
+    resto desde SQLite por rowid. None si no hay instantánea publicada (el llamador lee de SQLite); si una
+    partición falla durante el recorrido, SnapshotReadError y el llamador descarta lo contado y relee de SQLite.
+    """
+    manifest = read_manifest(root) if QUERY_SNAPSHOTS_ENABLED else None
+    if not manifest or manifest.get("max_id") is None: return None
+    start_ms, end_ms, max_id = datetime_to_epoch_ms(start_dt), datetime_to_epoch_ms(end_dt), int(manifest["max_id"])
+    condition = ((ds.field("day") >= _day_label(start_ms)) & (ds.field("day") <= _day_label(end_ms - 1)) # Poda por partición
+                 & (ds.field("created_at_ms") >= start_ms) & (ds.field("created_at_ms") < end_ms) & (ds.field("id") <= max_id))
+    if agent_id is not None: condition &= ds.field("agent_id") == agent_id
+    try:
+        dataset = ds.dataset(root, format="parquet", partitioning=ds.partitioning(pa.schema([("day", pa.string())]), flavor="hive"))
+        batches = dataset.to_batches(columns=["query_text"], filter=condition, batch_size=chunk_rows)
+    except (OSError, pa.ArrowException) as e:
+        log.warning(f"Query snapshots unreadable ({e}); reading from SQLite."); return None
+
+    def chunks() -> Iterator[List[Optional[str]]]:
+        try: # La lectura es perezosa: los errores de Arrow aparecen aquí, no al crear el dataset
+            for batch in batches:
+                if batch.num_rows: yield batch.column(0).to_pylist()
+        except (OSError, pa.ArrowException) as e:
+            log.warning(f"Query snapshot read failed mid-scan ({e}); reading from SQLite."); raise SnapshotReadError(str(e)) from e
+        tail = filter_ms_range(select(Query.query_text).where(Query.id > max_id), Query.created_at_ms, start_dt, end_dt)
+        if agent_id is not None: tail = tail.where(Query.agent_id == agent_id)
+        with (db_engine or get_engine()).connect() as conn:
+            result = conn.execution_options(stream_results=True, yield_per=chunk_rows).execute(tail)
+            for partition in result.partitions(): yield [row[0] for row in partition]
+    return chunks()
+
+def _export(args) -> int:
+    print(f"{export_snapshots(full=args.full)} días reescritos en {QUERY_SNAPSHOT_DIR}"); return 0
+
+def _status(args) -> int:
+    manifest = read_manifest()
+    if manifest is None: print("Sin instantánea publicada."); return 1
+    print(f"{len(manifest['days'])} días, hasta id {manifest['max_id']} (exportado {manifest['exported_at']})"); return 0
+
+def main(argv: Optional[List[str]] = None) -> int:
+    def register(sub) -> None:
+        export = sub.add_parser("export", help="Reescribe los días nuevos o cambiados.")
+        export.add_argument("--full", action="store_true", help="Reescribe todos los días.")
+        export.set_defaults(handler=_export)
+        sub.add_parser("status", help="Muestra el manifiesto publicado.").set_defaults(handler=_status)
+    return run_cli("Instantáneas Parquet de 'queries' por día.", argv, register)
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,103 @@
+# --- database/term_index.py (Índice de Frecuencia de Términos de Consultas) ---
+# 'query_terms_hourly' guarda por (hora UTC, agente, término) cuántas veces aparece el término en query_text,
+# tokenizado con utils/text_analysis.py. Las claves no dependen de la zona configurada: un rango de días
+# locales se suma por horas en la consulta (como 'query_stats_hourly'), así que cambiar 'timezone' en
+# Configuración no desalinea el índice. El escritor de consultas lo actualiza en la misma transacción que
+# inserta las filas, así que el "top de palabras" de Análisis es un GROUP BY sobre esta tabla pequeña.
+#
+# Uso: python -m database.term_index rebuild [--since YYYY-MM-DD] [--until YYYY-MM-DD]
+
+import sys
+import logging
+from collections import Counter
+from datetime import datetime
+from typing import Optional, Dict, List, Any, Iterable, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.engine import Connection, Engine
+
+from database.cli import run_cli, add_rebuild_command
+from database.database import get_engine
+from database.models import QueryTermHourly, datetime_to_epoch_ms
+from database.rollups import DAY_MS, HOUR_MS, hour_bucket
+from utils.text_analysis import tokenize
+
+log = logging.getLogger(__name__)
+
+TERM_REBUILD_CHUNK_ROWS = 2000 # Filas de 'queries' leídas por bloque al reconstruir
+
+TermKey = Tuple[int, int, str] # (hour_start_ms, agent_id, term)
+
+def nearest_hour_bucket(epoch_ms: int) -> int:
+    """Inicio de la hora UTC más cercana a epoch_ms (exacto en las horas en punto)."""
+    return hour_bucket(int(epoch_ms) + HOUR_MS // 2)
+
+def term_hour_range(start_dt: datetime, end_dt: datetime) -> Tuple[int, int]:
+    """[desde, hasta) en hour_start_ms para un rango: ambos extremos redondeados igual a la hora más cercana."""
+    return nearest_hour_bucket(datetime_to_epoch_ms(start_dt)), nearest_hour_bucket(datetime_to_epoch_ms(end_dt))
+
+def count_terms(rows: Iterable[Dict[str, Any]]) -> "Counter[TermKey]":
+    """Cuenta términos de filas de 'queries' (dicts con agent_id, created_at_ms, query_text) por (hora, agente, término)."""
+    counts: "Counter[TermKey]" = Counter()
+    for row in rows:
+        hour = hour_bucket(row["created_at_ms"]); agent_id = row["agent_id"]
+        counts.update((hour, agent_id, term) for term in tokenize(row.get("query_text")))
+    return counts
+
+def _upsert_counts(conn: Connection, counts: "Counter[TermKey]") -> int:
+    """Suma 'counts' a los conteos guardados (executemany de un upsert). Devuelve las claves tocadas."""
+    if not counts: return 0
+    table = QueryTermHourly.__table__
+    stmt = sqlite_insert(table)
+    conn.execute(stmt.on_conflict_do_update(index_elements=[table.c.hour_start_ms, table.c.agent_id, table.c.term],
+                                            set_={"count": table.c.count + stmt.excluded["count"]}),
+                 [{"hour_start_ms": hour, "agent_id": agent_id, "term": term, "count": count} for (hour, agent_id, term), count in counts.items()])
+    return len(counts)
+
+# --- Mantenimiento Incremental ---
+def update_term_counts(conn: Connection, rows: List[Dict[str, Any]]) -> int:
+    """Suma los términos de un lote recién insertado en 'queries' dentro de la transacción de 'conn'."""
+    return _upsert_counts(conn, count_terms(rows))
+
+# --- Reconstrucción (backfill) ---
+def rebuild_term_index(db_engine: Optional[Engine] = None, since: Optional[datetime] = None, until: Optional[datetime] = None) -> int:
+    """
+    Recalcula 'query_terms_hourly' desde 'queries' para [since, until) redondeado a horas completas (todo el
+    historial si no se indican). Recorre las filas en orden de fecha y escribe cada día UTC al terminarlo, así que
+    la memoria queda acotada por los términos de un día. Una sola transacción. Devuelve las claves escritas.
+    """
+    db_engine = db_engine or get_engine()
+    start_ms = hour_bucket(datetime_to_epoch_ms(since)) if since else 0
+    end_ms = hour_bucket(datetime_to_epoch_ms(until) + HOUR_MS - 1) if until else 2 ** 62
+    params = {"start_ms": start_ms, "end_ms": end_ms}; written = 0
+    with db_engine.begin() as conn:
+        conn.execute(text("DELETE FROM query_terms_hourly WHERE hour_start_ms >= :start_ms AND hour_start_ms < :end_ms"), params)
+        result = conn.execution_options(yield_per=TERM_REBUILD_CHUNK_ROWS).execute(text(
+            "SELECT agent_id, created_at_ms, query_text FROM queries WHERE created_at_ms >= :start_ms AND created_at_ms < :end_ms "
+            "ORDER BY created_at_ms"), params)
+        pending: "Counter[TermKey]" = Counter(); current_day = None
+        for row in result.mappings():
+            day = row["created_at_ms"] // DAY_MS
+            if day != current_day: written += _upsert_counts(conn, pending); pending = Counter(); current_day = day
+            pending.update(count_terms([row]))
+        written += _upsert_counts(conn, pending)
+    log.info(f"Rebuilt query_terms_hourly [{start_ms}, {end_ms}): {written} rows.")
+    return written
+
+def backfill_term_index(db_engine: Optional[Engine] = None) -> int:
+    """Rellena el índice con el historial si está vacío y hay consultas (tras la migración 020)."""
+    db_engine = db_engine or get_engine()
+    with db_engine.connect() as conn:
+        indexed = conn.execute(text("SELECT 1 FROM query_terms_hourly LIMIT 1")).first()
+        has_queries = conn.execute(text("SELECT 1 FROM queries LIMIT 1")).first()
+    if indexed or not has_queries: return 0
+    return rebuild_term_index(db_engine)
+
+def main(argv: Optional[List[str]] = None) -> int:
+    def register(sub) -> None:
+        add_rebuild_command(sub, "query_terms_hourly", rebuild_term_index)
+    return run_cli("Mantenimiento del índice de términos de consultas.", argv, register)
+
+if __name__ == "__main__":
+    sys.exit(main())
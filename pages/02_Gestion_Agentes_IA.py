@@ -12,6 +12,7 @@ from auth.auth import requires_permission
 from database.database import get_db_session
 from database.models import Agent, LanguageModelOption, SkillOption, PersonalityOption, GoalOption
 from utils.config import get_configuration
+from utils.agent_directory import invalidate_agent_directory # Los selectores del resto de páginas leen de este directorio
 import pytz
 import logging
 from datetime import datetime
@@ -92,6 +93,7 @@ def delete_agent_dialog(agent_id: int):
                                agent_db = db_del.query(Agent).filter(Agent.id == agent_id).first()
                                if agent_db: db_del.delete(agent_db); db_del.commit(); st.success(f"✅ '{name}' eliminado."); log.info(f"Agent {agent_id} deleted.")
                                else: st.warning("Ya no existía.")
+                           invalidate_agent_directory()
                            st.session_state.agent_action=None; st.session_state.deleting_agent_id=None; time.sleep(1); st.rerun()
                        except Exception as del_e: log.error(f"Error deleting {agent_id}", exc_info=True); st.error(f"❌ Error: {del_e}")
              with c2:
@@ -177,6 +179,7 @@ def render_agent_form_content(mode: str, agent_data: Optional[Dict[str, Any]] =
                              if k!="name": setattr(agent_upd,k,v)
                         agent_upd.updated_at=datetime.now(colombia_tz); db.flush(); st.success(f"✅ '{agent_upd.name}' actualizado.")
                     else: log.info(f"Creating agent: {data_save['name']}"); new_agent=Agent(**data_save); db.add(new_agent); db.flush(); st.success(f"✅ '{data_save['name']}' creado.")
+                invalidate_agent_directory() # Tras el commit del bloque anterior
                 st.session_state.agent_action=None; st.session_state.editing_agent_id=None; time.sleep(1); st.rerun()
             except IntegrityError: st.error(f"⚠️ Error: Ya existe '{data_save['name']}'.")
             except Exception as e: st.error(f"❌ Error guardando: {e}"); log.error("Error saving agent", exc_info=True)
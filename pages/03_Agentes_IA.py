@@ -10,8 +10,8 @@ from typing import Optional, List, Dict, Any, Tuple # Importar Tuple
 # Importar dependencias locales
 from auth.auth import requires_permission
 from utils.api_client import enviar_mensaje_al_agente_n8n
-from database.database import get_db_session
-from database.models import Agent # Solo para la query
+from utils.agent_directory import list_agents # Directorio de agentes compartido por proceso
+from database.query_writer import record_query # Persistencia diferida de cada turno en 'queries'
 import logging
 import pytz
 from utils.config import get_configuration
@@ -40,27 +40,16 @@ def load_local_active_agents_data() -> Tuple[List[Dict[str, Any]], Optional[Exce
     error: Optional[Exception] = None; error_message: Optional[str] = None
     log.info("[Agentes IA] Loading active agents data...")
     try:
-        with get_db_session() as db:
-            log.info("[Agentes IA] DB session obtained.")
-            # Query para seleccionar solo las columnas necesarias
-            query_result = db.query(
-                Agent.id,
-                Agent.name,
-                Agent.description,
-                Agent.model_name,
-                Agent.n8n_chat_url # Necesitamos la URL para el botón
-            ).filter(Agent.status == 'active').order_by(Agent.name).all()
-            log.info(f"[Agentes IA] Query OK. Found {len(query_result)} active agents.")
-
-            # Convertir resultados (tuples) en lista de diccionarios
-            for row in query_result:
-                agents_data_list.append({
-                    "id": row.id,
-                    "name": row.name,
-                    "description": row.description or '',
-                    "model_name": row.model_name or 'N/A',
-                    "n8n_chat_url": row.n8n_chat_url # Guardar la URL
-                })
+        # Directorio de agentes compartido (sin consulta a la BD salvo al expirar o tras cambios en Gestión)
+        active_agents = list_agents(active_only=True)
+        log.info(f"[Agentes IA] Directory OK. Found {len(active_agents)} active agents.")
+        agents_data_list = [{
+            "id": entry.id,
+            "name": entry.name,
+            "description": entry.description,
+            "model_name": entry.model_name or 'N/A',
+            "n8n_chat_url": entry.n8n_chat_url # Guardar la URL
+        } for entry in active_agents]
 
     except OperationalError as oe: log.error(f"[Agentes IA] OpError: {oe}", exc_info=True); error = oe; error_message = f"Error DB: {oe}"
     except Exception as e: log.error(f"[Agentes IA] Generic error: {e}", exc_info=True); error = e; error_message = f"Error inesperado: {e}"
@@ -157,7 +146,11 @@ def show_agent_list_and_chat():
         if prompt:
              current_session_id = st.session_state.get('chat_session_id') or str(uuid.uuid4()); st.session_state['chat_session_id'] = current_session_id
              st.session_state['chat_messages'].append({"role": "user", "content": prompt})
-             with st.spinner("🤖 Procesando..."): response_text, _ = enviar_mensaje_al_agente_n8n(selected_agent_chat_url, prompt, current_session_id)
+             started = time.perf_counter()
+             with st.spinner("🤖 Procesando..."): response_text, _, success = enviar_mensaje_al_agente_n8n(selected_agent_chat_url, prompt, current_session_id)
+             elapsed_ms = int(round((time.perf_counter() - started) * 1000))
+             # En un fallo el texto es el mensaje de error: va solo a error_message, no como respuesta del agente
+             record_query(selected_agent_id, current_session_id, prompt, response_text if success else None, elapsed_ms, success, error_message=None if success else response_text)
              assistant_response = response_text or "No se recibió respuesta."; st.session_state['chat_messages'].append({"role": "assistant", "content": assistant_response})
              st.rerun()
     elif selected_agent_id and not selected_agent_chat_url: st.error(f"Agente '{selected_agent_name}' no tiene URL de chat configurada.")
@@ -1,10 +1,12 @@
 import streamlit as st
+import pandas as pd
 
 # Importar dependencias locales
 from auth.auth import requires_permission # Decorador para proteger página
 from utils.helpers import show_dev_placeholder # Helper para mensaje "en desarrollo"
 # from utils.api_client import get_agentops_data # Se importaría cuando se implemente
 from utils.helpers import render_sidebar # <-- AÑADIR ESTA LÍNEA
+from database.query_log import query_stats, SLOW_QUERY_MS
 
 # --- LLAMAR A RENDER_SIDEBAR TEMPRANO ---
 render_sidebar()
@@ -13,6 +15,37 @@ render_sidebar()
 # Permiso requerido para acceder a esta página (ajustar si es necesario)
 PAGE_PERMISSION = "Monitoreo"
 
+def show_database_stats_section():
+    """Estadísticas de SQL del proceso: sentencias más costosas, consultas por render y consultas lentas."""
+    st.subheader("🗄️ Rendimiento de Base de Datos")
+    st.caption(f"Datos del proceso actual desde {query_stats.started_at.strftime('%Y-%m-%d %H:%M:%S')}. Umbral de consulta lenta: {SLOW_QUERY_MS:.0f} ms.")
+    top_statements = query_stats.top_statements(limit=25)
+    renders = query_stats.render_summary()
+    slow = query_stats.slow_statements(); totals = query_stats.totals()
+
+    c1, c2, c3 = st.columns(3)
+    with c1: st.metric("Sentencias ejecutadas", f"{int(totals['statements']):,}", f"{totals['total_ms']:.0f} ms en total", delta_color="off")
+    with c2: st.metric("Renders medidos", f"{sum(r['Renders'] for r in renders):,}")
+    with c3: st.metric("Consultas lentas (recientes)", len(slow))
+
+    st.markdown("##### Consultas por render (por página)")
+    if renders: st.dataframe(pd.DataFrame(renders), use_container_width=True, hide_index=True)
+    else: st.caption("Aún no hay renders medidos.")
+    st.caption("Cada página cuenta lo que ejecuta su función principal; el menú lateral, las lecturas de configuración "
+               "previas y los hilos en segundo plano aparecen como \"(fuera de página)\" en las sentencias.")
+
+    st.markdown("##### Sentencias por tiempo total")
+    if top_statements:
+        st.dataframe(pd.DataFrame(top_statements), use_container_width=True, hide_index=True,
+                     column_config={"Sentencia": st.column_config.TextColumn(width="large")})
+    else: st.caption("Aún no hay sentencias registradas.")
+
+    with st.expander(f"🐢 Consultas lentas recientes ({len(slow)})"):
+        if slow: st.dataframe(pd.DataFrame(slow), use_container_width=True, hide_index=True)
+        else: st.caption("Ninguna consulta superó el umbral.")
+
+    if st.button("🧹 Reiniciar estadísticas SQL"): query_stats.reset(); st.rerun()
+
 @requires_permission(PAGE_PERMISSION)
 def show_monitoring_page():
     """
@@ -21,6 +54,10 @@ def show_monitoring_page():
     st.title("📡 Monitoreo de Agentes y Sistema")
     st.caption("Visualización del rendimiento, estado y costos operativos en tiempo real.")
 
+    show_database_stats_section()
+
+    st.divider()
+    st.subheader("Agentes")
     # Mostrar el mensaje estándar de "en desarrollo"
     show_dev_placeholder("Monitoreo")
 
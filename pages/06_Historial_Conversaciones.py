@@ -2,13 +2,18 @@ import streamlit as st
 import pandas as pd
 from datetime import datetime, timedelta
 import pytz # Importar pytz directamente para obtener la zona horaria
+import html
 
 # Importar dependencias locales
 from auth.auth import requires_permission # Decorador
 from utils.config import get_configuration # Para obtener timezone configurada
 from database.database import get_db_session
-from database.models import Query, Agent # Modelos necesarios
-from utils.helpers import render_sidebar # <-- AÑADIR ESTA LÍNEA
+from database.models import epoch_ms_to_datetime
+from utils.agent_directory import agent_filter_options, ALL_AGENTS_LABEL # Opciones del filtro de agentes
+from database.queries_repository import (build_history_query, build_history_search_query, to_fts_query, SNIPPET_START, SNIPPET_END,
+                                         build_conversation_summary_query, build_session_transcript_query, FIRST_QUESTION_CHARS)
+from utils.helpers import render_sidebar, render_export_controls # <-- AÑADIR ESTA LÍNEA
+from database.exports import build_export_statement
 
 # --- LLAMAR A RENDER_SIDEBAR TEMPRANO ---
 render_sidebar()
@@ -16,6 +21,15 @@ render_sidebar()
 
 # Permiso requerido para acceder a esta página
 PAGE_PERMISSION = "Historial de Conversaciones"
+PAGE_SIZE_OPTIONS = [25, 50, 100, 200]
+try: DEFAULT_PAGE_SIZE = int(get_configuration('history_page_size', 'general', '50') or 50)
+except ValueError: DEFAULT_PAGE_SIZE = 50
+if DEFAULT_PAGE_SIZE not in PAGE_SIZE_OPTIONS: PAGE_SIZE_OPTIONS = sorted(PAGE_SIZE_OPTIONS + [DEFAULT_PAGE_SIZE])
+
+def _keep_page_size():
+    """Copia el tamaño elegido a 'hist_page_size' (clave que no es de widget): Streamlit borra el estado de los
+    widgets que no se dibujan, y el selector solo aparece en la vista de turnos con resultados."""
+    st.session_state["hist_page_size"] = st.session_state["hist_page_size_select"]
 
 # Obtener zona horaria configurada (con fallback)
 try:
@@ -25,6 +39,86 @@ except pytz.exceptions.UnknownTimeZoneError:
     print(f"WARN: Timezone '{TIMEZONE_STR}' not found, using 'America/Bogota'.")
     colombia_tz = pytz.timezone('America/Bogota')
 
+def _highlight(snippet_text: str) -> str:
+    """Snippet de FTS5 a HTML seguro: escapa el texto y convierte los marcadores de coincidencia en <mark>."""
+    return html.escape(snippet_text or "").replace(SNIPPET_START, "<mark>").replace(SNIPPET_END, "</mark>")
+
+def show_search_results(fts_query: str, start_date_dt, end_date_dt, agent_id, success_value):
+    """Resultados de búsqueda de texto completo, ordenados por relevancia (bm25) y con coincidencias resaltadas."""
+    # El orden por relevancia exige puntuar todas las coincidencias, así que aquí se pagina con OFFSET
+    page_size = st.session_state.get("hist_page_size", DEFAULT_PAGE_SIZE)
+    search_key = (fts_query, agent_id, str(start_date_dt), str(end_date_dt), success_value, page_size)
+    if st.session_state.get("hist_search_key") != search_key: st.session_state["hist_search_key"] = search_key; st.session_state["hist_search_page"] = 0
+    page = st.session_state["hist_search_page"]
+    try:
+        with get_db_session() as db:
+            rows = build_history_search_query(db, fts_query, start_date_dt, end_date_dt, agent_id, success_value, colombia_tz).offset(page * page_size).limit(page_size + 1).all()
+        has_next_page = len(rows) > page_size; rows = rows[:page_size]
+    except Exception as e:
+        st.error(f"Error en la búsqueda: {e}"); return
+    if not rows:
+        st.info("Ninguna conversación coincide con la búsqueda y los filtros seleccionados."); return
+    st.caption(f"Resultados más relevantes primero · página {page + 1}")
+    for row in rows:
+        with st.container(border=True):
+            st.caption(f"{row.fecha_hora or 'N/A'} · {row.agent_name or 'Desconocido'} · {'✅ Éxito' if row.success else '❌ Fallo'}"
+                       + (f" · {int(row.response_time_ms)} ms" if row.response_time_ms is not None else ""))
+            st.markdown(f"**Consulta:** {_highlight(row.query_snippet)}<br>**Respuesta:** {_highlight(row.response_snippet) or 'N/A'}", unsafe_allow_html=True)
+    col_prev, _, col_next = st.columns([1, 3, 1])
+    with col_prev:
+        if st.button("⬅️ Anteriores", disabled=page == 0, use_container_width=True, key="hist_search_prev"): st.session_state["hist_search_page"] = page - 1; st.rerun()
+    with col_next:
+        if st.button("Siguientes ➡️", disabled=not has_next_page, use_container_width=True, key="hist_search_next"): st.session_state["hist_search_page"] = page + 1; st.rerun()
+
+def _format_duration(ms: int) -> str:
+    seconds = max(0, int(ms // 1000)); h, rem = divmod(seconds, 3600); m, sec = divmod(rem, 60)
+    return f"{h}h {m:02d}m" if h else (f"{m}m {sec:02d}s" if m else f"{sec}s")
+
+def show_session_transcript(session_id: str):
+    """Carga y muestra la transcripción completa de una conversación (solo cuando se pide)."""
+    try:
+        with get_db_session() as db: turns = build_session_transcript_query(db, session_id).all()
+    except Exception as e:
+        st.error(f"Error cargando la conversación: {e}"); return
+    for turn in turns:
+        fecha_hora = epoch_ms_to_datetime(turn.created_at_ms, colombia_tz).strftime('%H:%M:%S') if turn.created_at_ms else ''
+        with st.chat_message(name="user", avatar="🧑‍💻"): st.markdown(turn.query_text or ''); st.caption(fecha_hora)
+        with st.chat_message(name="assistant", avatar="🤖" if turn.success else "⚠️"):
+            st.markdown(turn.response_text or turn.error_message or '_(sin respuesta)_')
+            st.caption(("✅" if turn.success else "❌") + (f" {int(turn.response_time_ms)} ms" if turn.response_time_ms is not None else ""))
+
+def show_conversations(start_date_dt, end_date_dt, agent_id, success_value):
+    """Una fila por conversación (consulta agregada por página); la transcripción se carga al activarla."""
+    # El orden por última actividad exige agrupar todo el rango, así que se pagina con OFFSET sobre el agregado
+    page_size = st.session_state.get("hist_page_size", DEFAULT_PAGE_SIZE)
+    conv_key = (agent_id, str(start_date_dt), str(end_date_dt), success_value, page_size)
+    if st.session_state.get("hist_conv_key") != conv_key: st.session_state["hist_conv_key"] = conv_key; st.session_state["hist_conv_page"] = 0
+    page = st.session_state["hist_conv_page"]
+    try:
+        with get_db_session() as db:
+            sessions = build_conversation_summary_query(db, start_date_dt, end_date_dt, agent_id, success_value).offset(page * page_size).limit(page_size + 1).all()
+    except Exception as e:
+        st.error(f"Error cargando conversaciones: {e}"); return
+    has_next_page = len(sessions) > page_size; sessions = sessions[:page_size]
+    if not sessions:
+        st.info("No se encontraron conversaciones para los filtros seleccionados."); return
+    st.caption(f"Conversaciones con actividad más reciente primero · página {page + 1}")
+    for conv in sessions:
+        inicio = epoch_ms_to_datetime(conv.started_ms, colombia_tz).strftime('%Y-%m-%d %H:%M')
+        estado = f"❌ {conv.failed_turns} fallo(s)" if conv.failed_turns else "✅"
+        with st.container(border=True):
+            col_info, col_toggle = st.columns([5, 1])
+            with col_info:
+                st.markdown(f"**{html.escape(conv.first_question or '(sin texto)')}**" + ("…" if conv.first_question and len(conv.first_question) >= FIRST_QUESTION_CHARS else ""))
+                st.caption(f"{inicio} · {conv.agent_name or 'Desconocido'} · {conv.turns} turno(s) · {_format_duration(conv.last_ms - conv.started_ms)} · {estado}")
+            with col_toggle: show_transcript = st.toggle("Ver", key=f"hist_conv_open_{conv.session_id}", help="Cargar la transcripción completa")
+            if show_transcript: show_session_transcript(conv.session_id)
+    col_prev, _, col_next = st.columns([1, 3, 1])
+    with col_prev:
+        if st.button("⬅️ Más recientes", disabled=page == 0, use_container_width=True, key="hist_conv_prev"): st.session_state["hist_conv_page"] = page - 1; st.rerun()
+    with col_next:
+        if st.button("Más antiguas ➡️", disabled=not has_next_page, use_container_width=True, key="hist_conv_next"): st.session_state["hist_conv_page"] = page + 1; st.rerun()
+
 @requires_permission(PAGE_PERMISSION)
 def show_conversation_history_page():
     """Muestra la página de Historial de Conversaciones con filtros."""
@@ -33,17 +127,16 @@ def show_conversation_history_page():
 
     # --- Filtros (Agrupados en un Expander) ---
     with st.expander("🔍 Aplicar Filtros", expanded=True):
+        search_text = st.text_input("Buscar en consultas y respuestas:", key="hist_search_text",
+                                    placeholder="Ej.: renovar cédula (ignora acentos y mayúsculas)")
         col_f1, col_f2, col_f3 = st.columns(3)
 
-        # Cargar agentes para el filtro
+        # Opciones del filtro desde el directorio de agentes compartido (sin consulta por rerun)
         try:
-            with get_db_session() as db:
-                agents = db.query(Agent.id, Agent.name).order_by(Agent.name).all()
-                agent_options_display = {"Todos los Agentes": None} # Opción default
-                agent_options_display.update({agent.name: agent.id for agent in agents})
+            agent_options_display = agent_filter_options()
         except Exception as e:
             st.error(f"Error cargando lista de agentes para filtro: {e}")
-            agent_options_display = {"Todos los Agentes": None} # Fallback
+            agent_options_display = {ALL_AGENTS_LABEL: None} # Fallback
 
         with col_f1:
             # Filtro por Agente
@@ -71,13 +164,13 @@ def show_conversation_history_page():
             end_date_dt = None
             if date_range and len(date_range) == 2:
                 # Convertir a datetime con timezone al inicio del día y fin del día
-                start_date_dt = datetime.combine(date_range[0], datetime.min.time(), tzinfo=colombia_tz)
+                start_date_dt = colombia_tz.localize(datetime.combine(date_range[0], datetime.min.time()))
                 # Fin del día: añadir 1 día y restar 1 microsegundo, o simplemente ir al inicio del día siguiente
-                end_date_dt = datetime.combine(date_range[1] + timedelta(days=1), datetime.min.time(), tzinfo=colombia_tz)
+                end_date_dt = colombia_tz.localize(datetime.combine(date_range[1] + timedelta(days=1), datetime.min.time()))
             else:
                 # Fallback si el date_input no devuelve 2 fechas
-                start_date_dt = datetime.combine(default_start_date, datetime.min.time(), tzinfo=colombia_tz)
-                end_date_dt = datetime.combine(today + timedelta(days=1), datetime.min.time(), tzinfo=colombia_tz)
+                start_date_dt = colombia_tz.localize(datetime.combine(default_start_date, datetime.min.time()))
+                end_date_dt = colombia_tz.localize(datetime.combine(today + timedelta(days=1), datetime.min.time()))
 
 
         with col_f3:
@@ -96,51 +189,48 @@ def show_conversation_history_page():
     # --- Cargar y Mostrar Historial ---
     st.subheader("Conversaciones Registradas")
 
-    try:
-        with get_db_session() as db:
-            # Query base, ordenando por más reciente
-            query_builder = db.query(Query).join(Agent).order_by(Query.created_at.desc())
-
-            # Aplicar filtros
-            if start_date_dt and end_date_dt:
-                # Asegurarse que las fechas de la DB (que tienen TZ) se comparen correctamente
-                query_builder = query_builder.filter(
-                    Query.created_at >= start_date_dt,
-                    Query.created_at < end_date_dt # Menor que el inicio del día siguiente
-                )
+    with st.expander("📤 Exportar historial filtrado"):
+        st.caption("Exporta todos los turnos que cumplen los filtros de agente, fechas y resultado (no solo la página visible).")
+        render_export_controls(build_export_statement(start_date_dt, end_date_dt, selected_agent_id, selected_success_value), "hist", colombia_tz)
 
-            if selected_agent_id is not None:
-                query_builder = query_builder.filter(Query.agent_id == selected_agent_id)
+    fts_query = to_fts_query(search_text)
+    if fts_query:
+        show_search_results(fts_query, start_date_dt, end_date_dt, selected_agent_id, selected_success_value)
+        return
+    view_mode = st.radio("Vista:", ["Turnos", "Conversaciones"], horizontal=True, key="hist_view_mode")
+    if view_mode == "Conversaciones":
+        show_conversations(start_date_dt, end_date_dt, selected_agent_id, selected_success_value)
+        return
 
-            if selected_success_value is not None:
-                 # Asumiendo 1 para éxito, 0 para fallo en la BD
-                 query_builder = query_builder.filter(Query.success == selected_success_value)
+    # --- Paginación por keyset ---
+    # 'hist_cursor_stack' guarda el cursor (created_at_ms, id) con el que empieza cada página ya visitada;
+    # la página N se obtiene buscando en el índice justo después de stack[N-1] (sin OFFSET).
+    page_size = st.session_state.get("hist_page_size", DEFAULT_PAGE_SIZE)
+    filters_key = (selected_agent_id, str(start_date_dt), str(end_date_dt), selected_success_value, page_size)
+    if st.session_state.get("hist_filters_key") != filters_key: # Filtros nuevos: volver a la primera página
+        st.session_state["hist_filters_key"] = filters_key; st.session_state["hist_cursor_stack"] = []
+    cursor_stack = st.session_state["hist_cursor_stack"]
+    page_cursor = cursor_stack[-1] if cursor_stack else None
 
-            # Limitar resultados para evitar sobrecarga (paginación sería ideal para muchos datos)
-            RESULT_LIMIT = 150
-            history_entries = query_builder.limit(RESULT_LIMIT).all()
+    try:
+        with get_db_session() as db:
+            # Query base (filtros de agente, fechas y resultado), ordenando por más reciente
+            # Proyección: solo las columnas de la tabla, con textos recortados y fecha formateada en SQL
+            query_builder = build_history_query(db, start_date_dt, end_date_dt, selected_agent_id, selected_success_value, after=page_cursor, tz=colombia_tz)
+            # Una fila extra indica si existe página siguiente
+            history_entries = query_builder.limit(page_size + 1).all()
+        has_next_page = len(history_entries) > page_size; history_entries = history_entries[:page_size]
 
         if history_entries:
-            # Preparar datos para el DataFrame
-            history_data = []
-            for entry in history_entries:
-                # Formatear fecha/hora con zona horaria
-                fecha_hora = entry.created_at.astimezone(colombia_tz).strftime('%Y-%m-%d %H:%M:%S') if entry.created_at else 'N/A'
-                # Truncar texto largo
-                consulta_trunc = (entry.query_text[:80] + '...') if entry.query_text and len(entry.query_text) > 80 else (entry.query_text or '')
-                respuesta_trunc = (entry.response_text[:80] + '...') if entry.response_text and len(entry.response_text) > 80 else (entry.response_text or 'N/A')
-                # Icono y texto para éxito
-                exito_display = "✅ Sí" if entry.success == 1 else ("❌ No" if entry.success == 0 else "❓")
-
-                history_data.append({
-                     "Fecha / Hora": fecha_hora,
-                     "Agente": entry.agent.name if entry.agent else 'Desconocido',
-                     "Consulta": consulta_trunc,
-                     "Respuesta": respuesta_trunc,
-                     "Éxito": exito_display,
-                     "T. Resp (ms)": int(entry.response_time_ms) if entry.response_time_ms is not None else 'N/A',
-                     # Podría añadirse "Session ID" si es relevante: entry.session_id
-                 })
+            # Preparar datos para el DataFrame (las filas ya vienen listas para mostrar)
+            history_data = [{
+                "Fecha / Hora": entry.fecha_hora or 'N/A',
+                "Agente": entry.agent_name or 'Desconocido',
+                "Consulta": entry.query_preview or '',
+                "Respuesta": entry.response_preview or 'N/A',
+                "Éxito": "✅ Sí" if entry.success == 1 else ("❌ No" if entry.success == 0 else "❓"),
+                "T. Resp (ms)": int(entry.response_time_ms) if entry.response_time_ms is not None else 'N/A',
+            } for entry in history_entries]
 
             # Configurar columnas para el DataFrame (opcional, para orden y nombres)
             column_config = {
@@ -157,9 +247,19 @@ def show_conversation_history_page():
                 column_config=column_config # Aplicar configuración de columnas
                 )
 
-            if len(history_entries) >= RESULT_LIMIT:
-                 st.caption(f"ℹ️ Mostrando los últimos {RESULT_LIMIT} registros que coinciden con los filtros. Para ver registros más antiguos, ajuste el rango de fechas.")
-                 # TODO: Considerar implementar paginación si el volumen de datos es muy alto.
+            # Controles de paginación
+            col_prev, col_info, col_size, col_next = st.columns([1, 2, 1, 1])
+            with col_prev:
+                if st.button("⬅️ Más recientes", disabled=not cursor_stack, use_container_width=True, key="hist_prev_page"):
+                    cursor_stack.pop(); st.rerun()
+            with col_info: st.caption(f"Página {len(cursor_stack) + 1} · {len(history_entries)} registros (más recientes primero)")
+            with col_size: st.selectbox("Por página", PAGE_SIZE_OPTIONS, index=PAGE_SIZE_OPTIONS.index(page_size) if page_size in PAGE_SIZE_OPTIONS else 0, key="hist_page_size_select",
+                                        on_change=_keep_page_size, label_visibility="collapsed")
+            with col_next:
+                if st.button("Más antiguos ➡️", disabled=not has_next_page, use_container_width=True, key="hist_next_page"):
+                    last_entry = history_entries[-1]; cursor_stack.append((last_entry.created_at_ms, last_entry.id)); st.rerun()
+        elif cursor_stack:
+            st.info("No hay más registros en esta dirección."); cursor_stack.clear()
         else:
             st.info("No se encontraron registros de conversaciones para los filtros seleccionados.")
 
@@ -2,16 +2,18 @@ import streamlit as st
 import pandas as pd
 import plotly.express as px
 from datetime import datetime, timedelta
-from collections import Counter
-import re
 import pytz # Importar pytz directamente
 
 # Importar dependencias locales
 from auth.auth import requires_permission # Decorador
 from utils.config import get_configuration # Para obtener timezone
-from database.database import get_db_session, engine # Necesitamos engine para pd.read_sql
-from database.models import Query, Agent # Modelos
-from utils.helpers import render_sidebar # <-- AÑADIR ESTA LÍNEA
+from utils.agent_directory import agent_filter_options, ALL_AGENTS_LABEL # Opciones del filtro de agentes
+from utils.analysis import (data_watermark, get_volume_series, get_latency_summary, get_top_terms, get_rising_terms,
+                            get_phrase_analysis) # Cálculos memoizados por (filtros, rango, marca de agua)
+from utils.ngrams import RISING_MIN_COUNT
+from utils.charts import render_chart, downsample_series, histogram_figure
+from utils.helpers import render_sidebar, render_export_controls # <-- AÑADIR ESTA LÍNEA
+from database.exports import build_export_statement
 
 # --- LLAMAR A RENDER_SIDEBAR TEMPRANO ---
 render_sidebar()
@@ -19,6 +21,7 @@ render_sidebar()
 
 # Permiso requerido para acceder a esta página
 PAGE_PERMISSION = "Análisis de Consultas"
+TREND_COLUMNS = {"term": "Término", "current": "Rango", "previous": "Periodo anterior", "growth": "Crecimiento"}
 
 # Obtener zona horaria configurada (con fallback)
 try:
@@ -42,15 +45,12 @@ def show_query_analysis_page():
     with st.expander("📊 Aplicar Filtros para Análisis", expanded=True):
         col_f1, col_f2 = st.columns(2)
 
-        # Cargar agentes para filtro
+        # Opciones del filtro desde el directorio de agentes compartido (sin consulta por rerun)
         try:
-            with get_db_session() as db:
-                agents = db.query(Agent.id, Agent.name).order_by(Agent.name).all()
-                agent_options_display = {"Todos los Agentes": None}
-                agent_options_display.update({agent.name: agent.id for agent in agents})
+            agent_options_display = agent_filter_options()
         except Exception as e:
             st.error(f"Error cargando lista de agentes para filtro: {e}")
-            agent_options_display = {"Todos los Agentes": None}
+            agent_options_display = {ALL_AGENTS_LABEL: None} # Fallback
 
         with col_f1:
             selected_agent_name = st.selectbox(
@@ -75,62 +75,35 @@ def show_query_analysis_page():
             # Procesar rango de fechas
             start_date_dt, end_date_dt = None, None
             if date_range and len(date_range) == 2:
-                start_date_dt = datetime.combine(date_range[0], datetime.min.time(), tzinfo=colombia_tz)
-                end_date_dt = datetime.combine(date_range[1] + timedelta(days=1), datetime.min.time(), tzinfo=colombia_tz)
+                start_date_dt = colombia_tz.localize(datetime.combine(date_range[0], datetime.min.time()))
+                end_date_dt = colombia_tz.localize(datetime.combine(date_range[1] + timedelta(days=1), datetime.min.time()))
             else: # Fallback
-                 start_date_dt = datetime.combine(default_start_date, datetime.min.time(), tzinfo=colombia_tz)
-                 end_date_dt = datetime.combine(today + timedelta(days=1), datetime.min.time(), tzinfo=colombia_tz)
+                 start_date_dt = colombia_tz.localize(datetime.combine(default_start_date, datetime.min.time()))
+                 end_date_dt = colombia_tz.localize(datetime.combine(today + timedelta(days=1), datetime.min.time()))
+
+    with st.expander("📤 Exportar consultas del análisis"):
+        render_export_controls(build_export_statement(start_date_dt, end_date_dt, selected_agent_id), "analysis", colombia_tz, file_stem="analisis_consultas")
 
     st.divider()
 
-    # --- Cargar Datos Filtrados en DataFrame ---
-    df_queries = pd.DataFrame() # Inicializar DataFrame vacío
+    # --- Cargar Series Agregadas (nunca filas sueltas de 'queries') ---
     try:
-        with get_db_session() as db:
-            # Construir la consulta base SQLAlchemy
-            query_base = db.query(
-                Query.created_at,
-                Query.success,
-                Query.response_time_ms,
-                Query.query_text,
-                Agent.name.label('agent_name') # Etiquetar para nombre de columna claro
-            ).join(Agent, Query.agent_id == Agent.id) # Asegurar JOIN explícito
-
-            # Aplicar filtros a la consulta SQLAlchemy
-            if start_date_dt and end_date_dt:
-                query_base = query_base.filter(
-                    Query.created_at >= start_date_dt,
-                    Query.created_at < end_date_dt
-                )
-            if selected_agent_id is not None:
-                query_base = query_base.filter(Query.agent_id == selected_agent_id)
-
-            # Ejecutar consulta y cargar directamente en Pandas DataFrame
-            # Usar db.bind (el engine) para la conexión de Pandas
-            df_queries = pd.read_sql(query_base.statement, db.bind)
-
-        if df_queries.empty:
+        # Marca de agua: mientras no llegue una consulta nueva, todo lo de abajo sale de la caché compartida
+        watermark = data_watermark()
+        # Volumen y tasa de éxito por día (u hora en rangos cortos) agregados en SQL desde query_stats_hourly:
+        # solo llegan las cubetas con actividad, una fila por día/hora local
+        bucket, series_rows = get_volume_series(watermark, start_date_dt, end_date_dt, selected_agent_id, colombia_tz)
+        # Percentiles y distribución de latencia fusionando los sketches por (agente, hora)
+        latency_summary = get_latency_summary(watermark, start_date_dt, end_date_dt, selected_agent_id)
+
+        if not series_rows:
              st.info("No hay datos de consultas para el período y filtros seleccionados.")
              st.stop() # No continuar si no hay datos
 
-        # --- Procesamiento Post-Carga del DataFrame ---
-        # Convertir created_at a tipo datetime con zona horaria correcta
-        # pd.read_sql a veces maneja esto, pero mejor asegurarse
-        if not pd.api.types.is_datetime64_any_dtype(df_queries['created_at']):
-             df_queries['created_at'] = pd.to_datetime(df_queries['created_at'], errors='coerce')
-        # Asegurar timezone (si viene sin él, asumir UTC y convertir a Colombia TZ)
-        if df_queries['created_at'].dt.tz is None:
-             df_queries['created_at'] = df_queries['created_at'].dt.tz_localize('UTC').dt.tz_convert(colombia_tz)
-        else:
-             # Si ya tiene timezone, solo convertir al de Colombia
-             df_queries['created_at'] = df_queries['created_at'].dt.tz_convert(colombia_tz)
-
-        # Crear columna binaria para éxito (manejar posibles Nones o valores inesperados)
-        df_queries['is_success'] = df_queries['success'].apply(lambda x: 1 if x == 1 else 0)
-        # Limpiar response_time_ms (convertir a numérico, manejar errores, quitar negativos)
-        df_queries['response_time_ms'] = pd.to_numeric(df_queries['response_time_ms'], errors='coerce')
-        df_queries = df_queries.dropna(subset=['response_time_ms']) # Quitar filas donde no se pudo convertir
-        df_queries = df_queries[df_queries['response_time_ms'] > 0] # Mantener solo tiempos positivos
+        # Serie compartida por los dos gráficos (la cubeta ya viene en hora local)
+        volume_series = pd.DataFrame(series_rows, columns=['created_at', 'query_count', 'success_count', 'success_rate'])
+        volume_series['created_at'] = pd.to_datetime(volume_series['created_at']); volume_series = volume_series.set_index('created_at')
+        bucket_label = 'Hora' if bucket == 'hour' else 'Fecha'; period_label = 'por Hora' if bucket == 'hour' else 'Diario'
 
     except Exception as e:
         st.error(f"Error al cargar o procesar datos para análisis: {e}")
@@ -145,19 +118,18 @@ def show_query_analysis_page():
 
     # 1. Volumen de Consultas por Día
     with col_a1:
-        st.markdown("📈 **Volumen Diario de Consultas**")
+        st.markdown(f"📈 **Volumen {'de Consultas por Hora' if bucket == 'hour' else 'Diario de Consultas'}**")
         try:
-            daily_volume = df_queries.set_index('created_at').resample('D').size()
-            daily_volume = daily_volume[daily_volume > 0] # Mostrar solo días con actividad
+            daily_volume = downsample_series(volume_series['query_count']) # LTTB si hay más cubetas que CHART_MAX_POINTS
             if not daily_volume.empty:
                  fig_volume = px.line(
                       daily_volume, markers=True,
-                      labels={'created_at': 'Fecha', 'value': 'Nº Consultas'},
+                      labels={'created_at': bucket_label, 'value': 'Nº Consultas'},
                       # title="Volumen Diario de Consultas" # Título ya está en markdown
                  )
                  fig_volume.update_layout(showlegend=False, margin=dict(t=5, b=5, l=5, r=5), height=350)
                  fig_volume.update_traces(line_color='#1f77b4') # Azul Plotly
-                 st.plotly_chart(fig_volume, use_container_width=True)
+                 render_chart(fig_volume)
             else:
                  st.caption("No hay datos de volumen para mostrar.")
         except Exception as e:
@@ -165,20 +137,19 @@ def show_query_analysis_page():
 
     # 2. Tasa de Éxito por Día
     with col_a2:
-         st.markdown("📊 **Tasa de Éxito Diario (%)**")
+         st.markdown(f"📊 **Tasa de Éxito {period_label} (%)**")
          try:
-             # Calcular tasa de éxito diaria (requiere 'is_success' creada antes)
-             daily_success_rate = df_queries.set_index('created_at').resample('D')['is_success'].mean() * 100
-             daily_success_rate = daily_success_rate.dropna() # Quitar días sin datos
+             # Tasa de éxito = éxitos / consultas de cada cubeta, calculada en SQL
+             daily_success_rate = downsample_series(volume_series['success_rate'])
              if not daily_success_rate.empty:
                  fig_success = px.line(
                       daily_success_rate, markers=True, range_y=[0, 105],
-                      labels={'created_at': 'Fecha', 'value': 'Tasa Éxito (%)'},
+                      labels={'created_at': bucket_label, 'value': 'Tasa Éxito (%)'},
                       # title="Tasa de Éxito Diario (%)"
                  )
                  fig_success.update_layout(showlegend=False, margin=dict(t=5, b=5, l=5, r=5), height=350)
                  fig_success.update_traces(line_color='#2ca02c') # Verde Plotly
-                 st.plotly_chart(fig_success, use_container_width=True)
+                 render_chart(fig_success)
              else:
                  st.caption("No hay datos de tasa de éxito para mostrar.")
          except Exception as e:
@@ -189,24 +160,22 @@ def show_query_analysis_page():
     # 3. Distribución del Tiempo de Respuesta
     st.markdown("⏱️ **Distribución del Tiempo de Respuesta**")
     try:
-        valid_response_times = df_queries['response_time_ms'] # Ya filtrado Nones/negativos
-        if not valid_response_times.empty:
-             avg_time = valid_response_times.mean()
-             median_time = valid_response_times.median()
-             p90_time = valid_response_times.quantile(0.9)
-
-             fig_resp_time = px.histogram(
-                  valid_response_times, nbins=40, # Ajustar número de barras
-                  labels={'value': 'Tiempo Respuesta (ms)', 'count': 'Frecuencia'},
-                  opacity=0.75, title="Histograma de Tiempos de Respuesta (ms)"
-             )
+        # Promedio exacto y percentiles del sketch (error relativo <= 1 %), sin depender de las filas cargadas
+        avg_time, median_time, p90_time, p99_time = latency_summary.mean, latency_summary.p50, latency_summary.p90, latency_summary.p99
+        if latency_summary.count:
+             col_p1, col_p2, col_p3, col_p4 = st.columns(4)
+             col_p1.metric("Promedio", f"{avg_time:.0f} ms"); col_p2.metric("P50", f"{median_time:.0f} ms")
+             col_p3.metric("P90", f"{p90_time:.0f} ms"); col_p4.metric("P99", f"{p99_time:.0f} ms")
+
+             # Histograma desde las cubetas del sketch fusionado (agrupado con NumPy: solo viajan las barras, no las filas)
+             fig_resp_time = histogram_figure(latency_summary.bin_edges, latency_summary.bin_counts, 'Tiempo Respuesta (ms)', title="Histograma de Tiempos de Respuesta (ms)")
              fig_resp_time.add_vline(x=avg_time, line_dash="dash", line_color="red", annotation_text=f"Prom: {avg_time:.0f} ms")
              fig_resp_time.add_vline(x=median_time, line_dash="dot", line_color="green", annotation_text=f"Med: {median_time:.0f} ms")
              fig_resp_time.add_vline(x=p90_time, line_dash="longdashdot", line_color="purple", annotation_text=f"P90: {p90_time:.0f} ms")
 
              fig_resp_time.update_layout(margin=dict(t=30, b=10, l=10, r=10), height=400)
-             st.plotly_chart(fig_resp_time, use_container_width=True)
-             st.caption(f"Estadísticas: Promedio={avg_time:.0f}ms, Mediana={median_time:.0f}ms, Percentil 90={p90_time:.0f}ms")
+             render_chart(fig_resp_time)
+             st.caption(f"Estadísticas ({latency_summary.count} respuestas): Promedio={avg_time:.0f}ms, Mediana={median_time:.0f}ms, P90={p90_time:.0f}ms, P99={p99_time:.0f}ms")
         else:
              st.caption("No hay datos válidos de tiempo de respuesta para mostrar.")
     except Exception as e:
@@ -216,32 +185,12 @@ def show_query_analysis_page():
 
     # 4. Análisis Básico de Texto (Palabras más frecuentes)
     st.markdown("📝 **Análisis Básico de Texto de Consultas**")
-    st.caption("Muestra las palabras más frecuentes en las consultas (excluyendo palabras comunes). Análisis muy básico.")
+    st.caption("Muestra las palabras más frecuentes en las consultas (sin acentos ni palabras comunes), desde el índice de términos por hora.")
     try:
-         all_text = " ".join(df_queries['query_text'].astype(str).str.lower())
-         # Limpieza básica: quitar caracteres no alfanuméricos (excepto espacios)
-         # Podría mejorarse para manejar acentos, etc.
-         cleaned_text = re.sub(r'[^\w\s]', '', all_text, flags=re.UNICODE)
-         words = cleaned_text.split()
-
-         # Lista básica de stopwords en español (se puede expandir o usar NLTK/spaCy)
-         stopwords_es = set([
-              'de', 'la', 'que', 'el', 'en', 'y', 'a', 'los', 'del', 'se', 'las', 'por', 'un',
-              'para', 'con', 'no', 'una', 'su', 'al', 'lo', 'como', 'más', 'pero', 'sus',
-              'le', 'ha', 'me', 'si', 'sin', 'sobre', 'este', 'ya', 'entre', 'cuando',
-              'todo', 'esta', 'ser', 'son', 'dos', 'también', 'fue', 'habia', 'era',
-              'muy', 'hasta', 'desde', 'nos', 'mi', 'mucho', 'quien', 'yo', 'eso', 'es',
-              'consulta', 'quiero', 'saber', 'necesito', 'informacion', 'puede', 'ayudar',
-              # Añadir términos muy genéricos del dominio si es necesario
-         ])
-
-         # Filtrar palabras cortas y stopwords
-         filtered_words = [word for word in words if word not in stopwords_es and len(word) > 3]
-
-         if filtered_words:
-              word_counts = Counter(filtered_words)
-              most_common_words = word_counts.most_common(20) # Top 20
+         # Top de términos desde query_terms_hourly (tokenizados al guardar cada consulta): un GROUP BY sobre una tabla pequeña
+         most_common_words = get_top_terms(watermark, start_date_dt, end_date_dt, selected_agent_id)
 
+         if most_common_words:
               df_words = pd.DataFrame(most_common_words, columns=['Palabra', 'Frecuencia'])
               fig_words = px.bar(
                    df_words.sort_values('Frecuencia', ascending=True), # Ordenar para visualización
@@ -250,12 +199,43 @@ def show_query_analysis_page():
                    labels={'Frecuencia': 'Nº Apariciones', 'Palabra': 'Palabra'}
               )
               fig_words.update_layout(margin=dict(t=5, b=5, l=5, r=5), height=450)
-              st.plotly_chart(fig_words, use_container_width=True)
+              render_chart(fig_words)
          else:
               st.caption("No se encontraron palabras significativas para analizar después de filtrar.")
 
     except Exception as text_e:
          st.warning(f"No se pudo realizar el análisis básico de texto: {text_e}")
 
+    st.divider()
+
+    # 5. Tendencias: términos emergentes y frases (bigramas/trigramas) frente al periodo anterior
+    st.markdown("🚀 **Términos y Frases Emergentes**")
+    previous_start_dt = start_date_dt - (end_date_dt - start_date_dt)
+    st.caption(f"Compara el rango seleccionado con el periodo anterior de igual duración (desde {previous_start_dt.strftime('%Y-%m-%d')}). "
+               f"Crecimiento = log2 del cociente de frecuencias relativas; mínimo {RISING_MIN_COUNT} apariciones en el rango.")
+    try:
+         df_rising = pd.DataFrame(get_rising_terms(watermark, start_date_dt, end_date_dt, selected_agent_id), columns=['term', 'current', 'previous', 'growth'])
+         col_t1, col_t2 = st.columns(2)
+         with col_t1:
+              st.markdown("##### Palabras emergentes")
+              if df_rising.empty: st.caption("Sin palabras con crecimiento significativo.")
+              else: st.dataframe(df_rising.rename(columns=TREND_COLUMNS), hide_index=True, use_container_width=True, column_config={"Crecimiento": st.column_config.NumberColumn(format="%.2f")})
+         with col_t2:
+              st.markdown("##### Frases frecuentes y emergentes")
+              # Recorre los textos del rango y del periodo anterior por bloques: memoria fija, pero coste proporcional al volumen
+              if st.toggle("Analizar frases (bigramas/trigramas)", key="analysis_ngrams", help="Lee los textos de ambos periodos; puede tardar con rangos grandes."):
+                   with st.spinner("Contando frases..."):
+                        phrases = get_phrase_analysis(watermark, start_date_dt, end_date_dt, previous_start_dt, selected_agent_id)
+                   df_phrases = pd.DataFrame(phrases['top'], columns=['Frase', 'Frecuencia'])
+                   df_rising_phrases = pd.DataFrame(phrases['rising'], columns=['term', 'current', 'previous', 'growth'])
+                   if df_phrases.empty: st.caption("No se encontraron frases repetidas en el rango.")
+                   else: st.dataframe(df_phrases, hide_index=True, use_container_width=True)
+                   if not df_rising_phrases.empty:
+                        st.dataframe(df_rising_phrases.rename(columns=TREND_COLUMNS), hide_index=True, use_container_width=True, column_config={"Crecimiento": st.column_config.NumberColumn(format="%.2f")})
+                   source_label = "instantáneas Parquet + consultas recientes" if phrases['source'] == "parquet" else "SQLite"
+                   st.caption(f"{phrases['documents']} consultas en el rango, {phrases['previous_documents']} en el periodo anterior (leídas de {source_label}).")
+    except Exception as trend_e:
+         st.warning(f"No se pudo calcular las tendencias de términos: {trend_e}")
+
 # --- Ejecutar la Página ---
 show_query_analysis_page()
@@ -8,7 +8,7 @@ from sqlalchemy.exc import IntegrityError, OperationalError
 
 # Importaciones locales
 from auth.auth import requires_role
-from utils.config import get_configuration, save_configuration
+from utils.config import get_configuration, get_configurations, save_configurations
 from utils.api_client import test_agentops_connection, test_anthropic_connection, test_openai_connection
 from database.database import get_db_session
 from database.models import LanguageModelOption, SkillOption, PersonalityOption, GoalOption, Configuration
@@ -86,7 +86,7 @@ def crud_options_ui(option_model, model_name_singular: str, model_name_plural: s
         else: st.caption(f"Nada para eliminar.")
 
 # --- Página Principal y otras secciones (sin cambios) ---
-@requires_role("superadministrador")
+@requires_role("superadministrador", page="Configuración")
 def show_config_page():
     st.title("⚙️ Configuración"); st.caption("Gestiona APIs, opciones, apariencia y seguridad.")
     tabs = st.tabs(["🔌 APIs", "🧩 Opciones Agentes", "⚙️ General", "🎨 Apariencia", "🔒 Seguridad"])
@@ -99,20 +99,18 @@ def show_config_page():
 def api_config_section(): # Sin cambios
     st.header("APIs"); st.caption("Credenciales.");
     with st.form("api_config_form"):
-        st.subheader("N8N"); st.text_input("Usuario N8N", value=get_configuration('n8n_username', 'api', ''), key="cfg_form_n8n_user"); st.text_input("Contraseña N8N", type="password", value=get_configuration('n8n_password', 'api', ''), key="cfg_form_n8n_pass")
+        api_keys = ['n8n_username', 'n8n_password', 'agentops_api_key', 'anthropic_api_key', 'openai_api_key']; cur = get_configurations(api_keys, 'api', defaults={k: '' for k in api_keys})
+        st.subheader("N8N"); st.text_input("Usuario N8N", value=cur['n8n_username'], key="cfg_form_n8n_user"); st.text_input("Contraseña N8N", type="password", value=cur['n8n_password'], key="cfg_form_n8n_pass")
         st.markdown("---"); st.subheader("Otras"); t1, t2, t3 = st.tabs(["AgentOps", "Anthropic", "OpenAI"])
-        with t1: st.text_input("AgentOps Key", type="password", value=get_configuration('agentops_api_key', 'api', ''), key="cfg_form_agentops_key")
-        with t2: st.text_input("Anthropic Key", type="password", value=get_configuration('anthropic_api_key', 'api', ''), key="cfg_form_anthropic_key")
-        with t3: st.text_input("OpenAI Key", type="password", value=get_configuration('openai_api_key', 'api', ''), key="cfg_form_openai_key")
+        with t1: st.text_input("AgentOps Key", type="password", value=cur['agentops_api_key'], key="cfg_form_agentops_key")
+        with t2: st.text_input("Anthropic Key", type="password", value=cur['anthropic_api_key'], key="cfg_form_anthropic_key")
+        with t3: st.text_input("OpenAI Key", type="password", value=cur['openai_api_key'], key="cfg_form_openai_key")
         st.markdown("---"); submitted = st.form_submit_button("💾 Guardar APIs", type="primary")
         if submitted:
-             kvs = {'n8n_username': st.session_state.cfg_form_n8n_user,'n8n_password': st.session_state.cfg_form_n8n_pass, 'agentops_api_key': st.session_state.cfg_form_agentops_key, 'anthropic_api_key': st.session_state.cfg_form_anthropic_key, 'openai_api_key': st.session_state.cfg_form_openai_key}; ok = True; errs = []
+             kvs = {'n8n_username': st.session_state.cfg_form_n8n_user,'n8n_password': st.session_state.cfg_form_n8n_pass, 'agentops_api_key': st.session_state.cfg_form_agentops_key, 'anthropic_api_key': st.session_state.cfg_form_anthropic_key, 'openai_api_key': st.session_state.cfg_form_openai_key}
              try:
-                 with get_db_session() as db:
-                      for k, v in kvs.items():
-                           if not save_configuration(k, v or '', 'api', db_session=db): ok = False; errs.append(f"'{k}'")
-                 if ok: st.success("✅ APIs guardadas."); time.sleep(1)
-                 else: st.warning(f"⚠️ Error APIs: {', '.join(errs)}")
+                 if save_configurations({k: v or '' for k, v in kvs.items()}, 'api'): st.success("✅ APIs guardadas."); time.sleep(1)
+                 else: st.warning(f"⚠️ Error APIs: {', '.join(repr(k) for k in kvs)}")
              except Exception as e: st.error(f"Error fatal APIs: {e}")
     st.markdown("---"); st.subheader("Probar"); c1, c2, c3 = st.columns(3)
     with c1:
@@ -133,11 +131,14 @@ def options_agents_tab_content(): # Sin cambios
 def general_config_section(): # Sin cambios
     st.header("General"); st.caption("Opciones generales.")
     with st.form("general_config_form"):
-        name=get_configuration('dashboard_name','general','IA-AMCO'); tz=get_configuration('timezone','general','America/Bogota')
+        cur=get_configurations(['dashboard_name','timezone','history_page_size'],'general',defaults={'dashboard_name':'IA-AMCO','timezone':'America/Bogota','history_page_size':'50'}); name=cur['dashboard_name']; tz=cur['timezone']
         st.text_input("Nombre Dashboard *", value=name, key="cfg_form_dash_name"); st.selectbox("Idioma", ["Español"], key="cfg_form_lang", index=0, disabled=True)
         try: zones=sorted(pytz.common_timezones); tz_idx=zones.index(tz) if tz in zones else 0; zones.insert(0,tz) if tz not in zones else None; tz_idx=zones.index(tz)
         except: zones=[tz,'America/Bogota']; tz_idx=0
         st.selectbox("Zona Horaria *", zones, index=tz_idx, key="cfg_form_tz")
+        try: page_size=int(cur['history_page_size'])
+        except (TypeError, ValueError): page_size=50
+        st.number_input("Registros por página (Historial)", min_value=10, max_value=500, step=5, value=page_size, key="cfg_form_hist_page_size")
         st.markdown("---"); submitted = st.form_submit_button("💾 Guardar General", type="primary")
         if submitted:
             errs=[]; n=st.session_state.cfg_form_dash_name; t=st.session_state.cfg_form_tz
@@ -146,13 +147,10 @@ def general_config_section(): # Sin cambios
             if errs:
                  for e in errs: st.error(f"⚠️ {e}")
             else:
-                 kvs={'dashboard_name':n,'language':st.session_state.cfg_form_lang,'timezone':t}; ok=True; ems=[]
+                 kvs={'dashboard_name':n,'language':st.session_state.cfg_form_lang,'timezone':t,'history_page_size':int(st.session_state.cfg_form_hist_page_size)}
                  try:
-                      with get_db_session() as db:
-                           for k,v in kvs.items():
-                                if not save_configuration(k,v,'general',db_session=db): ok=False; ems.append(f"'{k}'")
-                      if ok: st.success("✅ General guardado."); time.sleep(1); st.rerun()
-                      else: st.warning(f"⚠️ Error general: {', '.join(ems)}")
+                      if save_configurations(kvs,'general'): st.success("✅ General guardado."); time.sleep(1); st.rerun()
+                      else: st.warning(f"⚠️ Error general: {', '.join(repr(k) for k in kvs)}")
                  except Exception as e: st.error(f"Error fatal general: {e}")
 
 def appearance_config_section(): # Sin cambios
@@ -174,14 +172,10 @@ def appearance_config_section(): # Sin cambios
              if errs:
                   for e in errs: st.error(f"⚠️ {e}")
              else:
-                  ok=True; ems=[]
-                  try:
-                       with get_db_session() as db:
-                            for k in cks:
-                                 if not save_configuration(k,st.session_state[f"cfg_form_{k}"],'appearance',db_session=db): ok=False; ems.append(f"'{k}'")
-                            if not save_configuration('logo_url',curl,'general',db_session=db): ok=False; ems.append("'logo_url'")
-                       if ok: st.success("✅ Apariencia guardada. ¡Refresca (F5)!"); time.sleep(1)
-                       else: st.warning(f"⚠️ Error apariencia: {', '.join(ems)}")
+                  kvs={k: st.session_state[f"cfg_form_{k}"] for k in cks}; kvs['logo_url']=curl
+                  try: # Colores + logo en un único upsert (logo_url vive en 'general')
+                       if save_configurations(kvs,'appearance',categories={'logo_url':'general'}): st.success("✅ Apariencia guardada. ¡Refresca (F5)!"); time.sleep(1)
+                       else: st.warning(f"⚠️ Error apariencia: {', '.join(repr(k) for k in kvs)}")
                   except Exception as e: st.error(f"Error fatal apariencia: {e}")
 
 def security_config_section(): # Sin cambios
@@ -193,13 +187,9 @@ def security_config_section(): # Sin cambios
         st.markdown("---"); submitted=st.form_submit_button("💾 Guardar Seguridad", type="primary")
         if submitted:
              kvs={'password_min_length':st.session_state.cfg_form_sec_pwd_len,'password_require_uppercase':st.session_state.cfg_form_sec_pwd_upper,'password_require_numbers':st.session_state.cfg_form_sec_pwd_num,'password_require_special':st.session_state.cfg_form_sec_pwd_spec,'session_timeout':st.session_state.cfg_form_sec_sess_time}
-             ok=True; ems=[]
              try:
-                 with get_db_session() as db:
-                      for k,v in kvs.items():
-                           if not save_configuration(k,str(v),'security',db_session=db): ok=False; ems.append(f"'{k}'")
-                 if ok: st.success("✅ Config seguridad guardada."); time.sleep(1)
-                 else: st.warning(f"⚠️ Error seguridad: {', '.join(ems)}")
+                 if save_configurations(kvs,'security'): st.success("✅ Config seguridad guardada."); time.sleep(1)
+                 else: st.warning(f"⚠️ Error seguridad: {', '.join(repr(k) for k in kvs)}")
              except Exception as e: st.error(f"Error fatal seguridad: {e}")
 
 # --- Ejecutar ---
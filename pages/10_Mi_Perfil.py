@@ -6,7 +6,7 @@ from sqlalchemy.orm import joinedload # <--- IMPORTADO joinedload
 
 # Importaciones locales
 from auth.auth import hash_password, validate_password, get_security_config_values
-from database.database import get_db_session
+from database.database import get_db_session, rerun_session_scope
 from database.models import User, Role
 from utils.helpers import is_valid_email
 import logging
@@ -86,4 +86,4 @@ def show_profile_page():
                         except Exception as e: st.error(f"❌ Error guardando perfil: {e}"); log.error("Error saving profile", exc_info=True)
     except Exception as e: st.error(f"Error cargando datos perfil: {e}"); log.error("Error loading profile page", exc_info=True)
 
-show_profile_page()
+with rerun_session_scope(page="Mi Perfil"): show_profile_page()
@@ -0,0 +1,46 @@
+# --- tests/test_term_index.py (Índice de Términos de Consultas) ---
+# Una consulta por hora durante tres días locales en una BD en memoria: el top de términos y los términos
+# emergentes de UN día local deben contar solo ese día, en cualquier zona y sin reconstruir el índice.
+
+from datetime import datetime
+
+import pytest
+import pytz
+from sqlalchemy import text
+from sqlalchemy.orm import Session as SQLAlchemySession
+
+from database.database import create_ephemeral_engine
+from database.models import datetime_to_epoch_ms, epoch_ms_to_datetime
+from database.queries_repository import build_top_terms_query, build_term_trend_query
+from database.term_index import HOUR_MS, update_term_counts
+
+BOGOTA = pytz.timezone('America/Bogota')
+
+@pytest.fixture
+def db():
+    db_engine = create_ephemeral_engine("memory")
+    first_ms = datetime_to_epoch_ms(BOGOTA.localize(datetime(2026, 9, 10)))
+    with db_engine.begin() as conn:
+        agent_id = conn.execute(text("INSERT INTO agents (name) VALUES ('term-index-test')")).lastrowid
+        rows = [{"agent_id": agent_id, "created_at_ms": ms, "query_text": f"palabra{epoch_ms_to_datetime(ms, BOGOTA).day}"}
+                for ms in range(first_ms, first_ms + 72 * HOUR_MS, HOUR_MS)]
+        conn.execute(text("INSERT INTO queries (agent_id, created_at_ms, query_text) VALUES (:agent_id, :created_at_ms, :query_text)"), rows)
+        update_term_counts(conn, rows)
+    with SQLAlchemySession(bind=db_engine) as session: yield session
+    db_engine.dispose()
+
+def _one_local_day():
+    return BOGOTA.localize(datetime(2026, 9, 11)), BOGOTA.localize(datetime(2026, 9, 12))
+
+def test_top_terms_of_one_local_day(db):
+    start, end = _one_local_day()
+    assert [tuple(row) for row in build_top_terms_query(db, start, end).all()] == [("palabra11", 24)]
+
+def test_term_trend_of_one_local_day(db):
+    start, end = _one_local_day()
+    trend = {row.term: (row.current, row.previous) for row in build_term_trend_query(db, start, end).all()}
+    assert trend == {"palabra11": (24, 0), "palabra10": (0, 24)}
+
+def test_other_timezone_needs_no_rebuild(db):
+    start, end = pytz.utc.localize(datetime(2026, 9, 11)), pytz.utc.localize(datetime(2026, 9, 12)) # 19:00 a 19:00 en Bogotá
+    assert dict(tuple(row) for row in build_top_terms_query(db, start, end).all()) == {"palabra11": 19, "palabra10": 5}
@@ -0,0 +1,67 @@
+# --- utils/agent_directory.py (Directorio de agentes compartido por proceso) ---
+# Los filtros y selectores de agente (Agentes IA, Historial, Análisis, Gestión) leían 'agents' en cada rerun.
+# Aquí se carga la tabla una vez (id, nombre, descripción, estado, modelo y URL de chat) y se sirve desde
+# memoria a todas las sesiones hasta que expira el TTL o Gestión de Agentes la invalida al guardar cambios.
+
+import os
+import time
+import logging
+import threading
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from database.database import get_db_session
+from database.models import Agent
+
+log = logging.getLogger(__name__)
+
+AGENT_DIRECTORY_TTL_SECONDS = float(os.getenv('AGENT_DIRECTORY_TTL_SECONDS', '300')) # Red de seguridad (otros procesos)
+ALL_AGENTS_LABEL = "Todos los Agentes"
+
+class AgentEntry(NamedTuple):
+    id: int
+    name: str
+    description: str
+    status: str
+    model_name: Optional[str]
+    n8n_chat_url: Optional[str]
+
+    @property
+    def is_active(self) -> bool: return self.status == 'active'
+
+_directory_lock = threading.Lock()
+_directory: Optional[Tuple[Tuple[AgentEntry, ...], Dict[int, AgentEntry]]] = None # (ordenados por nombre, por id)
+_directory_loaded_at = 0.0
+
+def invalidate_agent_directory() -> None:
+    """Descarta el directorio; la próxima lectura recarga 'agents'. Llamar tras crear, editar o borrar un agente."""
+    global _directory
+    with _directory_lock: _directory = None
+
+def _load_directory() -> Tuple[Tuple[AgentEntry, ...], Dict[int, AgentEntry]]:
+    global _directory, _directory_loaded_at
+    with _directory_lock:
+        if _directory is not None and (time.monotonic() - _directory_loaded_at) < AGENT_DIRECTORY_TTL_SECONDS: return _directory
+        with get_db_session() as db:
+            rows = db.query(Agent.id, Agent.name, Agent.description, Agent.status, Agent.model_name, Agent.n8n_chat_url).order_by(Agent.name).all()
+        entries = tuple(AgentEntry(r.id, r.name, r.description or '', r.status, r.model_name, r.n8n_chat_url) for r in rows)
+        _directory = (entries, {entry.id: entry for entry in entries}); _directory_loaded_at = time.monotonic()
+        log.debug(f"Agent directory loaded: {len(entries)} agents.")
+        return _directory
+
+# --- Consultas ---
+def list_agents(active_only: bool = False) -> List[AgentEntry]:
+    """Agentes ordenados por nombre (solo los activos si active_only)."""
+    return [entry for entry in _load_directory()[0] if entry.is_active or not active_only]
+
+def get_agent(agent_id: Optional[int]) -> Optional[AgentEntry]:
+    return _load_directory()[1].get(agent_id) if agent_id is not None else None
+
+def get_agent_name(agent_id: Optional[int], default: str = 'Desconocido') -> str:
+    entry = get_agent(agent_id)
+    return entry.name if entry else default
+
+def agent_filter_options(all_label: str = ALL_AGENTS_LABEL) -> Dict[str, Optional[int]]:
+    """Opciones {nombre: id} para un selectbox de filtro, con 'all_label' -> None primero."""
+    options: Dict[str, Optional[int]] = {all_label: None}
+    options.update({entry.name: entry.id for entry in _load_directory()[0]})
+    return options
@@ -0,0 +1,88 @@
+# --- utils/analysis.py (Cálculos de Análisis de Consultas, memoizados por marca de agua) ---
+# Cada resultado se memoiza por (filtros, rango de fechas, marca de agua) en una caché LRU con tope de memoria
+# compartida por todas las sesiones: volver a un rango ya visto no toca la BD, y en cuanto llega una consulta
+# nueva la marca de agua (max(queries.id)) cambia y los resultados se recalculan. El TTL solo cubre cambios
+# que no suben la marca (borrado de un agente y sus consultas, reconstrucción de agregados).
+# Lo cacheado es el mismo objeto para todas las sesiones: se guardan valores inmutables, nunca objetos
+# con estado (sketches, contadores).
+
+import os
+import logging
+from datetime import datetime
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+from sqlalchemy import func
+
+from database.database import get_db_session
+from database.models import Query
+from database.queries_repository import (build_volume_series_query, build_latency_rollup_query, build_top_terms_query,
+                                         build_term_trend_query, build_query_text_query, series_bucket)
+from database.rollups import summarize_latency
+from database.snapshots import SnapshotReadError, iter_query_text_chunks, snapshot_exporter
+from utils.cache import LRUCache, cached_in
+from utils.charts import histogram_bins
+from utils.ngrams import count_ngrams, count_text_chunks, rising_ngrams, rising_terms
+
+log = logging.getLogger(__name__)
+
+ANALYSIS_CACHE_TTL_SECONDS = float(os.getenv('ANALYSIS_CACHE_TTL_SECONDS', '600'))
+ANALYSIS_CACHE_MAX_ENTRIES = int(os.getenv('ANALYSIS_CACHE_MAX_ENTRIES', '512'))
+ANALYSIS_CACHE_MAX_MB = float(os.getenv('ANALYSIS_CACHE_MAX_MB', '64'))
+
+analysis_cache = LRUCache(ANALYSIS_CACHE_TTL_SECONDS, ANALYSIS_CACHE_MAX_ENTRIES, int(ANALYSIS_CACHE_MAX_MB * 1024 * 1024))
+memoized = cached_in(analysis_cache)
+
+def data_watermark() -> int:
+    """max(queries.id): sube con cada consulta registrada (una búsqueda en la clave primaria)."""
+    with get_db_session() as db: return db.query(func.max(Query.id)).scalar() or 0
+
+# Todas las funciones reciben 'watermark' solo para que forme parte de la clave de la caché.
+@memoized
+def get_volume_series(watermark: int, start_dt: datetime, end_dt: datetime, agent_id: Optional[int], tz) -> Tuple[str, List[Tuple[str, int, int, float]]]:
+    """(cubeta 'day'/'hour', filas (bucket, query_count, success_count, success_rate)) en la zona 'tz'."""
+    bucket = series_bucket(start_dt, end_dt)
+    with get_db_session() as db: rows = build_volume_series_query(db, start_dt, end_dt, agent_id, tz, bucket).all()
+    return bucket, [tuple(row) for row in rows]
+
+class LatencySummary(NamedTuple):
+    """Resumen inmutable de latencia (lo comparten todas las sesiones desde la caché): nunca el sketch mutable."""
+    count: int
+    mean: Optional[float]
+    p50: Optional[float]
+    p90: Optional[float]
+    p99: Optional[float]
+    bin_edges: Tuple[float, ...]  # Histograma (bordes lineales) de las cubetas del sketch fusionado
+    bin_counts: Tuple[float, ...]
+
+@memoized
+def get_latency_summary(watermark: int, start_dt: datetime, end_dt: datetime, agent_id: Optional[int]) -> LatencySummary:
+    """summarize_latency sobre los agregados horarios del rango, con el histograma ya agrupado."""
+    with get_db_session() as db: summary = summarize_latency(build_latency_rollup_query(db, start_dt, end_dt, agent_id).all())
+    edges, counts = histogram_bins(*summary["sketch"].centroids()) if summary["count"] else ((), ())
+    return LatencySummary(summary["count"], summary["mean"], summary["p50"], summary["p90"], summary["p99"],
+                          tuple(float(e) for e in edges), tuple(float(c) for c in counts))
+
+@memoized
+def get_top_terms(watermark: int, start_dt: datetime, end_dt: datetime, agent_id: Optional[int]) -> List[Tuple[str, int]]:
+    with get_db_session() as db: return [tuple(row) for row in build_top_terms_query(db, start_dt, end_dt, agent_id).all()]
+
+@memoized
+def get_rising_terms(watermark: int, start_dt: datetime, end_dt: datetime, agent_id: Optional[int]) -> List[Dict[str, Any]]:
+    with get_db_session() as db: return rising_terms(build_term_trend_query(db, start_dt, end_dt, agent_id).all())
+
+def _count_phrases(start_dt: datetime, end_dt: datetime, agent_id: Optional[int]) -> Tuple[Any, str]:
+    """(contador de n-gramas, origen): instantáneas Parquet + cola reciente si hay manifiesto, si no SQLite."""
+    chunks = iter_query_text_chunks(start_dt, end_dt, agent_id)
+    if chunks is not None:
+        try: return count_text_chunks(chunks), "parquet"
+        except SnapshotReadError: pass # Partición ilegible a mitad del recorrido: se cuenta todo de nuevo desde SQLite
+    with get_db_session() as db: stmt = build_query_text_query(db, start_dt, end_dt, agent_id).statement
+    return count_ngrams(stmt), "sqlite"
+
+@memoized
+def get_phrase_analysis(watermark: int, start_dt: datetime, end_dt: datetime, previous_start_dt: datetime, agent_id: Optional[int]) -> Dict[str, Any]:
+    """Frases frecuentes y emergentes del rango frente a [previous_start_dt, start_dt). Solo se guardan las listas, no los contadores."""
+    snapshot_exporter.start() # Idempotente; el primer análisis de frases pone en marcha las instantáneas
+    (current, source), (previous, _) = _count_phrases(start_dt, end_dt, agent_id), _count_phrases(previous_start_dt, start_dt, agent_id)
+    return {"top": current.most_common(15), "rising": rising_ngrams(current, previous),
+            "documents": current.documents, "previous_documents": previous.documents, "source": source}
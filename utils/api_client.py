@@ -10,10 +10,11 @@ from typing import Optional, Tuple, Any, Dict, List
 log = logging.getLogger(__name__)
 
 try:
-    from utils.config import get_configuration
+    from utils.config import get_configuration, get_configurations
 except ImportError:
     log.error("FATAL: Failed to import get_configuration from utils.config.")
     def get_configuration(key: str, category: Optional[str] = None, default: Optional[Any] = None) -> Optional[str]: return default
+    def get_configurations(keys, category: Optional[str] = None, defaults: Optional[Dict[str, Any]] = None) -> Dict[str, Optional[str]]: return {k: (defaults or {}).get(k) for k in keys}
 
 # --- Constantes y Configuración ---
 N8N_CONFIG_CATEGORY = 'api'
@@ -24,8 +25,7 @@ def get_n8n_credentials() -> Dict[str, Optional[str]]:
     """Obtiene solo username y password de N8N."""
     creds = {'n8n_username': None, 'n8n_password': None}
     try:
-        creds['n8n_username'] = get_configuration('n8n_username', N8N_CONFIG_CATEGORY)
-        creds['n8n_password'] = get_configuration('n8n_password', N8N_CONFIG_CATEGORY)
+        creds.update(get_configurations(creds.keys(), N8N_CONFIG_CATEGORY))
     except Exception as e:
         log.error(f"Failed to retrieve N8N credentials: {e}", exc_info=True)
     return creds
@@ -78,19 +78,20 @@ def _make_n8n_request(method: str, url: Optional[str], headers: Optional[Dict[st
 # crear_agente_n8n, editar_agente_n8n, eliminar_agente_n8n, test_n8n_connection
 
 # --- Función de Chat (MODIFICADA para recibir URL) ---
-def enviar_mensaje_al_agente_n8n(chat_url: Optional[str], message: str, session_id: str) -> Tuple[str, Optional[Any]]:
+def enviar_mensaje_al_agente_n8n(chat_url: Optional[str], message: str, session_id: str) -> Tuple[str, Optional[Any], bool]:
     """
     Envía un mensaje a una URL de chat N8N específica.
     Requiere credenciales globales de N8N.
-    Devuelve (texto_respuesta_procesado, datos_respuesta_completos_o_None).
+    Devuelve (texto_respuesta_o_mensaje_de_error, datos_respuesta_completos_o_None, exito). 'exito' solo es True
+    si se extrajo una respuesta; una respuesta sin texto reconocible o imposible de procesar cuenta como fallo.
     """
     log.info(f"Sending message via N8N (Session: {session_id}) to URL: {chat_url}")
-    if not chat_url: return "Error: URL de chat no proporcionada para este agente.", None
+    if not chat_url: return "Error: URL de chat no proporcionada para este agente.", None, False
 
     # Obtener credenciales globales
     creds = get_n8n_credentials()
     headers, error_headers = create_n8n_auth_headers(creds)
-    if error_headers: return f"Error de configuración N8N: {error_headers}", None
+    if error_headers: return f"Error de configuración N8N: {error_headers}", None, False
 
     # Payload (Ajustar si N8N necesita algo más que input y session)
     payload = { "sessionId": session_id, "chatInput": message }
@@ -102,7 +103,7 @@ def enviar_mensaje_al_agente_n8n(chat_url: Optional[str], message: str, session_
     # Manejar error en la solicitud
     if error:
         log.error(f"Error sending chat message to N8N URL {chat_url}: {error}")
-        return f"Error al contactar al agente ({error})", None
+        return f"Error al contactar al agente ({error})", None, False
 
     # Procesar Respuesta Exitosa (lógica de extracción igual que antes)
     log.debug(f"Raw chat response data from N8N URL {chat_url}: {str(response_data)[:500]}")
@@ -124,10 +125,10 @@ def enviar_mensaje_al_agente_n8n(chat_url: Optional[str], message: str, session_
                 for key in possible_keys:
                     if key in first_item and isinstance(first_item[key], str): response_text = first_item[key]; break
         elif isinstance(response_data, str): response_text = response_data
-    except Exception as e: log.error(f"Error processing N8N chat response structure: {e}", exc_info=True); return f"Error al procesar respuesta: {e}", response_data
+    except Exception as e: log.error(f"Error processing N8N chat response structure: {e}", exc_info=True); return f"Error al procesar respuesta: {e}", response_data, False
 
-    if response_text is not None: log.info(f"Extracted chat response from {chat_url}."); return str(response_text), response_data
-    else: log.warning(f"Could not extract chat response from {chat_url}."); fallback_msg = f"Respuesta inesperada: {str(response_data)[:150]}..."; return fallback_msg, response_data
+    if response_text is not None: log.info(f"Extracted chat response from {chat_url}."); return str(response_text), response_data, True
+    else: log.warning(f"Could not extract chat response from {chat_url}."); fallback_msg = f"Respuesta inesperada: {str(response_data)[:150]}..."; return fallback_msg, response_data, False
 
 
 # --- Placeholders para otras APIs (sin cambios) ---
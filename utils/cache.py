@@ -0,0 +1,115 @@
+# --- utils/cache.py (Memoización con TTL compartida por proceso) ---
+# Streamlit ejecuta cada sesión en su propio hilo: un resultado memoizado aquí se comparte entre todos
+# los usuarios conectados. Si varias sesiones piden la misma clave expirada a la vez, solo una la calcula
+# (las demás esperan su resultado) para no multiplicar consultas pesadas.
+
+import sys
+import time
+import threading
+import functools
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+class TTLCache:
+    """Diccionario {clave: (valor, instante)} con expiración y cálculo único por clave."""
+    def __init__(self, ttl_seconds: float, max_entries: int = 256):
+        self.ttl_seconds = ttl_seconds; self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: Dict[Hashable, Tuple[Any, float]] = {}
+        self._key_locks: Dict[Hashable, threading.Lock] = {}
+        self.hits = 0; self.misses = 0
+
+    def _fresh(self, key: Hashable) -> Tuple[bool, Any]:
+        entry = self._entries.get(key)
+        if entry is not None and (time.monotonic() - entry[1]) < self.ttl_seconds: return True, entry[0]
+        return False, None
+
+    def _store(self, key: Hashable, value: Any) -> None:
+        if len(self._entries) >= self.max_entries and key not in self._entries:
+            self._entries.pop(min(self._entries, key=lambda k: self._entries[k][1])) # Expulsar el más antiguo
+        self._entries[key] = (value, time.monotonic())
+
+    def get_or_compute(self, key: Hashable, compute: Callable[[], Any]) -> Any:
+        with self._lock:
+            found, value = self._fresh(key)
+            if found: self.hits += 1; return value
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+        with key_lock: # Un solo cálculo por clave; quien espera reutiliza el resultado
+            with self._lock:
+                found, value = self._fresh(key)
+                if found: self.hits += 1; return value
+                self.misses += 1
+            try:
+                value = compute()
+                with self._lock: self._store(key, value)
+                return value
+            finally: # También si compute falla: si no, cada clave fallida (ej. otro rango de fechas) dejaría su lock para siempre
+                with self._lock:
+                    if self._key_locks.get(key) is key_lock: del self._key_locks[key]
+
+    def invalidate(self, key: Optional[Hashable] = None) -> None:
+        """Descarta una clave o, sin argumentos, toda la caché."""
+        with self._lock:
+            if key is None: self._entries.clear()
+            else: self._entries.pop(key, None)
+
+def estimate_size(value: Any, _depth: int = 0) -> int:
+    """Tamaño aproximado en bytes (DataFrames y arrays por su buffer; contenedores recorridos hasta 4 niveles)."""
+    memory_usage = getattr(value, "memory_usage", None)
+    if callable(memory_usage): # DataFrame / Series de pandas
+        usage = memory_usage(deep=True); return int(usage.sum() if hasattr(usage, "sum") else usage)
+    if hasattr(value, "nbytes"): return int(value.nbytes) # ndarray
+    size = sys.getsizeof(value)
+    if _depth >= 4: return size
+    if isinstance(value, dict): return size + sum(estimate_size(k, _depth + 1) + estimate_size(v, _depth + 1) for k, v in value.items())
+    if isinstance(value, (list, tuple, set, frozenset)): return size + sum(estimate_size(item, _depth + 1) for item in value)
+    slots = getattr(type(value), "__slots__", None)
+    if slots: return size + sum(estimate_size(getattr(value, name, None), _depth + 1) for name in slots)
+    return size
+
+class LRUCache(TTLCache):
+    """TTLCache con expulsión LRU y tope de memoria (estimate_size); un valor mayor que el tope no se guarda."""
+    def __init__(self, ttl_seconds: float, max_entries: int = 256, max_bytes: int = 64 * 1024 * 1024):
+        super().__init__(ttl_seconds, max_entries)
+        self.max_bytes = max_bytes; self.total_bytes = 0; self.evictions = 0
+        self._entries: "OrderedDict[Hashable, Tuple[Any, float]]" = OrderedDict(); self._sizes: Dict[Hashable, int] = {}
+
+    def _fresh(self, key: Hashable) -> Tuple[bool, Any]:
+        found, value = super()._fresh(key)
+        if found: self._entries.move_to_end(key) # Usado recientemente
+        return found, value
+
+    def _discard(self, key: Hashable) -> None:
+        self._entries.pop(key, None); self.total_bytes -= self._sizes.pop(key, 0)
+
+    def _store(self, key: Hashable, value: Any) -> None:
+        size = estimate_size(value); self._discard(key)
+        if size > self.max_bytes: return
+        while self._entries and (len(self._entries) >= self.max_entries or self.total_bytes + size > self.max_bytes):
+            self._discard(next(iter(self._entries))); self.evictions += 1 # El menos usado recientemente
+        self._entries[key] = (value, time.monotonic()); self._sizes[key] = size; self.total_bytes += size
+
+    def invalidate(self, key: Optional[Hashable] = None) -> None:
+        with self._lock:
+            if key is None: self._entries.clear(); self._sizes.clear(); self.total_bytes = 0
+            else: self._discard(key)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"entries": len(self._entries), "bytes": self.total_bytes, "max_bytes": self.max_bytes,
+                    "hits": self.hits, "misses": self.misses, "evictions": self.evictions}
+
+def cached_in(cache: TTLCache) -> Callable:
+    """Decorador: memoiza en 'cache' por (función, argumentos hashables). Varias funciones pueden compartir caché."""
+    def decorator(func: Callable) -> Callable:
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            key = (func.__qualname__, args, tuple(sorted(kwargs.items())))
+            return cache.get_or_compute(key, lambda: func(*args, **kwargs))
+        wrapper.cache = cache
+        return wrapper
+    return decorator
+
+def ttl_cached(ttl_seconds: float, max_entries: int = 256) -> Callable:
+    """Decorador: memoiza por argumentos (hashables) durante ttl_seconds. Expone .cache para invalidar."""
+    return cached_in(TTLCache(ttl_seconds, max_entries))
@@ -0,0 +1,89 @@
+# --- utils/charts.py (Gráficos Plotly con tamaño acotado) ---
+# Plotly serializa cada punto en el JSON que Streamlit envía al navegador. Aquí las series largas se reducen
+# con LTTB (Largest-Triangle-Three-Buckets, Steinarsson 2013) a CHART_MAX_POINTS conservando la forma, los
+# histogramas se agrupan con NumPy antes de dibujarse (solo viajan las barras). Los puntos se limitan ANTES
+# de construir la figura; render_chart no vuelve a serializarla salvo con logging DEBUG, para avisar si
+# alguna supera CHART_MAX_JSON_BYTES.
+
+import os
+import logging
+from typing import Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+import streamlit as st
+
+log = logging.getLogger(__name__)
+
+CHART_MAX_POINTS = int(os.getenv('CHART_MAX_POINTS', '500'))          # Puntos por traza de línea
+CHART_MAX_JSON_BYTES = int(os.getenv('CHART_MAX_JSON_BYTES', '400000')) # Aviso (solo en DEBUG) si una figura lo supera
+HISTOGRAM_BINS = 40
+
+# --- LTTB ---
+def lttb_indices(x: np.ndarray, y: np.ndarray, max_points: int) -> np.ndarray:
+    """
+    Índices de los puntos que conserva LTTB: siempre el primero y el último y, de cada cubeta intermedia,
+    el que forma el triángulo de mayor área con el punto elegido antes y la media de la cubeta siguiente.
+    """
+    n = len(x)
+    if max_points >= n or max_points < 3: return np.arange(n)
+    x = np.asarray(x, dtype=np.float64); y = np.asarray(y, dtype=np.float64)
+    edges = np.linspace(1, n - 1, max_points - 1).astype(np.int64) # max_points - 2 cubetas entre el primero y el último
+    selected = np.empty(max_points, dtype=np.int64); selected[0] = 0; selected[-1] = n - 1; previous = 0
+    for i in range(max_points - 2):
+        start, end = edges[i], edges[i + 1]
+        next_start, next_end = end, (edges[i + 2] if i + 2 < len(edges) else n)
+        avg_x = x[next_start:next_end].mean(); avg_y = y[next_start:next_end].mean()
+        areas = np.abs((x[previous] - avg_x) * (y[start:end] - y[previous]) - (x[previous] - x[start:end]) * (avg_y - y[previous]))
+        previous = selected[i + 1] = start + int(np.nanargmax(areas)) if np.isfinite(areas).any() else start
+    return selected
+
+def _numeric_axis(values) -> Optional[np.ndarray]:
+    """Eje x como float (las fechas en ns); None si no es numérico ni de fechas (categorías)."""
+    array = np.asarray(values)
+    if np.issubdtype(array.dtype, np.datetime64): return array.astype('datetime64[ns]').astype(np.int64).astype(np.float64)
+    if np.issubdtype(array.dtype, np.number): return array.astype(np.float64)
+    return None
+
+def downsample_series(series: pd.Series, max_points: int = CHART_MAX_POINTS) -> pd.Series:
+    """Serie indexada por fecha/número reducida con LTTB (sin cambios si ya cabe en max_points)."""
+    if len(series) <= max_points: return series
+    x = _numeric_axis(series.index)
+    if x is None: return series
+    return series.iloc[lttb_indices(x, series.to_numpy(dtype=np.float64, na_value=np.nan), max_points)]
+
+# --- Histogramas ---
+def histogram_bins(values: Sequence[float], weights: Optional[Sequence[float]] = None, bins: int = HISTOGRAM_BINS,
+                   log_scale: bool = False) -> Tuple[np.ndarray, np.ndarray]:
+    """(bordes, conteos) de un histograma con bordes fijos o logarítmicos (para latencias de cola larga)."""
+    values = np.asarray(values, dtype=np.float64); weights = None if weights is None else np.asarray(weights, dtype=np.float64)
+    mask = np.isfinite(values) & ((values > 0) if log_scale else True)
+    values = values[mask]; weights = None if weights is None else weights[mask]
+    if values.size == 0: return np.array([]), np.array([])
+    low, high = values.min(), values.max()
+    if high <= low: high = low + 1
+    edges = np.geomspace(low, high, bins + 1) if log_scale else np.linspace(low, high, bins + 1)
+    counts, edges = np.histogram(values, bins=edges, weights=weights)
+    return edges, counts
+
+def histogram_figure(edges: Sequence[float], counts: Sequence[float], x_title: str, y_title: str = "Frecuencia",
+                     log_scale: bool = False, title: Optional[str] = None) -> go.Figure:
+    """Barras de un histograma ya agrupado (una barra por cubeta, con su ancho real)."""
+    edges = np.asarray(edges, dtype=np.float64); counts = np.asarray(counts)
+    centers = np.sqrt(edges[:-1] * edges[1:]) if log_scale else (edges[:-1] + edges[1:]) / 2
+    fig = go.Figure(go.Bar(x=centers, y=counts, width=np.diff(edges), opacity=0.75,
+                           customdata=np.stack([edges[:-1], edges[1:]], axis=1),
+                           hovertemplate="%{customdata[0]:.0f}–%{customdata[1]:.0f}: %{y}<extra></extra>"))
+    fig.update_layout(title=title, xaxis_title=x_title, yaxis_title=y_title, bargap=0)
+    if log_scale: fig.update_xaxes(type="log")
+    return fig
+
+# --- Envío ---
+def render_chart(fig: go.Figure, **kwargs) -> None:
+    """st.plotly_chart a todo el ancho. Con logging DEBUG mide el JSON y avisa si supera CHART_MAX_JSON_BYTES."""
+    if log.isEnabledFor(logging.DEBUG):
+        size = len(fig.to_json())
+        if size > CHART_MAX_JSON_BYTES: log.warning(f"Chart JSON is {size} bytes (cap {CHART_MAX_JSON_BYTES}); downsample its data before plotting.")
+    kwargs.setdefault("use_container_width", True)
+    st.plotly_chart(fig, **kwargs)
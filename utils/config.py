@@ -1,8 +1,12 @@
 # --- utils/config.py (CORRECTO - Sin importación circular) ---
 
 from sqlalchemy.orm import Session as SQLAlchemySession
-from typing import Optional, Any, Dict
+from sqlalchemy import event, func, or_, and_
+from typing import Optional, Any, Dict, Tuple, List, Iterable
 from datetime import datetime
+import os
+import time
+import threading
 import pytz
 
 # Importaciones locales SOLO de database
@@ -19,15 +23,59 @@ except pytz.exceptions.UnknownTimeZoneError:
     print(f"WARN: Default timezone '{DEFAULT_TIMEZONE_CONFIG}' failed? Using 'America/Bogota'.")
     colombia_tz = pytz.timezone('America/Bogota')
 
+# --- Caché de Configuración (por proceso) ---
+# La tabla 'configurations' es pequeña y se lee en cada rerun (logo, nombre, timezone, seguridad...).
+# Se carga completa en UNA consulta y se sirve desde memoria hasta que expira el TTL o se guarda un valor.
+CONFIG_CACHE_TTL_SECONDS = float(os.getenv('CONFIG_CACHE_TTL_SECONDS', '300'))
+CONFIG_CACHE_MAX_ENTRIES = int(os.getenv('CONFIG_CACHE_MAX_ENTRIES', '1024'))
+
+_config_cache_lock = threading.Lock()
+_config_cache: Optional[Dict[str, Tuple[Optional[str], str]]] = None # {key: (value, category)}
+_config_cache_loaded_at = 0.0
+_config_cache_complete = False # False si la tabla supera CONFIG_CACHE_MAX_ENTRIES
+
+def invalidate_configuration_cache() -> None:
+    """Descarta la caché de configuración; la próxima lectura recarga la tabla."""
+    global _config_cache, _config_cache_complete
+    with _config_cache_lock:
+        _config_cache = None; _config_cache_complete = False
+
+def _load_configuration_cache() -> Tuple[Dict[str, Tuple[Optional[str], str]], bool]:
+    """Devuelve (snapshot, completo), recargando la tabla si la caché está vacía o expirada."""
+    global _config_cache, _config_cache_loaded_at, _config_cache_complete
+    with _config_cache_lock:
+        if _config_cache is not None and (time.monotonic() - _config_cache_loaded_at) < CONFIG_CACHE_TTL_SECONDS:
+            return _config_cache, _config_cache_complete
+        with get_db_session() as db:
+            rows = db.query(Configuration.key, Configuration.value, Configuration.category).order_by(Configuration.key).limit(CONFIG_CACHE_MAX_ENTRIES + 1).all()
+        _config_cache_complete = len(rows) <= CONFIG_CACHE_MAX_ENTRIES
+        _config_cache = {row.key: (row.value, row.category) for row in rows[:CONFIG_CACHE_MAX_ENTRIES]}
+        _config_cache_loaded_at = time.monotonic()
+        return _config_cache, _config_cache_complete
+
+def _invalidate_cache_on_commit(db: SQLAlchemySession) -> None:
+    """Con sesión externa el cambio solo es visible tras el commit: invalidar también en ese momento."""
+    event.listen(db, "after_commit", _on_session_commit, once=True)
+
+def _on_session_commit(session: SQLAlchemySession) -> None:
+    invalidate_configuration_cache()
+
 # --- Funciones Principales ---
 
 def get_configuration(key: str, category: Optional[str] = None, default: Optional[Any] = None, db_session: Optional[SQLAlchemySession] = None) -> Optional[str]:
     """
-    Obtiene un valor de configuración de la base de datos como string.
+    Obtiene un valor de configuración como string.
+    Sin db_session se sirve desde la caché de proceso; con db_session se lee dentro de esa transacción.
     """
     session_manager = get_db_session() if db_session is None else db_session
     try:
         if db_session is None:
+            snapshot, complete = _load_configuration_cache()
+            if key in snapshot:
+                config_value, config_category = snapshot[key]
+                if category and config_category != category: config_value = None
+                return config_value if config_value is not None else default
+            if complete: return default
             with session_manager as db:
                 query = db.query(Configuration.value).filter(Configuration.key == key)
                 if category: query = query.filter(Configuration.category == category)
@@ -42,43 +90,82 @@ def get_configuration(key: str, category: Optional[str] = None, default: Optiona
         print(f"ERROR getting configuration for key='{key}', category='{category}': {e}")
         return default
 
-def save_configuration(key: str, value: Any, category: str, description: Optional[str] = None, db_session: Optional[SQLAlchemySession] = None) -> bool:
+def get_configurations(keys: Iterable[str], category: Optional[str] = None, defaults: Optional[Dict[str, Any]] = None, db_session: Optional[SQLAlchemySession] = None) -> Dict[str, Optional[str]]:
     """
-    Guarda o actualiza un valor de configuración en la base de datos.
+    Obtiene varias configuraciones a la vez como {key: value_str}.
+    Las claves ausentes (o de otra categoría) devuelven su valor en 'defaults' o None.
+    Sin db_session se sirve desde la caché; si no, se lee con una sola consulta IN (...).
     """
-    value_str = str(value) if value is not None else ''
-    session_manager = get_db_session() if db_session is None else db_session
-    saved_successfully = False
+    keys = list(dict.fromkeys(keys)); defaults = defaults or {}
+    found: Dict[str, Optional[str]] = {}
+    try:
+        snapshot, complete = _load_configuration_cache() if db_session is None else ({}, False)
+        if complete or all(k in snapshot for k in keys):
+            found = {k: v for k, (v, cat) in snapshot.items() if k in keys and (not category or cat == category)}
+        elif keys:
+            def _read(db: SQLAlchemySession) -> Dict[str, Optional[str]]:
+                query = db.query(Configuration.key, Configuration.value).filter(Configuration.key.in_(keys))
+                if category: query = query.filter(Configuration.category == category)
+                return {row.key: row.value for row in query.all()}
+            if db_session is None:
+                with get_db_session() as db: found = _read(db)
+            else: found = _read(db_session)
+    except Exception as e:
+        print(f"ERROR getting configurations for keys={keys}, category='{category}': {e}")
+    return {k: (found[k] if found.get(k) is not None else defaults.get(k)) for k in keys}
+
+def _build_configuration_upsert(dialect_name: str, rows: List[Dict[str, Any]]):
+    """INSERT ... ON CONFLICT(key) DO UPDATE para todas las filas en una sola sentencia."""
+    if dialect_name == 'postgresql': from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    else: from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    table = Configuration.__table__
+    stmt = dialect_insert(table).values(rows)
+    excluded = stmt.excluded
+    return stmt.on_conflict_do_update(
+        index_elements=[table.c.key],
+        set_={
+            'value': excluded.value, 'category': excluded.category,
+            'description': func.coalesce(excluded.description, table.c.description),
+            'updated_at': excluded.updated_at,
+        },
+        # Solo tocar updated_at si algo cambió realmente (igual que la versión por clave)
+        where=or_(
+            table.c.value.is_distinct_from(excluded.value),
+            table.c.category != excluded.category,
+            and_(excluded.description.isnot(None), table.c.description.is_distinct_from(excluded.description)),
+        ),
+    )
+
+def save_configurations(mapping: Dict[str, Any], category: str, descriptions: Optional[Dict[str, str]] = None, categories: Optional[Dict[str, str]] = None, db_session: Optional[SQLAlchemySession] = None) -> bool:
+    """
+    Guarda o actualiza varias configuraciones con un único upsert.
+    'categories' permite sobrescribir la categoría de claves concretas (ej. logo_url en 'general').
+    """
+    if not mapping: return True
+    descriptions = descriptions or {}; categories = categories or {}
+    current_time = datetime.now(colombia_tz)
+    rows = [{
+        'key': key, 'value': str(value) if value is not None else '',
+        'category': categories.get(key, category), 'description': descriptions.get(key),
+        'created_at': current_time, 'updated_at': current_time,
+    } for key, value in mapping.items()]
     try:
-        current_time = datetime.now(colombia_tz)
         if db_session is None:
-            with session_manager as db:
-                config = db.query(Configuration).filter(Configuration.key == key).first()
-                if config: # Actualizar
-                    if config.value != value_str or config.category != category or (description is not None and config.description != description):
-                        config.value = value_str; config.category = category
-                        if description is not None: config.description = description
-                        config.updated_at = current_time; saved_successfully = True
-                    else: saved_successfully = True # No cambios, pero OK
-                else: # Crear
-                    config = Configuration(key=key, value=value_str, category=category, description=description, created_at=current_time, updated_at=current_time)
-                    db.add(config); saved_successfully = True
-        else: # Usar sesión externa
-            db = session_manager
-            config = db.query(Configuration).filter(Configuration.key == key).first()
-            if config:
-                if config.value != value_str or config.category != category or (description is not None and config.description != description):
-                    config.value = value_str; config.category = category
-                    if description is not None: config.description = description
-                    config.updated_at = current_time; saved_successfully = True
-                else: saved_successfully = True
-            else:
-                config = Configuration(key=key, value=value_str, category=category, description=description, created_at=current_time, updated_at=current_time)
-                db.add(config); saved_successfully = True
-        return saved_successfully
+            with get_db_session() as db: db.execute(_build_configuration_upsert(db.get_bind().dialect.name, rows))
+        else: db_session.execute(_build_configuration_upsert(db_session.get_bind().dialect.name, rows))
+        return True
     except Exception as e:
-        print(f"ERROR saving configuration for key='{key}': {e}")
+        print(f"ERROR saving configurations {list(mapping)}: {e}")
         return False
+    finally:
+        invalidate_configuration_cache()
+        if db_session is not None: _invalidate_cache_on_commit(db_session)
+
+def save_configuration(key: str, value: Any, category: str, description: Optional[str] = None, db_session: Optional[SQLAlchemySession] = None) -> bool:
+    """
+    Guarda o actualiza un valor de configuración en la base de datos.
+    """
+    return save_configurations({key: value}, category, descriptions={key: description} if description is not None else None, db_session=db_session)
 
 def get_all_configurations(db_session: Optional[SQLAlchemySession] = None) -> Dict[str, str]:
     """Obtiene todas las configuraciones como un diccionario {key: value_str}."""
@@ -86,6 +173,8 @@ def get_all_configurations(db_session: Optional[SQLAlchemySession] = None) -> Di
     configs: Dict[str, str] = {}
     try:
         if db_session is None:
+            snapshot, complete = _load_configuration_cache()
+            if complete: return {k: (v or '') for k, (v, _) in snapshot.items()}
             with session_manager as db: all_configs_db = db.query(Configuration).all()
         else: db = session_manager; all_configs_db = db.query(Configuration).all()
         for config_db in all_configs_db: configs[config_db.key] = config_db.value or ''
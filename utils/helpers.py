@@ -1,10 +1,12 @@
 import streamlit as st
+import os
 import re
 from typing import Optional
 
 # Importaciones necesarias para la función del sidebar
 from utils.config import get_configuration
 from auth.auth import logout # Importar función logout
+from database.exports import EXPORT_FORMATS, EXPORT_MIME_TYPES, EXPORT_MAX_DOWNLOAD_MB, ExportTooLargeError, export_to_tempfile
 import logging
 
 log = logging.getLogger(__name__)
@@ -87,4 +89,44 @@ def render_sidebar():
         # 4. Botón de Cerrar Sesión
         if st.button("🚪 Cerrar Sesión", key="logout_sidebar_central", use_container_width=True):
             logout(message="Has cerrado sesión exitosamente.")
-            # logout() ya hace rerun y limpia estado, deteniendo ejecución posterior.
\ No newline at end of file
+            # logout() ya hace rerun y limpia estado, deteniendo ejecución posterior.
+# --- Exportación del Historial (CSV/Parquet en streaming) ---
+def render_export_controls(stmt, key_prefix: str, tz=None, file_stem: str = "historial"):
+    """
+    Selector de formato + botón que genera la exportación de 'stmt' (ver database/exports.py) en un archivo
+    temporal con memoria constante y lo ofrece como descarga. El archivo se lee solo al pulsar "Descargar" y se
+    borra al servirlo. Las exportaciones de más de EXPORT_MAX_DOWNLOAD_MB se derivan a python -m database.exports.
+    """
+    col_fmt, col_btn, col_dl = st.columns([1, 1, 2])
+    with col_fmt: fmt = st.selectbox("Formato", EXPORT_FORMATS, key=f"{key_prefix}_export_fmt", label_visibility="collapsed")
+    with col_btn: prepare = st.button("📦 Preparar exportación", key=f"{key_prefix}_export_btn", use_container_width=True)
+    state_key = f"{key_prefix}_export_file" # Solo (ruta, formato, filas): el contenido nunca se guarda en la sesión
+    if prepare:
+        _discard_export(state_key)
+        try:
+            with st.spinner("Exportando..."): path, rows = export_to_tempfile(fmt, stmt, tz)
+            st.session_state[state_key] = (path, fmt, rows)
+        except ExportTooLargeError:
+            st.warning(f"La exportación supera {EXPORT_MAX_DOWNLOAD_MB:.0f} MB. Para rangos tan grandes use la línea de comandos: "
+                       f"`python -m database.exports --out {file_stem}.{fmt} --since AAAA-MM-DD --until AAAA-MM-DD`")
+        except Exception as e: log.error(f"Export failed: {e}", exc_info=True); st.error(f"Error exportando: {e}")
+    prepared = st.session_state.get(state_key)
+    if prepared and not os.path.exists(prepared[0]): st.session_state.pop(state_key, None); prepared = None # Ya descargado o caducado
+    if prepared:
+        path, prepared_fmt, rows = prepared
+        with col_dl: # data diferida: Streamlit no lee el archivo en cada rerun, solo al pulsar; on_click="ignore" evita un rerun que la descarte
+            st.download_button(f"⬇️ Descargar {rows} filas ({prepared_fmt.upper()}, {os.path.getsize(path)/1024:.0f} KB)", data=lambda: _read_and_remove(path),
+                               file_name=f"{file_stem}.{prepared_fmt}", mime=EXPORT_MIME_TYPES[prepared_fmt], key=f"{key_prefix}_export_dl", on_click="ignore")
+
+def _read_and_remove(path: str) -> bytes:
+    """Contenido de una exportación preparada; el archivo se borra al leerlo (descarga de un solo uso)."""
+    with open(path, "rb") as f: data = f.read()
+    os.remove(path)
+    return data
+
+def _discard_export(state_key: str) -> None:
+    """Borra el archivo temporal de una exportación preparada y su entrada en la sesión."""
+    prepared = st.session_state.pop(state_key, None)
+    if prepared:
+        try: os.remove(prepared[0])
+        except FileNotFoundError: pass
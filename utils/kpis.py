@@ -0,0 +1,73 @@
+# --- utils/kpis.py (KPIs de Vista General) ---
+# Todas las cifras salen de 'agents' y de los agregados horarios 'query_stats_hourly' (nunca de las filas
+# de 'queries'), así que el coste no depende del tamaño del historial: como máximo 8 días x 24 horas.
+# El resultado se memoiza por zona horaria durante KPI_CACHE_TTL_SECONDS y lo comparten todos los usuarios.
+
+import os
+import logging
+from datetime import datetime, timedelta, date
+from typing import Any, Dict, List, Optional
+
+import pytz
+from sqlalchemy import func, case
+
+from database.database import get_db_session
+from database.models import Agent, QueryStatsHourly, datetime_to_epoch_ms, epoch_ms_to_datetime
+from database.rollups import HOUR_MS
+from utils.cache import ttl_cached
+
+log = logging.getLogger(__name__)
+
+KPI_CACHE_TTL_SECONDS = float(os.getenv('KPI_CACHE_TTL_SECONDS', '60'))
+TREND_DAYS = 7
+
+def _rate(success: int, total: int) -> Optional[float]:
+    return (success / total * 100.0) if total else None
+
+def _local_midnight(tz, day: date) -> datetime:
+    return tz.localize(datetime.combine(day, datetime.min.time()))
+
+@ttl_cached(KPI_CACHE_TTL_SECONDS)
+def get_overview_kpis(timezone_name: str = 'America/Bogota') -> Dict[str, Any]:
+    """
+    KPIs de la página de inicio en la zona horaria indicada:
+    agentes (total/activos), consultas y tasa de éxito de hoy vs ayer, tendencia diaria de 7 días,
+    reparto de consultas por agente (7 días) y tiempo de respuesta promedio por hora (últimas 24 h).
+    """
+    tz = pytz.timezone(timezone_name); now = datetime.now(tz); today = now.date()
+    trend_start = _local_midnight(tz, today - timedelta(days=TREND_DAYS - 1))
+    window_start_ms = datetime_to_epoch_ms(min(trend_start, _local_midnight(tz, today - timedelta(days=1))))
+    last_24h_ms = datetime_to_epoch_ms(now - timedelta(hours=24))
+    rollup = QueryStatsHourly
+
+    with get_db_session() as db:
+        total_agents, active_agents = db.query(func.count(Agent.id), func.sum(case((Agent.status == 'active', 1), else_=0))).one()
+        hourly = db.query(
+            rollup.hour_start_ms, func.sum(rollup.query_count).label('query_count'), func.sum(rollup.success_count).label('success_count'),
+            func.sum(rollup.response_count).label('response_count'), func.sum(rollup.response_time_sum).label('response_time_sum'),
+        ).filter(rollup.hour_start_ms >= window_start_ms).group_by(rollup.hour_start_ms).all()
+        usage = db.query(Agent.name, func.sum(rollup.query_count).label('query_count')).join(Agent, Agent.id == rollup.agent_id).filter(
+            rollup.hour_start_ms >= datetime_to_epoch_ms(trend_start)).group_by(Agent.name).order_by(func.sum(rollup.query_count).desc()).all()
+
+    # Agrupar horas UTC por día local
+    per_day: Dict[date, List[int]] = {trend_start.date() + timedelta(days=i): [0, 0] for i in range(TREND_DAYS)}
+    per_day.setdefault(today - timedelta(days=1), [0, 0])
+    response_by_hour: List[Dict[str, Any]] = []
+    for row in hourly:
+        local_day = epoch_ms_to_datetime(row.hour_start_ms, tz).date()
+        if local_day in per_day: per_day[local_day][0] += row.query_count or 0; per_day[local_day][1] += row.success_count or 0
+        if row.hour_start_ms > last_24h_ms - HOUR_MS and row.response_count: # Horas que solapan las últimas 24 h
+            response_by_hour.append({'hour': epoch_ms_to_datetime(row.hour_start_ms, tz), 'avg_response_ms': row.response_time_sum / row.response_count})
+
+    today_count, today_success = per_day[today]; yesterday_count, yesterday_success = per_day[today - timedelta(days=1)]
+    today_rate, yesterday_rate = _rate(today_success, today_count), _rate(yesterday_success, yesterday_count)
+    return {
+        'computed_at': now,
+        'total_agents': int(total_agents or 0), 'active_agents': int(active_agents or 0),
+        'queries_today': today_count, 'queries_yesterday': yesterday_count, 'queries_delta': today_count - yesterday_count,
+        'success_rate_today': today_rate, 'success_rate_yesterday': yesterday_rate,
+        'success_rate_delta': (today_rate - yesterday_rate) if today_rate is not None and yesterday_rate is not None else None,
+        'daily_trend': [{'date': d, 'queries': c, 'success_rate': _rate(s, c)} for d, (c, s) in sorted(per_day.items()) if d >= trend_start.date()],
+        'agent_usage': [{'agent': name, 'queries': int(count or 0)} for name, count in usage if count],
+        'hourly_response_time': sorted(response_by_hour, key=lambda r: r['hour']),
+    }
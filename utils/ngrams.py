@@ -0,0 +1,109 @@
+# --- utils/ngrams.py (Frases frecuentes y emergentes con memoria acotada) ---
+# Cuenta bigramas y trigramas de las consultas con "hashing trick": cada n-grama va a una de 2**NGRAM_HASH_BITS
+# cubetas de un array NumPy, así que la memoria es fija (8 bytes por cubeta) sea cual sea el número de consultas.
+# Los textos se procesan por bloques; solo se guarda el texto de las cubetas más frecuentes (LABEL_CAPACITY)
+# para poder mostrarlas. Los n-gramas se forman con los términos de utils/text_analysis.py (sin stopwords).
+
+import os
+import zlib
+import logging
+from typing import Iterable, List, Optional, Dict, Tuple, Any
+
+import numpy as np
+from sqlalchemy.engine import Engine
+
+from database.database import get_engine
+from utils.text_analysis import tokenize
+
+log = logging.getLogger(__name__)
+
+NGRAM_HASH_BITS = int(os.getenv('NGRAM_HASH_BITS', '20')) # 2**20 cubetas = 8 MB por periodo
+NGRAM_RANGE = (2, 3)
+LABEL_CAPACITY = 20000 # Etiquetas (texto del n-grama) retenidas; al superarse se conservan las de cubetas más frecuentes
+RISING_MIN_COUNT = 5   # Apariciones mínimas en el periodo actual para considerar un término emergente
+NGRAM_CHUNK_ROWS = int(os.getenv('NGRAM_CHUNK_ROWS', '2000')) # Textos leídos y contados por bloque
+
+def iter_ngrams(tokens: List[str], ngram_range: Tuple[int, int] = NGRAM_RANGE) -> Iterable[str]:
+    low, high = ngram_range
+    for n in range(low, high + 1):
+        for i in range(len(tokens) - n + 1): yield " ".join(tokens[i:i + n])
+
+class HashedNgramCounter:
+    """Conteo de n-gramas en un array de tamaño fijo (colisiones posibles, poco probables con 2**20 cubetas)."""
+    def __init__(self, hash_bits: int = NGRAM_HASH_BITS, ngram_range: Tuple[int, int] = NGRAM_RANGE, label_capacity: int = LABEL_CAPACITY):
+        self.mask = (1 << hash_bits) - 1; self.ngram_range = ngram_range; self.label_capacity = label_capacity
+        self.counts = np.zeros(1 << hash_bits, dtype=np.int64)
+        self.labels: Dict[int, str] = {}; self.documents = 0
+
+    def _bucket(self, ngram: str) -> int: return zlib.crc32(ngram.encode("utf-8")) & self.mask # Estable entre procesos
+
+    def update(self, texts: Iterable[Optional[str]]) -> None:
+        """Suma un bloque de textos."""
+        buckets: List[int] = []
+        for text in texts:
+            self.documents += 1
+            for ngram in iter_ngrams(tokenize(text), self.ngram_range):
+                bucket = self._bucket(ngram); buckets.append(bucket)
+                if bucket not in self.labels: self.labels[bucket] = ngram
+        if buckets: self.counts += np.bincount(np.fromiter(buckets, dtype=np.int64, count=len(buckets)), minlength=self.counts.size)
+        if len(self.labels) > self.label_capacity: self._prune_labels()
+
+    def _prune_labels(self) -> None:
+        """Conserva la mitad de las etiquetas, las de cubetas con más conteo (las frecuentes vuelven a etiquetarse al reaparecer)."""
+        keys = np.fromiter(self.labels, dtype=np.int64, count=len(self.labels))
+        keep = keys[np.argsort(-self.counts[keys], kind="stable")[:self.label_capacity // 2]]
+        self.labels = {int(k): self.labels[int(k)] for k in keep}
+
+    @property
+    def total(self) -> int: return int(self.counts.sum())
+
+    def most_common(self, k: int = 20) -> List[Tuple[str, int]]:
+        """Los k n-gramas más frecuentes (solo cubetas con etiqueta)."""
+        return [(self.labels[b], int(self.counts[b])) for b in _top_buckets(self.counts, k * 2) if b in self.labels][:k]
+
+def count_text_chunks(chunks: Iterable[Iterable[Optional[str]]]) -> HashedNgramCounter:
+    """Cuenta los n-gramas de bloques de textos (de SQLite o de las instantáneas Parquet)."""
+    counter = HashedNgramCounter()
+    for chunk in chunks: counter.update(chunk)
+    log.info(f"Counted n-grams of {counter.documents} texts ({len(counter.labels)} labels kept).")
+    return counter
+
+def count_ngrams(stmt, db_engine: Optional[Engine] = None, chunk_rows: int = NGRAM_CHUNK_ROWS) -> HashedNgramCounter:
+    """Cuenta los n-gramas de un SELECT de una sola columna de texto, leído en streaming por bloques."""
+    db_engine = db_engine or get_engine()
+    with db_engine.connect() as conn:
+        result = conn.execution_options(stream_results=True, yield_per=chunk_rows).execute(stmt)
+        return count_text_chunks([row[0] for row in partition] for partition in result.partitions())
+
+def _top_buckets(values: np.ndarray, k: int) -> List[int]:
+    """Índices de los k mayores valores > 0, de mayor a menor (argpartition: O(n))."""
+    k = min(k, int(np.count_nonzero(values)))
+    if k <= 0: return []
+    top = np.argpartition(-values, k - 1)[:k]
+    return [int(b) for b in top[np.argsort(-values[top], kind="stable")]]
+
+def rising_scores(current: np.ndarray, previous: np.ndarray, min_count: int = RISING_MIN_COUNT) -> np.ndarray:
+    """
+    Crecimiento de cada término entre dos periodos: log2 del cociente de sus frecuencias relativas, con
+    suavizado +1 para los términos nuevos. Los que no llegan a min_count en el periodo actual quedan en -inf.
+    """
+    current = current.astype(np.float64); previous = previous.astype(np.float64)
+    total_current = max(current.sum(), 1.0); total_previous = max(previous.sum(), 1.0)
+    scores = np.log2(((current + 1) / total_current) / ((previous + 1) / total_previous))
+    scores[current < min_count] = -np.inf
+    return scores
+
+def rising_ngrams(current: HashedNgramCounter, previous: HashedNgramCounter, k: int = 15, min_count: int = RISING_MIN_COUNT) -> List[Dict[str, Any]]:
+    """N-gramas que más crecen del periodo anterior al actual (misma configuración de hashing en ambos)."""
+    scores = rising_scores(current.counts, previous.counts, min_count)
+    candidates = [b for b in _top_buckets(np.where(np.isfinite(scores) & (scores > 0), scores, 0), k * 2) if b in current.labels][:k]
+    return [{"term": current.labels[b], "current": int(current.counts[b]), "previous": int(previous.counts[b]), "growth": float(scores[b])} for b in candidates]
+
+def rising_terms(rows: Iterable[Any], k: int = 15, min_count: int = RISING_MIN_COUNT) -> List[Dict[str, Any]]:
+    """Igual que rising_ngrams para filas (term, current, previous) ya agregadas (ej. desde query_terms_hourly)."""
+    rows = list(rows)
+    if not rows: return []
+    current = np.array([r.current or 0 for r in rows], dtype=np.int64); previous = np.array([r.previous or 0 for r in rows], dtype=np.int64)
+    scores = rising_scores(current, previous, min_count)
+    return [{"term": rows[i].term, "current": int(current[i]), "previous": int(previous[i]), "growth": float(scores[i])}
+            for i in _top_buckets(np.where(np.isfinite(scores) & (scores > 0), scores, 0), k)]
@@ -0,0 +1,114 @@
+# --- utils/sketches.py (DDSketch: cuantiles fusionables con error relativo acotado) ---
+# Implementación en Python puro de DDSketch (Masson, Rim y Lee, VLDB 2019) para valores positivos.
+# Cada valor x cae en la cubeta i = ceil(log_gamma(x)), con gamma = (1 + alpha) / (1 - alpha); el cuantil
+# devuelto está a un error relativo <= alpha del valor real. Dos sketches se fusionan sumando cubetas,
+# así que los agregados por agente y hora se combinan para cualquier rango sin leer las filas originales.
+#
+# Formato binario (to_bytes): versión (B), alpha (d), mín (d), máx (d), nº de cubetas (varint) y luego,
+# por cubeta en orden creciente, delta de índice (varint zigzag) y conteo (varint).
+
+import math
+import struct
+from typing import Dict, Iterable, List, Optional, Tuple
+
+DEFAULT_RELATIVE_ACCURACY = 0.01 # 1 %
+DEFAULT_MAX_BINS = 2048          # Al superarse se colapsan las cubetas más bajas (afecta solo a cuantiles muy bajos)
+_FORMAT_VERSION = 1
+_HEADER = struct.Struct("<Bddd")
+
+# --- Varints ---
+def _write_varint(out: bytearray, value: int) -> None:
+    while True:
+        byte = value & 0x7F; value >>= 7
+        if value: out.append(byte | 0x80)
+        else: out.append(byte); return
+
+def _read_varint(data: bytes, pos: int) -> Tuple[int, int]:
+    result = 0; shift = 0
+    while True:
+        byte = data[pos]; pos += 1
+        result |= (byte & 0x7F) << shift; shift += 7
+        if not byte & 0x80: return result, pos
+
+def _zigzag(value: int) -> int: return (value << 1) ^ (value >> 63)
+def _unzigzag(value: int) -> int: return (value >> 1) ^ -(value & 1)
+
+class DDSketch:
+    """Sketch de cuantiles para valores > 0 (los valores <= 0 se ignoran)."""
+    __slots__ = ("alpha", "gamma", "_log_gamma", "max_bins", "bins", "count", "min", "max")
+
+    def __init__(self, relative_accuracy: float = DEFAULT_RELATIVE_ACCURACY, max_bins: int = DEFAULT_MAX_BINS):
+        if not 0 < relative_accuracy < 1: raise ValueError("relative_accuracy must be in (0, 1)")
+        self.alpha = relative_accuracy; self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma); self.max_bins = max_bins
+        self.bins: Dict[int, int] = {}; self.count = 0; self.min = math.inf; self.max = -math.inf
+
+    def _index(self, value: float) -> int: return math.ceil(math.log(value) / self._log_gamma)
+
+    def add(self, value: float, count: int = 1) -> None:
+        if value is None or value <= 0 or count <= 0: return
+        idx = self._index(value); self.bins[idx] = self.bins.get(idx, 0) + count; self.count += count
+        if value < self.min: self.min = value
+        if value > self.max: self.max = value
+        if len(self.bins) > self.max_bins: self._collapse()
+
+    def update(self, values: Iterable[float]) -> None:
+        for value in values: self.add(value)
+
+    def _collapse(self) -> None:
+        """Fusiona las cubetas más bajas en una sola hasta respetar max_bins."""
+        keys = sorted(self.bins); excess = len(keys) - self.max_bins + 1
+        target = keys[excess]; self.bins[target] += sum(self.bins.pop(k) for k in keys[:excess])
+
+    def merge(self, other: "DDSketch") -> "DDSketch":
+        if other.count == 0: return self
+        if not math.isclose(other.alpha, self.alpha): raise ValueError("Cannot merge sketches with different relative accuracy")
+        for idx, count in other.bins.items(): self.bins[idx] = self.bins.get(idx, 0) + count
+        self.count += other.count; self.min = min(self.min, other.min); self.max = max(self.max, other.max)
+        if len(self.bins) > self.max_bins: self._collapse()
+        return self
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Valor del cuantil q (0..1), o None si el sketch está vacío."""
+        if self.count == 0: return None
+        if q <= 0: return self.min
+        if q >= 1: return self.max
+        rank = q * (self.count - 1); cumulative = 0
+        for idx in sorted(self.bins):
+            cumulative += self.bins[idx]
+            if cumulative > rank:
+                value = 2 * self.gamma ** idx / (self.gamma + 1) # Punto medio relativo de la cubeta
+                return min(max(value, self.min), self.max)
+        return self.max
+
+    def centroids(self) -> Tuple[List[float], List[int]]:
+        """(valor representativo, conteo) de cada cubeta en orden creciente: para histogramas sin los valores originales."""
+        keys = sorted(self.bins)
+        return [min(max(2 * self.gamma ** idx / (self.gamma + 1), self.min), self.max) for idx in keys], [self.bins[idx] for idx in keys]
+
+    # --- Serialización ---
+    def to_bytes(self) -> bytes:
+        out = bytearray(_HEADER.pack(_FORMAT_VERSION, self.alpha, self.min if self.count else 0.0, self.max if self.count else 0.0))
+        _write_varint(out, len(self.bins)); previous = 0
+        for idx in sorted(self.bins):
+            _write_varint(out, _zigzag(idx - previous)); _write_varint(out, self.bins[idx]); previous = idx
+        return bytes(out)
+
+    @classmethod
+    def from_bytes(cls, data: bytes, max_bins: int = DEFAULT_MAX_BINS) -> "DDSketch":
+        version, alpha, min_value, max_value = _HEADER.unpack_from(data, 0)
+        if version != _FORMAT_VERSION: raise ValueError(f"Unsupported sketch format version {version}")
+        sketch = cls(alpha, max_bins); pos = _HEADER.size
+        n_bins, pos = _read_varint(data, pos); idx = 0
+        for _ in range(n_bins):
+            delta, pos = _read_varint(data, pos); count, pos = _read_varint(data, pos)
+            idx += _unzigzag(delta); sketch.bins[idx] = count; sketch.count += count
+        if sketch.count: sketch.min = min_value; sketch.max = max_value
+        return sketch
+
+def merge_sketch_blobs(blobs: Iterable[Optional[bytes]], relative_accuracy: float = DEFAULT_RELATIVE_ACCURACY) -> DDSketch:
+    """Fusiona sketches serializados (ignora valores None/vacíos)."""
+    merged = DDSketch(relative_accuracy)
+    for blob in blobs:
+        if blob: merged.merge(DDSketch.from_bytes(blob))
+    return merged
@@ -1,9 +1,6 @@
 import streamlit as st
 from typing import Dict
-from utils.config import get_configuration
-# Importar get_configuration y get_db_session para leer colores
-from database.database import get_db_session # Para optimizar lectura de colores
-from database.models import Configuration # Importar el modelo Configuration
+from utils.config import get_configuration, get_configurations
 
 # --- Obtención de Colores de Configuración ---
 def get_configured_colors() -> Dict[str, str]:
@@ -25,11 +22,8 @@ def get_configured_colors() -> Dict[str, str]:
     }
     colors = defaults.copy()
     try:
-        # Leer todas las claves de color de la categoría 'appearance' en una sola consulta
-        all_appearance_configs = {}
-        with get_db_session() as db:
-             configs_db = db.query(Configuration).filter(Configuration.category == 'appearance').all()
-             all_appearance_configs = {c.key: c.value for c in configs_db}
+        # Leer todas las claves de color de la categoría 'appearance' en una sola lectura (caché o IN)
+        all_appearance_configs = get_configurations(defaults.keys(), 'appearance')
 
         for key in defaults:
              value = all_appearance_configs.get(key) # Buscar en lo leído de DB
@@ -0,0 +1,35 @@
+# --- utils/text_analysis.py (Tokenización de consultas para el análisis de texto) ---
+# Reglas compartidas por el índice de términos (database/term_index.py) y el análisis de la página 07:
+# minúsculas, sin acentos ("cédula" y "cedula" cuentan igual), solo palabras de más de 3 caracteres
+# y sin stopwords. Cambiar estas reglas exige reconstruir el índice: python -m database.term_index rebuild
+
+import re
+import unicodedata
+from typing import List
+
+MIN_TERM_LENGTH = 4  # Se descartan las palabras de 3 caracteres o menos
+MAX_TERM_LENGTH = 64 # Tope de la columna 'term' (tokens más largos suelen ser URLs o basura)
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+def fold_accents(text: str) -> str:
+    """Minúsculas y sin diacríticos (NFKD sin marcas combinantes): 'Trámite' -> 'tramite'."""
+    text = (text or "").lower()
+    if text.isascii(): return text # Nada que descomponer (caso habitual)
+    decomposed = unicodedata.normalize("NFKD", text)
+    return "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+
+# Lista básica de stopwords en español (ya sin acentos) más términos genéricos del dominio
+STOPWORDS_ES = frozenset(fold_accents(word) for word in (
+    'de', 'la', 'que', 'el', 'en', 'y', 'a', 'los', 'del', 'se', 'las', 'por', 'un',
+    'para', 'con', 'no', 'una', 'su', 'al', 'lo', 'como', 'más', 'pero', 'sus',
+    'le', 'ha', 'me', 'si', 'sin', 'sobre', 'este', 'ya', 'entre', 'cuando',
+    'todo', 'esta', 'ser', 'son', 'dos', 'también', 'fue', 'habia', 'era',
+    'muy', 'hasta', 'desde', 'nos', 'mi', 'mucho', 'quien', 'yo', 'eso', 'es',
+    'consulta', 'quiero', 'saber', 'necesito', 'informacion', 'puede', 'ayudar',
+))
+
+def tokenize(text: str) -> List[str]:
+    """Términos significativos de un texto, en orden de aparición (con repeticiones)."""
+    return [word for word in _WORD_RE.findall(fold_accents(text))
+            if MIN_TERM_LENGTH <= len(word) <= MAX_TERM_LENGTH and word not in STOPWORDS_ES]
+